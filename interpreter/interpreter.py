@@ -6,121 +6,280 @@ Single file, no dependencies, just works!
 Usage:
     python interpreter.py program.eap
     python interpreter.py program.eap --debug
+    python interpreter.py program.eap --engine=closures
+    python interpreter.py program.eap --cache-dir=DIR
+    python interpreter.py program.eap --unbuffered
+    python interpreter.py program.eap --input=values.txt
+    python interpreter.py program.eap --no-prompt < values.txt
+    python interpreter.py program.eap --cases=tests/
+    python interpreter.py program.eap --max-steps=1000000 --timeout=2
+    python interpreter.py program.eap --max-memory=64M
+    python interpreter.py program.eap --profile --profile-stacks=out.folded
+    python interpreter.py program.eap -O
+    python interpreter.py program.eap --memoize
+    python interpreter.py --batch=submissions/ --timeout=5
+    python interpreter.py --serve
+    python interpreter.py --check-startup=MS
+
+Parsed programs are cached on disk by source hash, so unchanged files skip
+decoding and parsing. The cache lives in the user cache directory
+(greek-pseudorun) unless --cache-dir is given; --cache-dir= disables it.
+
+Program output is buffered and written in large chunks: when the buffer
+fills, before ΔΙΑΒΑΣΕ reads input, at the end of the run and, on a
+terminal, at every EOLN. --unbuffered writes every ΤΥΠΩΣΕ out immediately.
+
+ΔΙΑΒΑΣΕ normally prompts for each value and reads it from its own line.
+--input=FILE (or --no-prompt, for stdin) reads whitespace-separated values
+without prompts, converting each to the declared type of its variable; a
+missing or malformed value is a runtime error.
+
+--cases=DIR runs the program against each test case in DIR (NAME.in input,
+NAME.out expected output), in parallel forked workers that share the parsed
+program, and prints a JSON report of each case's status and time.
+
+--profile runs the program on the tree engine, timing every statement and
+subroutine call, and prints the hottest source lines and the subroutines
+with their hit counts, total and self times on stderr at exit.
+--profile-stacks=FILE also writes the self time of every call stack to FILE
+in the collapsed format of flamegraph.pl and speedscope.
+
+-O folds expressions over literals and ΣΤΑΘΕΡΕΣ into their values and
+removes the ΕΑΝ branches and ΕΝΟΣΩ loops they make unreachable before the
+program runs, and reports how many AST nodes that removed on stderr. It
+then hoists loop-invariant expressions out of ΓΙΑ and ΕΝΟΣΩ bodies and
+turns multiplications by a ΓΙΑ variable into running sums.
+
+--memoize caches the results of pure functions (no ΕΞΟΔΟΣ or array
+parameters, no globals but ΣΤΑΘΕΡΕΣ, no ΔΙΑΒΑΣΕ or ΤΥΠΩΣΕ, calling only
+pure functions) by argument values, and reports the cache hits and misses
+on stderr at exit.
+
+--max-memory=SIZE (bytes, or with a K/M/G suffix) limits the memory a run
+may hold in arrays (their declared cells), subroutine frames and strings;
+the peak is reported on stderr at exit.
+
+--max-steps=N and --timeout=S stop a run that takes more than N steps (loop
+iterations and subroutine calls) or S seconds, reporting the source line it
+was executing. The budget is only checked at loop back-edges and subroutine
+entries, and a run without limits pays nothing for it.
+
+--max-depth=N limits how deeply subroutine calls may nest (default 1000000),
+which deep recursion (recursive sorts, backtracking) needs. The vm engine
+keeps EAP calls on its own frame stack; the other engines nest them on the
+Python stack, so they run the program on a thread with a large stack and a
+recursion limit to match. A run that goes deeper than N stops with a
+"Stack overflow" runtime error.
+
+--batch=DIR runs every .eap file under DIR in parallel workers and prints a
+JSON report of each run's exit status, error category, time and output.
+Each run is limited to --timeout seconds (default 10), --max-memory (default
+256M) and --output-limit characters of output (default 1 MiB).
+
+Run-time events (statements, assignments, calls, returns, reads, prints)
+go to an optional Hooks object passed to the interpreter; --debug attaches
+one that traces assignments and reads. Runs without hooks pay nothing for
+formatting or dispatching events.
+
+Importing the module is kept cheap (plain AST classes, integer token kinds,
+modules imported where they are needed); --check-startup=MS measures it with
+`python -X importtime` and fails when it takes longer than MS milliseconds.
+
+Engines:
+    tree      walk the AST directly (default)
+    closures  compile the AST into nested Python closures first
+    vm        compile the AST to bytecode for a stack-based virtual machine
+    python    translate the program to Python source and run it natively;
+              compiled code is cached on disk by source hash
+
+Simple element-wise ΓΙΑ loops run as bulk slice operations in the tree,
+closures and vm engines. NumPy is optional: when installed, large integer
+arrays are stored as NumPy arrays and such loops are computed with it.
 
 Author: Based on EAP PLH10 specification
 """
 
+from __future__ import annotations
+
+import gc
+import operator
+import os
 import sys
-import unicodedata
-from typing import List, Dict, Any, Optional, Union
-from enum import Enum, auto
-from dataclasses import dataclass, field
+from itertools import repeat
+
+
+__version__ = '1.0.10'
+
+# Bump whenever generated code or the layout of cached data changes.
+CACHE_FORMAT = 12
+
+# Identifies entries in the on-disk caches; changes with the interpreter and Python version.
+CACHE_TAG = f"{__version__}.{CACHE_FORMAT}-{sys.implementation.cache_tag}"
 
 
 # =============================================================================
 # TOKENIZER
 # =============================================================================
 
-class TokenType(Enum):
+class TokenType:
+    """Token kinds, as plain integers so importing the module stays cheap."""
+
     # Structure
-    ALGORITHM = auto()
-    CONSTANTS = auto()
-    DATA = auto()
-    BEGIN = auto()
-    END = auto()
+    ALGORITHM = 1
+    CONSTANTS = 2
+    DATA = 3
+    BEGIN = 4
+    END = 5
     
     # Subroutines
-    PROCEDURE = auto() 
-    FUNCTION = auto() 
-    INTERFACE = auto() 
-    INPUT_PARAM = auto() 
-    OUTPUT_PARAM = auto() 
-    END_FUNCTION = auto() # ΤΕΛΟΣ-ΣΥΝΑΡΤΗΣΗΣ
-    END_PROCEDURE = auto() # ΤΕΛΟΣ-ΔΙΑΔΙΚΑΣΙΑΣ
+    PROCEDURE = 6 
+    FUNCTION = 7 
+    INTERFACE = 8 
+    INPUT_PARAM = 9 
+    OUTPUT_PARAM = 10 
+    END_FUNCTION = 11 # ΤΕΛΟΣ-ΣΥΝΑΡΤΗΣΗΣ
+    END_PROCEDURE = 12 # ΤΕΛΟΣ-ΔΙΑΔΙΚΑΣΙΑΣ
     
     # Control Flow
-    IF = auto()
-    THEN = auto()
-    ELSE = auto()
-    END_IF = auto() # ΕΑΝ-ΤΕΛΟΣ
-    FOR = auto()
-    TO = auto()
-    STEP = auto()
-    REPEAT = auto()
-    END_FOR = auto() # ΓΙΑ-ΤΕΛΟΣ
-    WHILE = auto()
-    END_WHILE = auto() # ΕΝΟΣΩ-ΤΕΛΟΣ
-    UNTIL = auto()
+    IF = 13
+    THEN = 14
+    ELSE = 15
+    END_IF = 16 # ΕΑΝ-ΤΕΛΟΣ
+    FOR = 17
+    TO = 18
+    STEP = 19
+    REPEAT = 20
+    END_FOR = 21 # ΓΙΑ-ΤΕΛΟΣ
+    WHILE = 22
+    END_WHILE = 23 # ΕΝΟΣΩ-ΤΕΛΟΣ
+    UNTIL = 24
     
     # I/O
-    PRINT = auto()
-    READ = auto()
-    CALCULATE = auto()
+    PRINT = 25
+    READ = 26
+    CALCULATE = 27
     
     # Data Types
-    INTEGER_TYPE = auto()
-    REAL_TYPE = auto()
-    BOOLEAN_TYPE = auto()
-    CHAR_TYPE = auto()
-    STRING_TYPE = auto()
-    ARRAY = auto()
-    OF = auto()
+    INTEGER_TYPE = 28
+    REAL_TYPE = 29
+    BOOLEAN_TYPE = 30
+    CHAR_TYPE = 31
+    STRING_TYPE = 32
+    ARRAY = 33
+    OF = 34
     
     # Operators
-    ASSIGN = auto()
-    PLUS = auto()
-    MINUS = auto()
-    MULTIPLY = auto()
-    DIVIDE = auto()
-    MOD = auto()
-    DIV = auto()
+    ASSIGN = 35
+    PLUS = 36
+    MINUS = 37
+    MULTIPLY = 38
+    DIVIDE = 39
+    MOD = 40
+    DIV = 41
     
     # Comparison
-    EQUALS = auto()
-    NOT_EQUALS = auto()
-    LESS_THAN = auto()
-    GREATER_THAN = auto()
-    LESS_EQUALS = auto()
-    GREATER_EQUALS = auto()
+    EQUALS = 42
+    NOT_EQUALS = 43
+    LESS_THAN = 44
+    GREATER_THAN = 45
+    LESS_EQUALS = 46
+    GREATER_EQUALS = 47
     
     # Logical
-    AND = auto()
-    OR = auto()
-    NOT = auto()
+    AND = 48
+    OR = 49
+    NOT = 50
     # Boolean Literal Type
-    BOOLEAN_LITERAL = auto()
+    BOOLEAN_LITERAL = 51
     
     # Punctuation
-    LEFT_PAREN = auto()
-    RIGHT_PAREN = auto()
-    LEFT_BRACKET = auto()
-    RIGHT_BRACKET = auto()
-    COMMA = auto()
-    COLON = auto()
-    SEMICOLON = auto()
-    DOT = auto()
-    PERCENT = auto()
+    LEFT_PAREN = 52
+    RIGHT_PAREN = 53
+    LEFT_BRACKET = 54
+    RIGHT_BRACKET = 55
+    COMMA = 56
+    COLON = 57
+    SEMICOLON = 58
+    DOT = 59
+    PERCENT = 60
     
     # Literals
-    NUMBER = auto()
-    STRING = auto()
-    IDENTIFIER = auto()
+    NUMBER = 61
+    STRING = 62
+    IDENTIFIER = 63
     
-    EOF = auto()
+    EOF = 64
+
+
+# Token kind -> its name, for error messages
+TOKEN_NAMES = {value: name for name, value in vars(TokenType).items() if not name.startswith('_')}
+
+
+class LineIndex:
+    """Maps source offsets to 1-based line and column numbers, built on first use."""
+
+    def __init__(self, code: str):
+        self.code = code
+        self.starts = None
+
+    def _index(self, offset: int) -> int:
+        from bisect import bisect_right
+        if self.starts is None:
+            import re
+            self.starts = [0] + [match.end() for match in re.finditer('\n', self.code)]
+        return bisect_right(self.starts, offset) - 1
+
+    def line(self, offset: int) -> int:
+        return self._index(offset) + 1
+
+    def column(self, offset: int) -> int:
+        return offset - self.starts[self._index(offset)] + 1
 
 
-@dataclass
 class Token:
-    type: TokenType
-    value: Any
-    line: int
-    column: int
+    __slots__ = ('type', 'value', 'offset', 'lines')
+
+    def __init__(self, type: int, value: Any, offset: int, lines: Optional[LineIndex] = None):
+        self.type = type
+        self.value = value
+        self.offset = offset
+        self.lines = lines
+
+    def __eq__(self, other):
+        if not isinstance(other, Token):
+            return NotImplemented
+        return (self.type, self.value, self.offset) == (other.type, other.value, other.offset)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Token({TOKEN_NAMES[self.type]}, {self.value!r}, {self.offset})"
+
+    @property
+    def line(self) -> int:
+        return self.lines.line(self.offset)
+
+    @property
+    def column(self) -> int:
+        return self.lines.column(self.offset)
+
+
+_accent_table = None
 
 
 def remove_accents(text: str) -> str:
     """Remove Greek accents for keyword matching"""
-    nfd = unicodedata.normalize('NFD', text)
-    return ''.join(c for c in nfd if unicodedata.category(c) != 'Mn')
+    global _accent_table
+    if _accent_table is None:
+        import unicodedata
+        # Precomposed Latin and Greek letters map to their base letter; combining marks are dropped
+        _accent_table = {code: None for code in range(0x300, 0x370)}
+        for code in (*range(0xC0, 0x250), *range(0x370, 0x400), *range(0x1F00, 0x2000)):
+            char = chr(code)
+            base = ''.join(c for c in unicodedata.normalize('NFD', char) if unicodedata.category(c) != 'Mn')
+            if base != char:
+                _accent_table[code] = base
+    return text.translate(_accent_table)
 
 
 # Greek and English keywords
@@ -198,320 +357,486 @@ OPERATORS = {
 }
 
 
+# Σύνθετες λέξεις-κλειδιά με παύλα: ελέγχονται πριν από τον τελεστή '-'
+COMPOUND_KEYWORDS = {
+    'ΕΑΝ-ΤΕΛΟΣ': TokenType.END_IF,
+    'ΓΙΑ-ΤΕΛΟΣ': TokenType.END_FOR,
+    'ΕΝΟΣΩ-ΤΕΛΟΣ': TokenType.END_WHILE,
+    'ΤΕΛΟΣ-ΣΥΝΑΡΤΗΣΗΣ': TokenType.END_FUNCTION,
+    'ΤΕΛΟΣ-ΔΙΑΔΙΚΑΣΙΑΣ': TokenType.END_PROCEDURE,
+}
+
+# First word of each compound keyword -> [(compound, type)]
+_COMPOUND_PREFIXES: Dict[str, list] = {}
+for _text, _type in COMPOUND_KEYWORDS.items():
+    _COMPOUND_PREFIXES.setdefault(_text.split('-')[0], []).append((_text, _type))
+
+# Skips whitespace, then tries one alternative per token class in this order.
+# Identifiers start with a letter or any character from U+0370 on (Greek and
+# beyond) and continue with letters, digits, '_' or such characters.
+# Compiled by token_pattern() on first use, so importing the module does not load `re`.
+TOKEN_REGEX = r'''\s*(?:
+    (?P<COMMENT>//[^\n]*|/\*.*?(?:\*/|\Z))
+  | (?P<STRING>"[^"]*"?)
+  | (?P<NUMBER>\d+(?:\.\d+)?)
+  | (?P<OPERATOR>:=|<>|<=|>=|\.\.|[-+*/=<>()\[\],:;%])
+  | (?P<NAME>(?:[^\W\d_]|[^\x00-\u036f\s])[\w\u0370-\U0010ffff]*)
+  | \Z)
+'''
+
+_token_pattern = None
+
+
+def token_pattern():
+    global _token_pattern
+    if _token_pattern is None:
+        import re
+        _token_pattern = re.compile(TOKEN_REGEX, re.VERBOSE | re.DOTALL)
+    return _token_pattern
+
+
+def without_gc(function, *args):
+    """Call `function` with the cyclic garbage collector paused.
+
+    Tokens and AST nodes hold no reference cycles, so the collector passes
+    that allocating many of them would trigger are wasted work.
+    """
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        return function(*args)
+    finally:
+        if collecting:
+            gc.enable()
+
+
 class Tokenizer:
+    """Splits source code into tokens with a single compiled regular expression.
+
+    `stream()` yields tokens one at a time, so a Parser can consume them
+    without the whole list ever existing; `tokenize()` collects them.
+    Tokens record their offset; line and column are computed from it only
+    when asked for (error messages, debug output).
+    """
+
     def __init__(self, code: str):
         self.code = code
-        self.pos = 0
-        self.line = 1
-        self.column = 1
+        self.lines = LineIndex(code)
         self.tokens: List[Token] = []
 
-        # Λίστα με τις σύνθετες λέξεις-κλειδιά που περιέχουν παύλα
-        self.COMPOUND_KEYWORDS = {
-            'ΕΑΝ-ΤΕΛΟΣ': TokenType.END_IF, 
-            'ΓΙΑ-ΤΕΛΟΣ': TokenType.END_FOR, 
-            'ΕΝΟΣΩ-ΤΕΛΟΣ': TokenType.END_WHILE, 
-            'ΤΕΛΟΣ-ΣΥΝΑΡΤΗΣΗΣ': TokenType.END_FUNCTION, 
-            'ΤΕΛΟΣ-ΔΙΑΔΙΚΑΣΙΑΣ': TokenType.END_PROCEDURE
-        }
-    
-    def current_char(self) -> Optional[str]:
-        return self.code[self.pos] if self.pos < len(self.code) else None
-    
-    def peek_char(self, offset: int = 1) -> Optional[str]:
-        pos = self.pos + offset
-        return self.code[pos] if pos < len(self.code) else None
-    
-    def advance(self):
-        if self.pos < len(self.code):
-            if self.code[self.pos] == '\n':
-                self.line += 1
-                self.column = 1
-            else:
-                self.column += 1
-            self.pos += 1
-    
-    def skip_whitespace(self):
-        while self.current_char() and self.current_char().isspace():
-            self.advance()
-    
-    def skip_comment(self):
-        if self.current_char() == '/' and self.peek_char() == '/':
-            while self.current_char() and self.current_char() != '\n':
-                self.advance()
-            return True
-        
-        if self.current_char() == '/' and self.peek_char() == '*':
-            self.advance()
-            self.advance()
-            while self.current_char():
-                if self.current_char() == '*' and self.peek_char() == '/':
-                    self.advance()
-                    self.advance()
-                    break
-                self.advance()
-            return True
-        
-        return False
-    
-    def read_string(self) -> str:
-        value = ''
-        self.advance()
-        while self.current_char() and self.current_char() != '"':
-            value += self.current_char()
-            self.advance()
-        if self.current_char() == '"':
-            self.advance()
-        return value
-    
-    def read_number(self) -> Union[int, float]:
-        num_str = ''
-        while self.current_char() and self.current_char().isdigit():
-            num_str += self.current_char()
-            self.advance()
-        
-        if self.current_char() == '.' and self.peek_char() and self.peek_char().isdigit():
-            num_str += self.current_char()
-            self.advance()
-            while self.current_char() and self.current_char().isdigit():
-                num_str += self.current_char()
-                self.advance()
-            return float(num_str)
-        
-        return int(num_str)
-    
-    def read_identifier(self) -> str:
-        ident = ''
-        while self.current_char() and (
-            self.current_char().isalnum() or 
-            self.current_char() == '_' or  
-            # Ο χαρακτήρας '-' ΔΕΝ επιτρέπεται σε αναγνωριστικά.
-            ord(self.current_char()) >= 0x0370
-        ):
-            ident += self.current_char()
-            self.advance()
-        return ident
-    
+    def compound_keyword(self, word: str, pos: int) -> Optional[Token]:
+        """Match a compound keyword such as ΓΙΑ-ΤΕΛΟΣ at `pos`, ignoring accents and case."""
+        for text, kind in _COMPOUND_PREFIXES.get(word, ()):
+            raw_block = self.code[pos:pos + len(text)]
+            if remove_accents(raw_block).upper() == text:
+                return Token(kind, raw_block, pos, self.lines)
+        return None
+
     def tokenize(self) -> List[Token]:
-        while self.pos < len(self.code):
-            self.skip_whitespace()
-            if not self.current_char():
+        self.tokens = without_gc(list, self.stream())
+        return self.tokens
+
+    def stream(self) -> Iterator[Token]:
+        code, lines = self.code, self.lines
+        match = token_pattern().match
+        identifier = TokenType.IDENTIFIER
+        # Spelling -> (accent-free upper case form, keyword type or None, token value)
+        words = {}
+        pos = 0
+        while True:
+            m = match(code, pos)
+            if m is None:
+                while code[pos].isspace():
+                    pos += 1
+                raise SyntaxError(f"Unexpected '{code[pos]}' at line {lines.line(pos)}:{lines.column(pos)}")
+            kind = m.lastgroup
+            if kind is None:  # Only whitespace was left
                 break
-            
-            if self.skip_comment():
-                continue
-            
-            start_line, start_col = self.line, self.column
-            
-            # --- Compound Keyword Check (Lookahead) ---
-            # Ελέγχουμε πρώτα για τις σύνθετες λέξεις-κλειδιά με παύλα, 
-            # ώστε να μην τις διασπάσει ο κανόνας του τελεστή '-'.
-            found_compound = False
-            for kw_text, kw_type in self.COMPOUND_KEYWORDS.items():
-                # Ελέγχουμε αν το τρέχον σημείο αρχίζει με τη λέξη-κλειδί (αδιαφορώντας για τόνους/πεζά)
-                raw_block = self.code[self.pos:self.pos + len(kw_text)]
-                if remove_accents(raw_block).upper() == remove_accents(kw_text).upper():
-                    
-                    # Καταναλώνουμε τους χαρακτήρες
-                    for char in raw_block:
-                         self.advance()
-                         
-                    self.tokens.append(Token(kw_type, raw_block, start_line, start_col))
-                    found_compound = True
-                    break
-            
-            if found_compound:
-                continue
+            text = m.group(kind)
+            pos = m.start(kind)
 
-            # --- String / Number / Operator / Identifier Checks ---
-            
-            if self.current_char() == '"':
-                value = self.read_string()
-                self.tokens.append(Token(TokenType.STRING, value, start_line, start_col))
-                continue
-            
-            if self.current_char().isdigit():
-                value = self.read_number()
-                self.tokens.append(Token(TokenType.NUMBER, value, start_line, start_col))
-                continue
-            
-            two_char = self.code[self.pos:self.pos+2]
-            if two_char in OPERATORS:
-                self.advance()
-                self.advance()
-                self.tokens.append(Token(OPERATORS[two_char], two_char, start_line, start_col))
-                continue
-            
-            if self.current_char() in OPERATORS:
-                char = self.current_char()
-                self.advance()
-                self.tokens.append(Token(OPERATORS[char], char, start_line, start_col))
-                continue
-            
-            if self.current_char().isalpha() or ord(self.current_char()) >= 0x0370:
-                ident = self.read_identifier()
-                ident_upper = remove_accents(ident.upper())
-                
-                if ident_upper in KEYWORDS:
-                    self.tokens.append(Token(KEYWORDS[ident_upper], ident.upper(), start_line, start_col))
-                else:
-                    self.tokens.append(Token(TokenType.IDENTIFIER, ident, start_line, start_col))
-                continue
-            
-            raise SyntaxError(f"Unexpected '{self.current_char()}' at line {self.line}:{self.column}")
-        
-        self.tokens.append(Token(TokenType.EOF, 'EOF', self.line, self.column))
-        return self.tokens
+            if kind == 'NAME':
+                word = words.get(text)
+                if word is None:
+                    upper = text.upper()
+                    folded = upper if upper.isascii() else remove_accents(upper)
+                    keyword = KEYWORDS.get(folded)
+                    word = words[text] = (folded, keyword, text if keyword is None else upper)
+                folded, keyword, value = word
+                if folded in _COMPOUND_PREFIXES and code.startswith('-', m.end()):
+                    token = self.compound_keyword(folded, pos)
+                    if token is not None:
+                        yield token
+                        pos += len(token.value)
+                        continue
+                yield Token(identifier if keyword is None else keyword, value, pos, lines)
+            elif kind == 'OPERATOR':
+                yield Token(OPERATORS[text], text, pos, lines)
+            elif kind == 'NUMBER':
+                yield Token(TokenType.NUMBER, float(text) if '.' in text else int(text), pos, lines)
+            elif kind == 'STRING':
+                value = text[1:-1] if len(text) > 1 and text.endswith('"') else text[1:]
+                yield Token(TokenType.STRING, value, pos, lines)
+            pos = m.end()
+
+        yield Token(TokenType.EOF, 'EOF', len(code), lines)
 
 
 # =============================================================================
 # PARSER & AST (No changes here)
 # =============================================================================
 
-@dataclass
 class ASTNode:
-    type: str
-    line: int = 0
+    """Base class of the AST nodes.
+
+    Nodes are plain classes rather than dataclasses, which keeps importing
+    the module fast, and store their fields in `__slots__` rather than a
+    per-instance dict, which keeps resident programs small. `_fields` lists
+    a node's fields in order; two nodes are equal when they have the same
+    class and equal fields.
+    """
+    __slots__ = ('type', 'line')
+    _fields = __slots__
+
+    def __init__(self, type: str, line: int = 0):
+        self.type = type
+        self.line = line
+
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self._fields)
+
+    __hash__ = None
+
+    def __repr__(self):
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self._fields)
+        return f"{self.__class__.__name__}({fields})"
 
 
-@dataclass
 class Program(ASTNode):
-    name: str = ''
-    declarations: List[ASTNode] = field(default_factory=list)
-    body: List[ASTNode] = field(default_factory=list)
+    __slots__ = ('name', 'declarations', 'body', 'scope')
+    _fields = ASTNode._fields + __slots__
+
+    def __init__(self, type: str, line: int = 0, name: str = '',
+                 declarations: List[ASTNode] = None, body: List[ASTNode] = None,
+                 scope: Any = None):
+        self.type = type
+        self.line = line
+        self.name = name
+        self.declarations = [] if declarations is None else declarations
+        self.body = [] if body is None else body
+        self.scope = scope  # Global frame layout, set by Resolver
+
 
-@dataclass
 class ConstantDeclaration(ASTNode):
-    name: str = ''
-    value: Optional[ASTNode] = None
+    __slots__ = ('name', 'value')
+    _fields = ASTNode._fields + __slots__
+
+    def __init__(self, type: str, line: int = 0, name: str = '', value: Optional[ASTNode] = None):
+        self.type = type
+        self.line = line
+        self.name = name
+        self.value = value
+
 
-@dataclass
 class ArrayDimension(ASTNode):
-    start: Optional[ASTNode] = None
-    end: Optional[ASTNode] = None
+    __slots__ = ('start', 'end')
+    _fields = ASTNode._fields + __slots__
+
+    def __init__(self, type: str, line: int = 0, start: Optional[ASTNode] = None,
+                 end: Optional[ASTNode] = None):
+        self.type = type
+        self.line = line
+        self.start = start
+        self.end = end
+
 
-@dataclass
 class ArrayType(ASTNode):
-    base_type: str = ''
-    dimensions: List[ArrayDimension] = field(default_factory=list)
+    __slots__ = ('base_type', 'dimensions')
+    _fields = ASTNode._fields + __slots__
+
+    def __init__(self, type: str, line: int = 0, base_type: str = '',
+                 dimensions: List[ArrayDimension] = None):
+        self.type = type
+        self.line = line
+        self.base_type = base_type
+        self.dimensions = [] if dimensions is None else dimensions
+
 
-@dataclass
 class VariableDeclaration(ASTNode):
-    name: str = ''
-    var_type: Union[str, ArrayType] = None 
+    __slots__ = ('name', 'var_type')
+    _fields = ASTNode._fields + __slots__
+
+    def __init__(self, type: str, line: int = 0, name: str = '',
+                 var_type: Union[str, ArrayType] = None):
+        self.type = type
+        self.line = line
+        self.name = name
+        self.var_type = var_type
 
 
-@dataclass
 class Parameter(ASTNode):
-    name: str = ''
-    param_type: Union[str, ArrayType] = None
-    is_reference: bool = False 
+    __slots__ = ('name', 'param_type', 'is_reference')
+    _fields = ASTNode._fields + __slots__
+
+    def __init__(self, type: str, line: int = 0, name: str = '',
+                 param_type: Union[str, ArrayType] = None, is_reference: bool = False):
+        self.type = type
+        self.line = line
+        self.name = name
+        self.param_type = param_type
+        self.is_reference = is_reference
+
 
-@dataclass
 class FunctionDeclaration(ASTNode):
-    name: str = ''
-    return_type: Union[str, ArrayType] = None
-    parameters: List[Parameter] = field(default_factory=list)
-    declarations: List[ASTNode] = field(default_factory=list)
-    body: List[ASTNode] = field(default_factory=list)
+    __slots__ = ('name', 'return_type', 'parameters', 'declarations', 'body', 'scope', 'param_slots', 'return_slot')
+    _fields = ASTNode._fields + __slots__
+
+    def __init__(self, type: str, line: int = 0, name: str = '',
+                 return_type: Union[str, ArrayType] = None, parameters: List[Parameter] = None,
+                 declarations: List[ASTNode] = None, body: List[ASTNode] = None, scope: Any = None,
+                 param_slots: List[int] = None, return_slot: int = -1):
+        self.type = type
+        self.line = line
+        self.name = name
+        self.return_type = return_type
+        self.parameters = [] if parameters is None else parameters
+        self.declarations = [] if declarations is None else declarations
+        self.body = [] if body is None else body
+        # Frame layout, set by Resolver
+        self.scope = scope
+        self.param_slots = [] if param_slots is None else param_slots
+        self.return_slot = return_slot
+
 
-@dataclass
 class ProcedureDeclaration(ASTNode):
-    name: str = ''
-    parameters: List[Parameter] = field(default_factory=list)
-    declarations: List[ASTNode] = field(default_factory=list)
-    body: List[ASTNode] = field(default_factory=list)
+    __slots__ = ('name', 'parameters', 'declarations', 'body', 'scope', 'param_slots', 'return_slot')
+    _fields = ASTNode._fields + __slots__
+
+    def __init__(self, type: str, line: int = 0, name: str = '',
+                 parameters: List[Parameter] = None, declarations: List[ASTNode] = None,
+                 body: List[ASTNode] = None, scope: Any = None, param_slots: List[int] = None,
+                 return_slot: int = -1):
+        self.type = type
+        self.line = line
+        self.name = name
+        self.parameters = [] if parameters is None else parameters
+        self.declarations = [] if declarations is None else declarations
+        self.body = [] if body is None else body
+        # Frame layout, set by Resolver
+        self.scope = scope
+        self.param_slots = [] if param_slots is None else param_slots
+        self.return_slot = return_slot
+
 
-@dataclass
 class CallExpression(ASTNode):
-    name: str = ''
-    arguments: List[ASTNode] = field(default_factory=list)
-    is_statement: bool = False
+    __slots__ = ('name', 'arguments', 'is_statement', 'site')
+    # `site` is not a field: it links back into the tree, to the called subroutine
+    _fields = ASTNode._fields + ('name', 'arguments', 'is_statement')
+
+    def __init__(self, type: str, line: int = 0, name: str = '', arguments: List[ASTNode] = None,
+                 is_statement: bool = False, site: Any = None):
+        self.type = type
+        self.line = line
+        self.name = name
+        self.arguments = [] if arguments is None else arguments
+        self.is_statement = is_statement
+        self.site = site  # FrameLayout of the called subroutine, set by link_calls()
+
 
-@dataclass
 class Assignment(ASTNode):
-    identifier: str = ''
-    indices: List[ASTNode] = field(default_factory=list)
-    value: Optional[ASTNode] = None
+    __slots__ = ('identifier', 'indices', 'value', 'depth', 'slot')
+    _fields = ASTNode._fields + __slots__
+
+    def __init__(self, type: str, line: int = 0, identifier: str = '',
+                 indices: List[ASTNode] = None, value: Optional[ASTNode] = None, depth: int = 0,
+                 slot: int = -1):
+        self.type = type
+        self.line = line
+        self.identifier = identifier
+        self.indices = [] if indices is None else indices
+        self.value = value
+        self.depth = depth  # Frame and slot of `identifier`, set by Resolver
+        self.slot = slot
 
 
-@dataclass
 class PrintStatement(ASTNode):
-    expressions: List[ASTNode] = field(default_factory=list)
+    __slots__ = ('expressions',)
+    _fields = ASTNode._fields + __slots__
+
+    def __init__(self, type: str, line: int = 0, expressions: List[ASTNode] = None):
+        self.type = type
+        self.line = line
+        self.expressions = [] if expressions is None else expressions
 
 
-@dataclass
 class ReadStatement(ASTNode):
-    variables: List[ASTNode] = field(default_factory=list)  # Changed from List[str]
-    
-    
-@dataclass
+    __slots__ = ('variables', 'types')
+    _fields = ASTNode._fields + __slots__
+
+    def __init__(self, type: str, line: int = 0, variables: List[ASTNode] = None,
+                 types: List[Optional[str]] = None):
+        self.type = type
+        self.line = line
+        self.variables = [] if variables is None else variables  # Changed from List[str]
+        # Declared type of each variable (element type for arrays), set by Resolver
+        self.types = [] if types is None else types
+
+
 class IfStatement(ASTNode):
-    condition: Optional[ASTNode] = None
-    then_branch: List[ASTNode] = field(default_factory=list)
-    else_branch: Optional[List[ASTNode]] = None
+    __slots__ = ('condition', 'then_branch', 'else_branch')
+    _fields = ASTNode._fields + __slots__
+
+    def __init__(self, type: str, line: int = 0, condition: Optional[ASTNode] = None,
+                 then_branch: List[ASTNode] = None, else_branch: Optional[List[ASTNode]] = None):
+        self.type = type
+        self.line = line
+        self.condition = condition
+        self.then_branch = [] if then_branch is None else then_branch
+        self.else_branch = else_branch
 
 
-@dataclass
 class ForLoop(ASTNode):
-    variable: str = ''
-    start: Optional[ASTNode] = None
-    end: Optional[ASTNode] = None
-    step: Optional[ASTNode] = None
-    body: List[ASTNode] = field(default_factory=list)
+    __slots__ = ('variable', 'start', 'end', 'step', 'body', 'depth', 'slot', 'vector')
+    _fields = ASTNode._fields + __slots__
+
+    def __init__(self, type: str, line: int = 0, variable: str = '',
+                 start: Optional[ASTNode] = None, end: Optional[ASTNode] = None,
+                 step: Optional[ASTNode] = None, body: List[ASTNode] = None, depth: int = 0,
+                 slot: int = -1, vector: Any = None):
+        self.type = type
+        self.line = line
+        self.variable = variable
+        self.start = start
+        self.end = end
+        self.step = step
+        self.body = [] if body is None else body
+        self.depth = depth  # Frame and slot of `variable`, set by Resolver
+        self.slot = slot
+        self.vector = vector  # VectorLoop plan, set by vectorize()
 
 
-@dataclass
 class WhileLoop(ASTNode):
-    condition: Optional[ASTNode] = None
-    body: List[ASTNode] = field(default_factory=list)
+    __slots__ = ('condition', 'body')
+    _fields = ASTNode._fields + __slots__
+
+    def __init__(self, type: str, line: int = 0, condition: Optional[ASTNode] = None,
+                 body: List[ASTNode] = None):
+        self.type = type
+        self.line = line
+        self.condition = condition
+        self.body = [] if body is None else body
 
 
-@dataclass
 class BinaryOp(ASTNode):
-    operator: str = ''
-    left: Optional[ASTNode] = None
-    right: Optional[ASTNode] = None
+    __slots__ = ('operator', 'left', 'right')
+    _fields = ASTNode._fields + __slots__
+
+    def __init__(self, type: str, line: int = 0, operator: str = '',
+                 left: Optional[ASTNode] = None, right: Optional[ASTNode] = None):
+        self.type = type
+        self.line = line
+        self.operator = operator
+        self.left = left
+        self.right = right
 
 
-@dataclass
 class UnaryOp(ASTNode):
-    operator: str = ''
-    operand: Optional[ASTNode] = None
+    __slots__ = ('operator', 'operand')
+    _fields = ASTNode._fields + __slots__
+
+    def __init__(self, type: str, line: int = 0, operator: str = '',
+                 operand: Optional[ASTNode] = None):
+        self.type = type
+        self.line = line
+        self.operator = operator
+        self.operand = operand
 
 
-@dataclass
 class Literal(ASTNode):
-    value: Any = None
+    __slots__ = ('value',)
+    _fields = ASTNode._fields + __slots__
+
+    def __init__(self, type: str, line: int = 0, value: Any = None):
+        self.type = type
+        self.line = line
+        self.value = value
 
 
-@dataclass
 class Identifier(ASTNode):
-    name: str = ''
+    __slots__ = ('name', 'depth', 'slot')
+    _fields = ASTNode._fields + __slots__
+
+    def __init__(self, type: str, line: int = 0, name: str = '', depth: int = 0, slot: int = -1):
+        self.type = type
+        self.line = line
+        self.name = name
+        self.depth = depth  # Frame and slot of `name`, set by Resolver
+        self.slot = slot
 
 
-@dataclass
 class ArrayAccess(ASTNode):
-    name: str = ''
-    indices: List[ASTNode] = field(default_factory=list)
+    __slots__ = ('name', 'indices', 'depth', 'slot')
+    _fields = ASTNode._fields + __slots__
+
+    def __init__(self, type: str, line: int = 0, name: str = '', indices: List[ASTNode] = None,
+                 depth: int = 0, slot: int = -1):
+        self.type = type
+        self.line = line
+        self.name = name
+        self.indices = [] if indices is None else indices
+        self.depth = depth  # Frame and slot of `name`, set by Resolver
+        self.slot = slot
+
+
+def iter_child_nodes(node: ASTNode):
+    """Yield the AST nodes directly contained in `node`, in field order."""
+    for name in node._fields:
+        value = getattr(node, name)
+        if isinstance(value, ASTNode):
+            yield value
+        elif isinstance(value, list):
+            for item in value:
+                if isinstance(item, ASTNode):
+                    yield item
+
+
+def walk(node: ASTNode):
+    """Yield `node` and every AST node below it."""
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(iter_child_nodes(node))
 
 
 class Parser:
-    def __init__(self, tokens: List[Token]):
-        self.tokens = tokens
-        self.pos = 0
+    def __init__(self, tokens: Iterable[Token]):
+        # Tokens are pulled as needed (from a list or Tokenizer.stream());
+        # only the current token and at most one of lookahead are held.
+        self.tokens = iter(tokens)
+        self.token = next(self.tokens)
+        self.lookahead: Optional[Token] = None
     
     def current(self) -> Token:
-        return self.tokens[self.pos] if self.pos < len(self.tokens) else self.tokens[-1]
+        return self.token
+
+    def peek(self) -> Token:
+        """The token after the current one; the final (EOF) token repeats."""
+        if self.lookahead is None:
+            self.lookahead = next(self.tokens, self.token)
+        return self.lookahead
     
     def advance(self):
-        if self.pos < len(self.tokens) - 1:
-            self.pos += 1
+        if self.token.type != TokenType.EOF:
+            self.token = self.peek()
+            self.lookahead = None
     
     def expect(self, token_type: TokenType) -> Token:
         token = self.current()
         if token.type != token_type:
-            raise SyntaxError(f"Expected {token_type.name} but got {token.type.name} at line {token.line}")
+            raise SyntaxError(f"Expected {TOKEN_NAMES[token_type]} but got {TOKEN_NAMES[token.type]} at line {token.line}")
         self.advance()
         return token
     
@@ -539,6 +864,7 @@ class Parser:
         if self.match(TokenType.DATA):
             self.advance()
             while self.match(TokenType.IDENTIFIER):
+                line = self.current().line
                 names = [self.expect(TokenType.IDENTIFIER).value]
                 while self.match(TokenType.COMMA):
                     self.advance()
@@ -547,7 +873,7 @@ class Parser:
                 var_type_ast = self.parse_type()
                 self.expect(TokenType.SEMICOLON)
                 for n in names:
-                    declarations.append(VariableDeclaration(type='VarDecl', name=n, var_type=var_type_ast, line=self.current().line))
+                    declarations.append(VariableDeclaration(type='VarDecl', name=n, var_type=var_type_ast, line=line))
 
         # 3. Parse Subroutines (Functions and Procedures)
         while self.match(TokenType.FUNCTION, TokenType.PROCEDURE):
@@ -559,12 +885,15 @@ class Parser:
         self.expect(TokenType.BEGIN)
         body = self.parse_block()
         self.expect(TokenType.END)
-        
+        # Release the token source (and a token list behind it) now that parsing is done
+        self.tokens = iter(())
+        self.lookahead = None
+
         return Program(type='Program', name=name, declarations=declarations, body=body)
     
     def parse_type(self) -> Union[str, ArrayType]:
         if self.match(TokenType.INTEGER_TYPE, TokenType.REAL_TYPE, TokenType.BOOLEAN_TYPE, TokenType.CHAR_TYPE, TokenType.STRING_TYPE):
-            t = self.current().type.name
+            t = TOKEN_NAMES[self.current().type]
             self.advance()
             return t
         
@@ -721,6 +1050,7 @@ class Parser:
         if self.match(TokenType.DATA):
             self.advance()
             while self.match(TokenType.IDENTIFIER):
+                line = self.current().line
                 names = [self.expect(TokenType.IDENTIFIER).value]
                 while self.match(TokenType.COMMA):
                     self.advance()
@@ -729,7 +1059,7 @@ class Parser:
                 var_type = self.parse_type()
                 self.expect(TokenType.SEMICOLON)
                 for n in names:
-                    declarations.append(VariableDeclaration(type='VarDecl', name=n, var_type=var_type, line=self.current().line))
+                    declarations.append(VariableDeclaration(type='VarDecl', name=n, var_type=var_type, line=line))
 
         self.expect(TokenType.BEGIN)
         body = self.parse_block()
@@ -760,6 +1090,7 @@ class Parser:
         if self.match(TokenType.DATA):
             self.advance()
             while self.match(TokenType.IDENTIFIER):
+                line = self.current().line
                 names = [self.expect(TokenType.IDENTIFIER).value]
                 while self.match(TokenType.COMMA):
                     self.advance()
@@ -768,7 +1099,7 @@ class Parser:
                 var_type = self.parse_type()
                 self.expect(TokenType.SEMICOLON)
                 for n in names:
-                    declarations.append(VariableDeclaration(type='VarDecl', name=n, var_type=var_type, line=self.current().line))
+                    declarations.append(VariableDeclaration(type='VarDecl', name=n, var_type=var_type, line=line))
             
         self.expect(TokenType.BEGIN)
         body = self.parse_block()
@@ -801,16 +1132,17 @@ class Parser:
             return self.parse_repeat()
         elif self.match(TokenType.IDENTIFIER):
             # Check for function/procedure call statement
-            if self.tokens[self.pos+1].type == TokenType.LEFT_PAREN:
+            if self.peek().type == TokenType.LEFT_PAREN:
                  # Check if the next non-parenthesis token is ASSIGN (e.g. F(x) := ...) which is not standard
                  # We assume F(x) is a call unless it is on the RHS of an assignment
                  # Since it's in statement position, it must be a procedure call or a function call used for its side effects (which is allowed).
                  return self.parse_call_statement()
             else:
                 return self.parse_assignment()
-        raise SyntaxError(f"Unexpected {self.current().type.name} at line {self.current().line}")
+        raise SyntaxError(f"Unexpected {TOKEN_NAMES[self.current().type]} at line {self.current().line}")
 
     def parse_call_statement(self) -> CallExpression:
+        line = self.current().line
         name = self.expect(TokenType.IDENTIFIER).value
         self.expect(TokenType.LEFT_PAREN)
         args = []
@@ -829,9 +1161,10 @@ class Parser:
         self.expect(TokenType.RIGHT_PAREN)
         if self.match(TokenType.SEMICOLON):
             self.advance()
-        return CallExpression(type='Call', name=name, arguments=args, is_statement=True)
+        return CallExpression(type='Call', name=name, arguments=args, is_statement=True, line=line)
     
     def parse_print(self) -> PrintStatement:
+        line = self.current().line
         self.expect(TokenType.PRINT)
         self.expect(TokenType.LEFT_PAREN)
         exprs = []
@@ -843,9 +1176,10 @@ class Parser:
         self.expect(TokenType.RIGHT_PAREN)
         if self.match(TokenType.SEMICOLON):
             self.advance()
-        return PrintStatement(type='Print', expressions=exprs)
+        return PrintStatement(type='Print', expressions=exprs, line=line)
     
     def parse_read(self) -> ReadStatement:
+        line = self.current().line
         self.expect(TokenType.READ)
         self.expect(TokenType.LEFT_PAREN)
         vars = []
@@ -860,9 +1194,10 @@ class Parser:
         self.expect(TokenType.RIGHT_PAREN)
         if self.match(TokenType.SEMICOLON):
             self.advance()
-        return ReadStatement(type='Read', variables=vars)
+        return ReadStatement(type='Read', variables=vars, line=line)
     
     def parse_assignment(self) -> Assignment:
+        line = self.current().line
         name = self.expect(TokenType.IDENTIFIER).value
         indices = []
         if self.match(TokenType.LEFT_BRACKET):
@@ -876,9 +1211,10 @@ class Parser:
         value = self.parse_expression()
         if self.match(TokenType.SEMICOLON):
             self.advance()
-        return Assignment(type='Assign', identifier=name, indices=indices, value=value)
+        return Assignment(type='Assign', identifier=name, indices=indices, value=value, line=line)
     
     def parse_if(self) -> IfStatement:
+        line = self.current().line
         self.expect(TokenType.IF)
         cond = self.parse_expression()
         self.expect(TokenType.THEN)
@@ -890,9 +1226,10 @@ class Parser:
         self.expect(TokenType.END_IF)
         if self.match(TokenType.SEMICOLON):
             self.advance()
-        return IfStatement(type='If', condition=cond, then_branch=then_b, else_branch=else_b)
+        return IfStatement(type='If', condition=cond, then_branch=then_b, else_branch=else_b, line=line)
     
     def parse_for(self) -> ForLoop:
+        line = self.current().line
         self.expect(TokenType.FOR)
         var = self.expect(TokenType.IDENTIFIER).value
         self.expect(TokenType.ASSIGN)
@@ -908,9 +1245,10 @@ class Parser:
         self.expect(TokenType.END_FOR)
         if self.match(TokenType.SEMICOLON):
             self.advance()
-        return ForLoop(type='For', variable=var, start=start, end=end, step=step, body=body)
+        return ForLoop(type='For', variable=var, start=start, end=end, step=step, body=body, line=line)
     
     def parse_while(self) -> WhileLoop:
+        line = self.current().line
         self.expect(TokenType.WHILE)
         cond = self.parse_expression()
         self.expect(TokenType.REPEAT)
@@ -918,9 +1256,10 @@ class Parser:
         self.expect(TokenType.END_WHILE)
         if self.match(TokenType.SEMICOLON):
             self.advance()
-        return WhileLoop(type='While', condition=cond, body=body)
+        return WhileLoop(type='While', condition=cond, body=body, line=line)
     
     def parse_repeat(self) -> WhileLoop:
+        line = self.current().line
         self.expect(TokenType.REPEAT)
         body = self.parse_block()
         self.expect(TokenType.UNTIL)
@@ -928,7 +1267,7 @@ class Parser:
         if self.match(TokenType.SEMICOLON):
             self.advance()
         not_cond = UnaryOp(type='Unary', operator='NOT', operand=cond)
-        return WhileLoop(type='RepeatUntil', condition=not_cond, body=body)
+        return WhileLoop(type='RepeatUntil', condition=not_cond, body=body, line=line)
     
     def parse_expression(self) -> ASTNode:
         return self.parse_or()
@@ -1006,9 +1345,10 @@ class Parser:
         
         if self.match(TokenType.IDENTIFIER):
             name = self.current().value
+            line = self.current().line
             
             # Look ahead for a function/procedure call
-            if self.tokens[self.pos+1].type == TokenType.LEFT_PAREN:
+            if self.peek().type == TokenType.LEFT_PAREN:
                 self.advance()
                 self.expect(TokenType.LEFT_PAREN)
                 args = []
@@ -1018,7 +1358,7 @@ class Parser:
                         self.advance()
                         args.append(self.parse_expression())
                 self.expect(TokenType.RIGHT_PAREN)
-                return CallExpression(type='Call', name=name, arguments=args, is_statement=False)
+                return CallExpression(type='Call', name=name, arguments=args, is_statement=False, line=line)
             
             self.advance()
             if self.match(TokenType.LEFT_BRACKET):
@@ -1028,8 +1368,8 @@ class Parser:
                     self.advance()
                     indices.append(self.parse_expression())
                 self.expect(TokenType.RIGHT_BRACKET)
-                return ArrayAccess(type='ArrAcc', name=name, indices=indices)
-            return Identifier(type='Id', name=name)
+                return ArrayAccess(type='ArrAcc', name=name, indices=indices, line=line)
+            return Identifier(type='Id', name=name, line=line)
         
         if self.match(TokenType.LEFT_PAREN):
             self.advance()
@@ -1037,223 +1377,958 @@ class Parser:
             self.expect(TokenType.RIGHT_PAREN)
             return expr
         
-        raise SyntaxError(f"Unexpected {self.current().type.name} at line {self.current().line}")
+        raise SyntaxError(f"Unexpected {TOKEN_NAMES[self.current().type]} at line {self.current().line}")
 
 
 # =============================================================================
 # INTERPRETER
 # =============================================================================
 
+# Arrays with more cells than this are stored sparsely
+DENSE_ARRAY_LIMIT = 1 << 22
+
+# Integer arrays with at least this many cells are NumPy-backed when NumPy is installed
+NUMPY_MIN_CELLS = 1 << 12
+
+_numpy = None
+
+
+def load_numpy():
+    """Import NumPy on first use; returns None when it is not installed."""
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy or None
+
+
+def fits_int64(value: Any) -> bool:
+    return type(value) is int and -(1 << 63) <= value < (1 << 63)
+
+
 class ArrayObject:
-    """Represents a dynamically sized EAP array with bounds checking."""
-    def __init__(self, bounds: List[Dict[str, int]]):
-        self.data = {}
+    """Represents a dynamically sized EAP array with bounds checking.
+
+    Cells are stored in row-major order and addressed through offsets
+    precomputed from the bounds. Integer arrays use a typed `array('q')` (an
+    int64 `ndarray` for large arrays when NumPy is installed) until a value
+    that does not fit is stored; other base types use a list. Arrays
+    with more than DENSE_ARRAY_LIMIT cells use a dict keyed by offset instead,
+    so huge, mostly empty bounds cost nothing up front.
+    """
+    def __init__(self, bounds: List[Dict[str, int]], base_type: Optional[str] = None):
         self.bounds = bounds
-    
-    def _validate_indices(self, indices: List[int]):
-        if len(indices) != len(self.bounds):
-            raise RuntimeError(f"Incorrect number of indices ({len(indices)}). Expected {len(self.bounds)}.")
+        self.rank = len(bounds)
+        self.lows = [bound['from'] for bound in bounds]
+        self.highs = [bound['to'] for bound in bounds]
 
-        for i, index in enumerate(indices):
-            bound = self.bounds[i]
-            if not isinstance(index, int) or index < bound['from'] or index > bound['to']:
-                raise RuntimeError(f"Array index {index} is out of bounds for dimension {i+1}. Expected range: [{bound['from']}..{bound['to']}].")
+        # Row-major strides: the last index varies fastest
+        self.strides = [0] * self.rank
+        size = 1
+        for dim in range(self.rank - 1, -1, -1):
+            self.strides[dim] = size
+            size *= max(self.highs[dim] - self.lows[dim] + 1, 0)
+        self.size = size
+
+        self.sparse = size > DENSE_ARRAY_LIMIT
+        self.typed = not self.sparse and base_type == 'INTEGER_TYPE'
+        self.ndarray = False
+        if self.sparse:
+            self.data = {}
+        elif self.typed and size >= NUMPY_MIN_CELLS and load_numpy():
+            self.data = _numpy.zeros(size, dtype=_numpy.int64)
+            self.ndarray = True
+        elif self.typed:
+            from array import array
+            self.data = array('q', bytes(8 * size))
+        else:
+            self.data = [0] * size
+
+    def _bounds_error(self, dim: int, index: Any) -> RuntimeError:
+        return RuntimeError(f"Array index {index} is out of bounds for dimension {dim+1}. Expected range: [{self.lows[dim]}..{self.highs[dim]}].")
+
+    def _offset(self, indices: List[int]) -> int:
+        if len(indices) != self.rank:
+            raise RuntimeError(f"Incorrect number of indices ({len(indices)}). Expected {self.rank}.")
+
+        if self.rank == 1:
+            index = indices[0]
+            if not isinstance(index, int) or index < self.lows[0] or index > self.highs[0]:
+                raise self._bounds_error(0, index)
+            return index - self.lows[0]
+
+        offset = 0
+        for dim, index in enumerate(indices):
+            low = self.lows[dim]
+            if not isinstance(index, int) or index < low or index > self.highs[dim]:
+                raise self._bounds_error(dim, index)
+            offset += (index - low) * self.strides[dim]
+        return offset
 
     def get(self, indices: List[int]):
-        self._validate_indices(indices)
-        key = ','.join(str(i) for i in indices)
-        return self.data.get(key, 0)
+        if self.sparse:
+            return self.data.get(self._offset(indices), 0)
+        if self.ndarray:
+            return self.data.item(self._offset(indices))
+        return self.data[self._offset(indices)]
     
     def set(self, indices: List[int], value: Any):
-        self._validate_indices(indices)
-        key = ','.join(str(i) for i in indices)
-        self.data[key] = value
+        offset = self._offset(indices)
+        if self.typed and not fits_int64(value):
+            self.untype()
+        self.data[offset] = value
 
+    def untype(self):
+        """Switch to a list so values are kept exactly as assigned (REAL, bool, ...)."""
+        self.data = self.data.tolist()
+        self.typed = self.ndarray = False
 
-class Environment:
-    def __init__(self, parent=None):
-        self.values = {}
-        self.parent = parent
-        self.subroutines = {}
-    
-    def define(self, name, value):
-        self.values[name.upper()] = value
-    
-    def define_subroutine(self, name, declaration):
-        self.subroutines[name.upper()] = declaration
-    
-    def get(self, name):
-        key = name.upper()
-        if key in self.values:
-            return self.values[key]
-        if self.parent:
-            return self.parent.get(name)
-        raise RuntimeError(f"Undefined variable: {name}")
 
-    def get_subroutine(self, name):
-        key = name.upper()
-        if key in self.subroutines:
-            return self.subroutines[key]
-        if self.parent:
-            return self.parent.get_subroutine(name)
-        raise RuntimeError(f"Undefined function or procedure: {name}")
-    
-    def assign(self, name, value):
+# Resolved variable depths: the current subroutine's frame or the global frame
+LOCAL, GLOBAL = 0, 1
+
+# Value of a variable slot that has not been assigned yet
+UNDEFINED = type('Undefined', (), {'__repr__': lambda self: 'UNDEFINED'})()
+
+
+def _array_error(name: str, value: Any) -> RuntimeError:
+    """The error for indexing `value`, which is not an ArrayObject."""
+    if value is UNDEFINED:
+        return RuntimeError(f"Undefined variable: {name}")
+    return RuntimeError(f"{name} is not an array")
+
+
+class Scope:
+    """Slot layout of one frame: maps upper-cased variable names to slots."""
+    def __init__(self):
+        self.slots = {}
+        self.names = []
+        self.types = {}  # Upper-cased name -> declared type (element type for arrays)
+
+    def __len__(self):
+        return len(self.names)
+
+    def declare(self, name: str, var_type: Union[str, ArrayType, None] = None) -> int:
         key = name.upper()
-        if key in self.values:
-            self.values[key] = value
-            return
-        if self.parent:
-            self.parent.assign(name, value)
-            return
-        self.values[key] = value 
+        slot = self.slots.get(key)
+        if slot is None:
+            slot = self.slots[key] = len(self.names)
+            self.names.append(name)
+        if var_type is not None:
+            self.types[key] = var_type.base_type if isinstance(var_type, ArrayType) else var_type
+        return slot
 
 
-class Interpreter:
-    
-    def __init__(self, debug=False):
-        self.env = Environment()
-        self.debug = debug
-        # Define the EOLN constant for EAP compatibility
-        self.env.define("EOLN", "__EOLN__") # Use a sentinel value
- 
-    def log(self, msg):
-        if self.debug:
-            print(f"[DEBUG] {msg}", file=sys.stderr)
-    
-    def execute(self, program: Program):
-        self.log(f"Executing program: {program.name}")
-        
-        # --- Phase 1: Define Constants and Subroutines ---
+class Resolver:
+    """Resolves every variable reference to a frame slot before execution.
+
+    Names are interned once here; each Identifier, ArrayAccess, Assignment and
+    ForLoop gets the `depth` (LOCAL or GLOBAL) and `slot` of its variable, so
+    access is a list index instead of a chain of dict lookups. Subroutine
+    frames link lexically to the global frame: a name a subroutine does not
+    declare is the global variable of that name. Undeclared names get global
+    slots, matching where assigning an unknown name creates the variable.
+    """
+
+    def resolve(self, program: Program) -> Scope:
+        self.global_scope = Scope()
+        self.global_scope.declare('EOLN')
         for decl in program.declarations:
             if isinstance(decl, ConstantDeclaration):
-                value = self.evaluate(decl.value)
-                self.env.define(decl.name, value)
-                self.log(f"Defined constant: {decl.name} = {value}")
-            
-            elif isinstance(decl, (FunctionDeclaration, ProcedureDeclaration)):
-                self.env.define_subroutine(decl.name, decl)
-                self.log(f"Defined subroutine: {decl.name}")
-        
-        # --- Phase 2: Define Variables (including arrays, which now rely on constants) ---
+                self.global_scope.declare(decl.name)
+            elif isinstance(decl, VariableDeclaration):
+                self.global_scope.declare(decl.name, decl.var_type)
+
         for decl in program.declarations:
-            if isinstance(decl, VariableDeclaration):
-                if isinstance(decl.var_type, ArrayType):
-                    evaluated_bounds = []
-                    for dim in decl.var_type.dimensions:
-                        # Array bounds must be evaluated first (they rely only on constants/literals)
-                        try:
-                            start = int(self.evaluate(dim.start))
-                            end = int(self.evaluate(dim.end))
-                        except Exception as e:
-                            line = decl.line if decl.line != 0 else '?'
-                            raise RuntimeError(f"Array bounds must evaluate to integers. Error in '{decl.name}' array declaration (line {line}): {e}")
-
-                        if not isinstance(start, int) or not isinstance(end, int):
-                             raise RuntimeError("Array bounds must evaluate to integers.")
-                        
-                        evaluated_bounds.append({'from': start, 'to': end})
-                        
-                    self.env.define(decl.name, ArrayObject(evaluated_bounds))
-                    self.log(f"Declared array: {decl.name} with bounds: {evaluated_bounds}")
-                else:
-                    self.env.define(decl.name, 0)
-                self.log(f"Declared variable: {decl.name}")
-            
-        
-        # Execute main body
+            if isinstance(decl, ConstantDeclaration):
+                self.resolve_node(decl.value, None)
+            elif isinstance(decl, VariableDeclaration):
+                self.resolve_node(decl.var_type, None)
+            elif isinstance(decl, (FunctionDeclaration, ProcedureDeclaration)):
+                self.resolve_subroutine(decl)
         for stmt in program.body:
-            self.execute_statement(stmt)
+            self.resolve_node(stmt, None)
 
-    def _execute_subroutine(self, subroutine_decl: Union[FunctionDeclaration, ProcedureDeclaration], call: CallExpression):
-        if len(call.arguments) != len(subroutine_decl.parameters):
-            raise RuntimeError(f"Function/Procedure '{call.name}' called with {len(call.arguments)} arguments, expected {len(subroutine_decl.parameters)}.")
+        program.scope = self.global_scope
+        return self.global_scope
 
-        local_env = Environment(parent=self.env)
-        
-        # 1. Handle Parameter Passing (By Value / By Reference)
-        for param, arg_expr in zip(subroutine_decl.parameters, call.arguments):
-            
-            if param.is_reference:
-                # Parameter is passed By Reference (OUTPUT)
-                if not isinstance(arg_expr, Identifier) and not isinstance(arg_expr, ArrayAccess):
-                    raise RuntimeError(f"Argument for reference parameter '{param.name}' must be a variable or array access passed by name.")
+    def resolve_subroutine(self, decl: Union[FunctionDeclaration, ProcedureDeclaration]):
+        scope = Scope()
+        decl.param_slots = [scope.declare(param.name, param.param_type) for param in decl.parameters]
+        for local in decl.declarations:
+            if isinstance(local, VariableDeclaration):
+                scope.declare(local.name, local.var_type)
+        if isinstance(decl, FunctionDeclaration):
+            # The return value lives in a local variable named after the function
+            decl.return_slot = scope.declare(decl.name, decl.return_type)
+        decl.scope = scope
 
-                # For simple types, we rely on the parent environment's assign method for assignment.
-                # For array objects, we pass the ArrayObject reference.
-                arg_name = arg_expr.name.upper()
-                
-                try:
-                    arg_val = self.env.get(arg_expr.name)
-                    local_env.define(param.name, arg_val) # Define locally, will be updated in parent on assignment
-                except RuntimeError:
-                     raise RuntimeError(f"Reference parameter '{param.name}' argument '{arg_expr.name}' not found in caller's environment.")
+        for local in decl.declarations:
+            if isinstance(local, VariableDeclaration):
+                self.resolve_node(local.var_type, scope)
+        for stmt in decl.body:
+            self.resolve_node(stmt, scope)
 
+    def resolve_node(self, root: Any, scope: Optional[Scope]):
+        if not isinstance(root, ASTNode):
+            return
+        for node in walk(root):
+            if isinstance(node, (Identifier, ArrayAccess)):
+                name = node.name
+            elif isinstance(node, Assignment):
+                name = node.identifier
+            elif isinstance(node, ForLoop):
+                name = node.variable
+            elif isinstance(node, ReadStatement):
+                node.types = [self.declared_type(target, scope) for target in node.variables]
+                continue
             else:
-                # Parameter is passed By Value (INPUT)
-                value = self.evaluate(arg_expr)
-                local_env.define(param.name, value)
-        
-        # 2. Process Local Declarations
-        for decl in subroutine_decl.declarations:
-            if isinstance(decl, VariableDeclaration):
-                if isinstance(decl.var_type, ArrayType):
-                    evaluated_bounds = []
-                    for dim in decl.var_type.dimensions:
-                        # Array bounds must be evaluated first (they rely only on constants/literals)
-                        try:
-                            # Evaluate bounds in the current (caller's) environment, which should contain all global constants.
-                            start = int(self.evaluate(dim.start))
-                            end = int(self.evaluate(dim.end))
-                        except Exception as e:
-                            line = decl.line if decl.line != 0 else '?'
-                            raise RuntimeError(f"Array bounds must evaluate to integers. Error in '{decl.name}' array declaration (line {line}): {e}")
-
-                        if not isinstance(start, int) or not isinstance(end, int):
-                             raise RuntimeError("Array bounds must evaluate to integers.")
-                        
-                        evaluated_bounds.append({'from': start, 'to': end})
-                        
-                    local_env.define(decl.name, ArrayObject(evaluated_bounds))
-                    self.log(f"Declared local array: {decl.name} with bounds: {evaluated_bounds}")
+                continue
+            key = name.upper()
+            if scope is not None and key in scope.slots:
+                node.depth, node.slot = LOCAL, scope.slots[key]
+            else:
+                node.depth, node.slot = GLOBAL, self.global_scope.declare(name)
+
+    def declared_type(self, target: ASTNode, scope: Optional[Scope]) -> Optional[str]:
+        """The declared type of a ΔΙΑΒΑΣΕ target, or None for undeclared variables."""
+        if not isinstance(target, (Identifier, ArrayAccess)):
+            return None
+        key = target.name.upper()
+        if scope is not None and key in scope.slots:
+            return scope.types.get(key)
+        return self.global_scope.types.get(key)
+
+
+class FrameLayout:
+    """The frame of one subroutine, laid out once and copied for every call.
+
+    `template` is an empty frame with the local scalars already 0, so a call
+    only fills in its parameters and allocates its local arrays. Array bounds
+    that are integer literals (as -O leaves bounds written with constants)
+    are worked out here rather than on every call.
+    """
+    def __init__(self, decl: Union[FunctionDeclaration, ProcedureDeclaration]):
+        self.decl = decl
+        self.size = len(decl.scope)
+        self.parameters = list(zip(decl.parameters, decl.param_slots))
+        self.is_function = isinstance(decl, FunctionDeclaration)
+        self.return_slot = decl.return_slot
+        self.local_scalars = []
+        self.local_arrays = []  # (slot, declaration, bounds or None to evaluate per call)
+        for local in decl.declarations:
+            if isinstance(local, VariableDeclaration):
+                slot = decl.scope.slots[local.name.upper()]
+                if isinstance(local.var_type, ArrayType):
+                    self.local_arrays.append((slot, local, literal_bounds(local)))
                 else:
-                    # Simple variables are initialized to 0/empty
-                    local_env.define(decl.name, 0)
-                    self.log(f"Declared local variable: {decl.name}")
-                
-        # 3. Execute Subroutine Body
-        # Temporarily switch the interpreter's environment
-        old_env = self.env
-        self.env = local_env
-        return_value = None
+                    self.local_scalars.append(slot)
+        self.template = [UNDEFINED] * self.size
+        for slot in self.local_scalars:
+            self.template[slot] = 0
+
+
+def literal_bounds(decl: VariableDeclaration) -> Optional[List[Dict[str, int]]]:
+    """The bounds of an array declared with integer literals only, else None."""
+    bounds = []
+    for dim in decl.var_type.dimensions:
+        if not (isinstance(dim.start, Literal) and isinstance(dim.end, Literal)
+                and type(dim.start.value) is int and type(dim.end.value) is int):
+            return None
+        bounds.append({'from': dim.start.value, 'to': dim.end.value})
+    return bounds
+
+
+def link_calls(program: Program, subroutines: Dict[str, Any]):
+    """Link every call in `program` to the FrameLayout of the subroutine it calls.
+
+    Calls of an undefined name, with the wrong number of arguments or of a
+    procedure inside an expression stay unlinked and fail if they run.
+    """
+    layouts = {}
+    for node in walk(program):
+        if not isinstance(node, CallExpression):
+            continue
+        key = node.name.upper()
+        decl = subroutines.get(key)
+        if decl is None or len(node.arguments) != len(decl.parameters):
+            continue
+        if not node.is_statement and not isinstance(decl, FunctionDeclaration):
+            continue
+        layout = layouts.get(key)
+        if layout is None:
+            layout = layouts[key] = FrameLayout(decl)
+        node.site = layout
+
+
+# Pieces of program output (values, separators, line ends) collected before they are written out
+OUTPUT_BUFFER_SIZE = 1 << 14
+
+
+class OutputBuffer:
+    """Program output (ΤΥΠΩΣΕ), written to `stream` in large chunks.
+
+    Output is written when the buffer is full, before a ΔΙΑΒΑΣΕ prompt and
+    when the program ends. On a terminal it is also written at each EOLN, so
+    whole lines appear as they are printed; `unbuffered` writes out every
+    ΤΥΠΩΣΕ at once.
+    """
+
+    def __init__(self, stream=None, unbuffered=False):
+        self.stream = sys.stdout if stream is None else stream
+        self.unbuffered = unbuffered
+        isatty = getattr(self.stream, 'isatty', None)
+        self.line_buffered = bool(isatty and isatty())
+        self.parts = []
+        self.eoln = False  # Whether the ΤΥΠΩΣΕ being written has ended a line
+
+    def print_values(self, *values):
+        """Write the values of one ΤΥΠΩΣΕ: space-separated, EOLN ends the line."""
+        previous = "__EOLN__"
+        for value in values:
+            previous = self.print_value(value, previous)
+        self.end_print()
+
+    def print_value(self, value, previous="__EOLN__"):
+        """Add the next value of a ΤΥΠΩΣΕ as soon as it is known; returns it.
+
+        `previous` is the value printed before it, EOLN for the first one, and
+        only decides whether a space goes in between. ΤΥΠΩΣΕ values are added
+        one by one so that those printed before a failing one still appear.
+        """
+        if value == "__EOLN__":
+            self.parts.append('\n')
+            self.eoln = True
+        else:
+            if previous != "__EOLN__":
+                self.parts.append(' ')
+            self.parts.append(str(value))
+        return value
+
+    def end_print(self):
+        """Finish a ΤΥΠΩΣΕ, writing out the buffer when it is time to."""
+        if self.unbuffered or len(self.parts) >= OUTPUT_BUFFER_SIZE or (self.eoln and self.line_buffered):
+            self.flush()
+        self.eoln = False
+
+    def flush(self):
+        if self.parts:
+            text = ''.join(self.parts)
+            self.parts = []
+            self.stream.write(text)
+        self.stream.flush()
+
+
+def _read_boolean(word: str) -> bool:
+    word = remove_accents(word).upper()
+    if word in ('ΑΛΗΘΗΣ', 'TRUE'):
+        return True
+    if word in ('ΨΕΥΔΗΣ', 'FALSE'):
+        return False
+    raise ValueError(word)
+
+
+# Declared type -> (conversion of an input word, type name for error messages)
+INPUT_TYPES = {
+    'INTEGER_TYPE': (int, 'ΑΚΕΡΑΙΟΣ'),
+    'REAL_TYPE': (float, 'ΠΡΑΓΜΑΤΙΚΟΣ'),
+    'BOOLEAN_TYPE': (_read_boolean, 'ΛΟΓΙΚΟΣ'),
+    'CHAR_TYPE': (str, 'ΧΑΡΑΚΤΗΡΑΣ'),
+    'STRING_TYPE': (str, 'ΣΥΜΒΟΛΟΣΕΙΡΑ'),
+}
+
+
+class InputReader:
+    """Prompt-free input for ΔΙΑΒΑΣΕ (--input FILE, --no-prompt).
+
+    `stream` is split on whitespace as it is read, so values may share lines
+    or be spread over many. Each value is converted according to the declared
+    type of the variable it is read into; values for undeclared variables are
+    numbers when they look like one and strings otherwise.
+    """
+
+    def __init__(self, stream):
+        self.words = (word for line in iter(stream.readline, '') for word in line.split())
+
+    def read(self, var_name: str, var_type: Optional[str] = None) -> Any:
+        word = next(self.words, None)
+        if word is None:
+            raise RuntimeError(f"No input left to read into {var_name}")
+        if var_type is None:
+            try:
+                return float(word) if '.' in word else int(word)
+            except ValueError:
+                return word
+        convert, type_name = INPUT_TYPES[var_type]
+        try:
+            return convert(word)
+        except ValueError:
+            raise RuntimeError(f"Invalid input for {var_name}: '{word}' is not a {type_name}")
+
+
+class StepLimitExceeded(RuntimeError):
+    """The program took more steps than --max-steps allows."""
+
+
+class TimeLimitExceeded(RuntimeError):
+    """The program ran for longer than --timeout allows."""
+
+
+class StackOverflow(RuntimeError):
+    """EAP calls nested deeper than --max-depth allows."""
+
+
+# Nested EAP calls a run may make unless --max-depth says otherwise
+DEFAULT_MAX_DEPTH = 1_000_000
+
+# Python frames allowed per nested EAP call on the engines that nest calls on
+# the Python stack, and the stack of the thread they run on: reserved up
+# front, but only touched as deep as the calls go
+PYTHON_FRAMES_PER_CALL = 32
+DEEP_STACK_SIZE = 1 << 30
+
+
+def stack_overflow(max_depth: int, name: str, line: Optional[int] = None) -> StackOverflow:
+    where = "" if line is None else f" at line {line}"
+    return StackOverflow(f"Stack overflow: more than {max_depth} nested calls, calling '{name}'{where}")
+
+
+def start_deep(interpreter: Interpreter):
+    """Run a prepared interpreter's program with room for `max_depth` nested calls.
+
+    Engines that nest EAP calls on the Python stack run on a thread with a
+    large stack and a recursion limit to match; the vm keeps calls on its
+    own stack and runs on the calling thread.
+    """
+    if not interpreter.python_stack:
+        interpreter.start()
+        return
+    import threading
+
+    failure = []
+
+    def run():
+        try:
+            interpreter.start()
+        except BaseException as e:
+            failure.append(e)
+
+    limit = sys.getrecursionlimit()
+    try:
+        size = threading.stack_size(DEEP_STACK_SIZE)
+    except (ValueError, RuntimeError):
+        # No stacks that large here: run as deep as the current one allows
+        interpreter.start()
+        return
+    thread = threading.Thread(target=run, name="eap", daemon=True)
+    sys.setrecursionlimit(limit + interpreter.max_depth * PYTHON_FRAMES_PER_CALL)
+    try:
+        try:
+            thread.start()
+        finally:
+            threading.stack_size(size)
+        try:
+            # Joined with a timeout so Ctrl+C reaches this thread on every platform
+            while thread.is_alive():
+                thread.join(0.25)
+        except KeyboardInterrupt:
+            interrupt_thread(thread)
+            thread.join(1.0)
+            raise
+    finally:
+        sys.setrecursionlimit(limit)
+    if failure:
+        raise failure[0]
+
+
+def interrupt_thread(thread):
+    """Raise KeyboardInterrupt in `thread` once it next runs Python code."""
+    import ctypes
+    ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(thread.ident), ctypes.py_object(KeyboardInterrupt))
+
+
+# Steps taken between two looks at the clock when only --timeout is set
+BUDGET_CLOCK_INTERVAL = 4096
+
+
+class ExecutionBudget:
+    """Step and time limits for a run (--max-steps, --timeout).
+
+    A step is one loop iteration or one subroutine call, so a program can
+    only run away from the budget through a loop back-edge or a call, and
+    nothing else is counted. Each step decrements `countdown`; when it runs
+    out, `check()` adds up the steps taken, compares them and the clock with
+    the limits and hands out the next stretch of steps.
+    """
+
+    def __init__(self, max_steps: Optional[int] = None, timeout: Optional[float] = None):
+        self.max_steps = max_steps
+        self.timeout = timeout
+        self.steps = 0
+        self.deadline = None
+        self.chunk = 0
+        self.countdown = 0
+
+    def start(self):
+        """Begin (or begin again) a run with the whole budget available."""
+        self.steps = 0
+        self.chunk = self.countdown = 0
+        if self.timeout is not None:
+            import time
+            self.deadline = time.monotonic() + self.timeout
+        self.check(0)
+
+    def step(self, line: int):
+        self.countdown -= 1
+        if self.countdown <= 0:
+            self.check(line)
+
+    def check(self, line: int):
+        self.steps += self.chunk - self.countdown
+        if self.max_steps is not None and self.steps > self.max_steps:
+            raise StepLimitExceeded(f"Step limit of {self.max_steps} exceeded at line {line}")
+        if self.deadline is not None:
+            import time
+            if time.monotonic() > self.deadline:
+                raise TimeLimitExceeded(f"Time limit of {self.timeout:g} s exceeded at line {line}")
+        self.chunk = BUDGET_CLOCK_INTERVAL if self.deadline is not None else 1 << 30
+        if self.max_steps is not None:
+            self.chunk = min(self.chunk, self.max_steps - self.steps + 1)
+        self.countdown = self.chunk
+
+    def counted(self, body, line: int):
+        """Wrap a compiled closure so that each call takes one step."""
+        def run(frame):
+            self.countdown -= 1
+            if self.countdown <= 0:
+                self.check(line)
+            return body(frame)
+        return run
+
+
+class MemoryLimitExceeded(RuntimeError):
+    """The program needed more memory than --max-memory allows."""
+
+
+# Accounted sizes: one reference (or int64) per variable slot and array cell,
+# plus a fixed overhead per subroutine frame
+SLOT_BYTES = 8
+FRAME_BYTES = 64
+
+
+def format_size(size: int) -> str:
+    for unit in ('bytes', 'KiB', 'MiB'):
+        if size < 1024:
+            return f"{size:g} {unit}"
+        size /= 1024
+    return f"{size:.4g} GiB"
+
+
+class MemoryQuota:
+    """Live memory accounting for a run (--max-memory).
+
+    Arrays are charged for their declared cells before they are allocated
+    and subroutine frames for their slots when they are entered; both are
+    released when the frame that owns them is left, while global arrays
+    stay charged to the end. Strings built by concatenation or read by
+    ΔΙΑΒΑΣΕ must fit in what is left of the quota. `peak` is the most that
+    was ever charged at once.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+        self.peak = 0
+        self.frames = []  # Bytes charged to each active subroutine frame
+
+    def allocate(self, size: int, what: str, line: int):
+        if self.used + size > self.limit:
+            raise MemoryLimitExceeded(f"Memory limit of {format_size(self.limit)} exceeded by {what} at line {line}")
+        self.used += size
+        if self.used > self.peak:
+            self.peak = self.used
+        if self.frames:
+            self.frames[-1] += size
+
+    def array(self, bounds: List[Dict[str, int]], name: str, line: int):
+        cells = 1
+        for bound in bounds:
+            cells *= max(bound['to'] - bound['from'] + 1, 0)
+        self.allocate(cells * SLOT_BYTES, f"array {name} ({cells} cells)", line)
+
+    def enter(self, slots: int, line: int):
+        self.frames.append(0)
+        self.allocate(FRAME_BYTES + slots * SLOT_BYTES, "a subroutine frame", line)
+
+    def leave(self):
+        self.used -= self.frames.pop()
+
+    def string(self, value: Any) -> Any:
+        if value.__class__ is str and len(value) > self.limit - self.used:
+            raise MemoryLimitExceeded(f"Memory limit of {format_size(self.limit)} exceeded by a string of {len(value)} characters")
+        return value
+
+    def add(self, left: Any, right: Any) -> Any:
+        """`left + right`, with string results checked against the quota."""
+        return self.string(left + right)
+
+
+class Hooks:
+    """Receives the events of a running program; every event is ignored here.
+
+    Subclass it, override the events you need and pass an instance as
+    Interpreter(hooks=...); every engine reports every event. Without hooks
+    the tree engine makes one `is None` test per event site and the closures
+    engine one per call, while the vm and python engines run code compiled
+    without any; no event is ever formatted or dispatched.
+    """
+
+    def on_statement(self, stmt: ASTNode):
+        """`stmt` is about to run."""
+
+    def on_assign(self, name: str, indices: Optional[List[int]], value: Any, line: int):
+        """`value` was stored in variable `name`, or in its element `indices`."""
+
+    def on_call(self, decl, line: int):
+        """The subroutine declared by `decl` is called from `line`."""
+
+    def on_return(self, decl, value: Any):
+        """The subroutine declared by `decl` returns `value` (None for a procedure)."""
+
+    def on_read(self, name: str, value: Any, line: int):
+        """ΔΙΑΒΑΣΕ read `value` into `name` (with its indices, as in 'A[1,2]')."""
+
+    def on_print(self, values: tuple, line: int):
+        """ΤΥΠΩΣΕ is about to print `values`."""
+
+    def handles(self, event: str) -> bool:
+        """Whether this class overrides `event`, e.g. 'on_assign'."""
+        return getattr(type(self), event) is not getattr(Hooks, event)
+
+
+class DebugHooks(Hooks):
+    """The --debug trace of assignments and reads, on stderr."""
+
+    def on_assign(self, name, indices, value, line):
+        if indices is None:
+            print(f"[DEBUG] Assign: {name} = {value}", file=sys.stderr)
+        else:
+            print(f"[DEBUG] Array assign: {name}[{indices}] = {value}", file=sys.stderr)
+
+    def on_read(self, name, value, line):
+        print(f"[DEBUG] Read: {name} = {value}", file=sys.stderr)
+
+
+class Interpreter:
+
+    # Whether simple element-wise ΓΙΑ loops may run as bulk operations
+    vector_loops = True
+    # Whether EAP calls nest on the Python stack (see start_deep)
+    python_stack = True
+    
+    def __init__(self, debug=False, output: Optional[OutputBuffer] = None,
+                 reader: Optional[InputReader] = None, budget: Optional[ExecutionBudget] = None,
+                 memory: Optional[MemoryQuota] = None, hooks: Optional[Hooks] = None,
+                 optimize: bool = False, memoize: bool = False, max_depth: int = DEFAULT_MAX_DEPTH):
+        self.debug = debug
+        # Receives the program's run-time events; --debug traces them
+        self.hooks = DebugHooks() if hooks is None and debug else hooks
+        # Program output; debug runs write it out at once to keep it in order with the log
+        self.output = output if output is not None else OutputBuffer(unbuffered=debug)
+        # Prompt-free input for ΔΙΑΒΑΣΕ; None reads each value from a prompted line
+        self.reader = reader
+        # Step and time limits checked at loop back-edges and calls; None runs unchecked
+        self.budget = budget
+        # Accounting for arrays, frames and strings under --max-memory; None runs unchecked
+        self.memory = memory
+        self.binary_operators = BINARY_OPERATORS if memory is None else {**BINARY_OPERATORS, '+': memory.add}
+        # Optimize the program before running it (-O); the passes that did, once prepared
+        self.optimize = optimize
+        self.optimizers = []
+        # Cache the results of pure functions (--memoize); the MemoTable, once prepared
+        self.memoize = memoize
+        self.memo = None
+        # Nested subroutine calls allowed, and how many are in progress
+        self.max_depth = max_depth
+        self.call_depth = 0
+        # Content hash of the program source and where engines may cache compiled code
+        self.source_digest = None
+        self.cache_dir = None
+        self.subroutines = {}
+        self.global_scope = Scope()
+        self.globals = []
+        # Frames indexed by a resolved depth: (current frame, global frame)
+        self.frames = (self.globals, self.globals)
+ 
+    def log(self, msg):
+        if self.debug:
+            print(f"[DEBUG] {msg}", file=sys.stderr)
+    
+    def execute(self, program: Program):
+        self.prepare(program)
+        self.start()
+
+    def prepare(self, program: Program):
+        """Do everything that comes before the first statement runs.
+
+        A prepared interpreter can be copied (see run_cases) and each copy
+        started on its own input.
+        """
+        self.declare(program)
+        self.program = program
+
+    def start(self):
+        """Run the main body of the prepared program."""
+        for stmt in self.program.body:
+            self.execute_statement(stmt)
+
+    def declare(self, program: Program):
+        """Resolve variables, then define the program's constants, subroutines and globals."""
+        self.log(f"Executing program: {program.name}")
+        self.global_scope = Resolver().resolve(program)
+        self.globals = [UNDEFINED] * len(self.global_scope)
+        self.frames = (self.globals, self.globals)
+        slots = self.global_scope.slots
+
+        # Define the EOLN constant for EAP compatibility
+        self.globals[slots['EOLN']] = "__EOLN__" # Use a sentinel value
+        
+        # --- Phase 1: Define Constants and Subroutines ---
+        for decl in program.declarations:
+            if isinstance(decl, ConstantDeclaration):
+                value = self.evaluate(decl.value)
+                self.globals[slots[decl.name.upper()]] = value
+                self.log(f"Defined constant: {decl.name} = {value}")
+            
+            elif isinstance(decl, (FunctionDeclaration, ProcedureDeclaration)):
+                self.subroutines[decl.name.upper()] = decl
+                self.log(f"Defined subroutine: {decl.name}")
+
+        if self.optimize:
+            self.optimizers.append(fold_constants(self, program))
+        if self.vector_loops and self.hooks is None and (self.budget is None or self.budget.max_steps is None):
+            # Bulk loops would skip the per-assignment events and the step count
+            vectorize(program)
+        if self.optimize and self.hooks is None:
+            # Hooks would see the assignments to the loop optimizer's temporaries
+            self.optimizers.append(optimize_loops(program))
+            self.globals.extend([UNDEFINED] * (len(self.global_scope) - len(self.globals)))
+        if self.memoize and self.hooks is None:
+            # Hooks would not see the calls answered from the cache
+            self.memo = MemoTable(pure_functions(program))
+        # After the passes above, which may change subroutine frames
+        link_calls(program, self.subroutines)
+
+        # --- Phase 2: Define Variables (including arrays, which now rely on constants) ---
+        for decl in program.declarations:
+            if isinstance(decl, VariableDeclaration):
+                if isinstance(decl.var_type, ArrayType):
+                    array = self.new_array(decl)
+                    self.globals[slots[decl.name.upper()]] = array
+                    self.log(f"Declared array: {decl.name} with bounds: {array.bounds}")
+                else:
+                    self.globals[slots[decl.name.upper()]] = 0
+                self.log(f"Declared variable: {decl.name}")
+
+    def global_values(self) -> Dict[str, Any]:
+        """The assigned global variables by upper-cased name."""
+        return {key: self.globals[slot] for key, slot in self.global_scope.slots.items()
+                if self.globals[slot] is not UNDEFINED}
+
+    def get_subroutine(self, name: str):
+        try:
+            return self.subroutines[name.upper()]
+        except KeyError:
+            raise RuntimeError(f"Undefined function or procedure: {name}")
+
+    def new_array(self, decl: VariableDeclaration, bounds: Optional[List[Dict[str, int]]] = None) -> ArrayObject:
+        """Allocate the array declared by `decl`, charging its cells to the memory quota.
+
+        `bounds` are the declared bounds when already known.
+        """
+        if bounds is None:
+            bounds = self._array_bounds(decl)
+        if self.memory is not None:
+            self.memory.array(bounds, decl.name, decl.line)
+        return ArrayObject(bounds, decl.var_type.base_type)
+
+    def _array_bounds(self, decl: VariableDeclaration) -> List[Dict[str, int]]:
+        """Evaluate the dimensions of an array declaration in the current frame."""
+        evaluated_bounds = []
+        for dim in decl.var_type.dimensions:
+            # Array bounds must be evaluated first (they rely only on constants/literals)
+            try:
+                start = int(self.evaluate(dim.start))
+                end = int(self.evaluate(dim.end))
+            except Exception as e:
+                line = decl.line if decl.line != 0 else '?'
+                raise RuntimeError(f"Array bounds must evaluate to integers. Error in '{decl.name}' array declaration (line {line}): {e}")
+
+            if not isinstance(start, int) or not isinstance(end, int):
+                 raise RuntimeError("Array bounds must evaluate to integers.")
+            
+            evaluated_bounds.append({'from': start, 'to': end})
+        return evaluated_bounds
+
+    def _execute_subroutine(self, subroutine_decl: Union[FunctionDeclaration, ProcedureDeclaration], call: CallExpression):
+        layout = call.site
+        if layout is None:
+            # Calls are linked when the program is declared; only ill-formed ones are not
+            if len(call.arguments) != len(subroutine_decl.parameters):
+                raise RuntimeError(f"Function/Procedure '{call.name}' called with {len(call.arguments)} arguments, expected {len(subroutine_decl.parameters)}.")
+            layout = FrameLayout(subroutine_decl)
+
+        # Local scalars start out as 0 in the template
+        frame = layout.template.copy()
+        if self.memory is not None:
+            self.memory.enter(layout.size, subroutine_decl.line)
+        
+        # 1. Handle Parameter Passing (By Value / By Reference)
+        for (param, slot), arg_expr in zip(layout.parameters, call.arguments):
+            
+            if param.is_reference:
+                # Parameter is passed By Reference (OUTPUT)
+                if not isinstance(arg_expr, Identifier) and not isinstance(arg_expr, ArrayAccess):
+                    raise RuntimeError(f"Argument for reference parameter '{param.name}' must be a variable or array access passed by name.")
+
+                # Array objects are shared with the caller; simple values are copied in.
+                arg_val = self.frames[arg_expr.depth][arg_expr.slot]
+                if arg_val is UNDEFINED:
+                     raise RuntimeError(f"Reference parameter '{param.name}' argument '{arg_expr.name}' not found in caller's environment.")
+                frame[slot] = arg_val
+
+            else:
+                # Parameter is passed By Value (INPUT)
+                frame[slot] = self.evaluate(arg_expr)
+        
+        if self.hooks is not None:
+            self.hooks.on_call(subroutine_decl, call.line)
+
+        if self.call_depth >= self.max_depth:
+            raise stack_overflow(self.max_depth, subroutine_decl.name, call.line)
+        self.call_depth += 1
+
+        # Switch to the subroutine's frame, linked lexically to the globals
+        old_frames = self.frames
+        self.frames = (frame, self.globals)
         try:
+            # 2. Allocate Local Arrays
+            for slot, decl, bounds in layout.local_arrays:
+                frame[slot] = self.new_array(decl, bounds)
+                self.log(f"Declared local array: {decl.name} with bounds: {frame[slot].bounds}")
+            if self.debug:
+                for slot in layout.local_scalars:
+                    self.log(f"Declared local variable: {subroutine_decl.scope.names[slot]}")
+
+            # 3. Execute Subroutine Body
+            if self.budget is not None:
+                self.budget.step(subroutine_decl.line)
             for stmt in subroutine_decl.body:
                 self.execute_statement(stmt)
         finally:
-            self.env = old_env
+            self.frames = old_frames
+            self.call_depth -= 1
+        if self.memory is not None:
+            self.memory.leave()
 
         # 4. Handle Return Value (if function)
-        if isinstance(subroutine_decl, FunctionDeclaration):
+        if layout.is_function:
             # The return value is stored in a local variable named after the function
-            return_value = local_env.get(subroutine_decl.name)
+            return_value = frame[layout.return_slot]
+            if return_value is UNDEFINED:
+                raise RuntimeError(f"Undefined variable: {subroutine_decl.name}")
+            if self.hooks is not None:
+                self.hooks.on_return(subroutine_decl, return_value)
+            return return_value
         
         # Procedures return nothing
-        return return_value
+        if self.hooks is not None:
+            self.hooks.on_return(subroutine_decl, None)
+        return None
+
+    def read_value(self, var_name: str, var_type: Optional[str] = None) -> Any:
+        """Read one value for ΔΙΑΒΑΣΕ into a variable declared as `var_type`.
+
+        Without a reader, prompts for the value and converts numbers.
+        """
+        value = self.read_input(var_name, var_type)
+        if self.memory is not None:
+            self.memory.string(value)
+        return value
+
+    def execute_read(self, stmt: ReadStatement):
+        """Run a ΔΙΑΒΑΣΕ statement in the current frames."""
+        for var_expr, var_type in zip(stmt.variables, stmt.types):
+            # Determine variable name for prompt
+            if isinstance(var_expr, Identifier):
+                var_name = var_expr.name
+            elif isinstance(var_expr, ArrayAccess):
+                indices = [int(self.evaluate(idx)) for idx in var_expr.indices]
+                var_name = f"{var_expr.name}[{','.join(map(str, indices))}]"
+            else:
+                var_name = "variable"
+
+            value = self.read_value(var_name, var_type)
+
+            # Assign to the variable or array element
+            if isinstance(var_expr, Identifier):
+                self.frames[var_expr.depth][var_expr.slot] = value
+            elif isinstance(var_expr, ArrayAccess):
+                arr = self.frames[var_expr.depth][var_expr.slot]
+                if not isinstance(arr, ArrayObject):
+                    raise _array_error(var_expr.name, arr)
+                arr.set(indices, value)
+            if self.hooks is not None:
+                self.hooks.on_read(var_name, value, stmt.line)
+
+    def read_input(self, var_name: str, var_type: Optional[str] = None) -> Any:
+        if self.reader is not None:
+            return self.reader.read(var_name, var_type)
+        self.output.flush()  # Show pending output before the prompt
+        try:
+            raw_input = input(f"Enter value for {var_name}: ")
+        except EOFError:
+            # Handle EOF
+            return -1
 
+        # 2. Ελέγχουμε αν η είσοδος είναι κενή/ελλιπής
+        if not raw_input.strip():
+            # Αν είναι κενή, αναθέτουμε μια τιμή (-1) που θα αποτύχει σίγουρα 
+            # στον έλεγχο αμυντικού προγραμματισμού (π.χ. < 100), αναγκάζοντας
+            # τον βρόχο REPEAT-UNTIL να επαναλάβει το ΔΙΑΒΑΣΕ.
+            return -1
+        try:
+            # 3. Προσπαθούμε να μετατρέψουμε σε αριθμό (για INTEGER/REAL)
+            if '.' in raw_input:
+                return float(raw_input)
+            return int(raw_input)
+        except ValueError:
+            # 4. Αν αποτύχει η μετατροπή (π.χ. εισήχθη συμβολοσειρά), 
+            # αναθέτουμε τη συμβολοσειρά.
+            return raw_input
 
     def execute_statement(self, stmt: ASTNode):
+        hooks = self.hooks
+        if hooks is not None:
+            hooks.on_statement(stmt)
+
         if isinstance(stmt, Assignment):
             value = self.evaluate(stmt.value)
             if stmt.indices:
-                arr = self.env.get(stmt.identifier)
+                arr = self.frames[stmt.depth][stmt.slot]
                 if not isinstance(arr, ArrayObject):
-                    raise RuntimeError(f"{stmt.identifier} is not an array")
+                    raise _array_error(stmt.identifier, arr)
                 indices = [int(self.evaluate(idx)) for idx in stmt.indices]
                 arr.set(indices, value)
-                self.log(f"Array assign: {stmt.identifier}[{indices}] = {value}")
+                if hooks is not None:
+                    hooks.on_assign(stmt.identifier, indices, value, stmt.line)
             else:
-                self.env.assign(stmt.identifier, value)
-                self.log(f"Assign: {stmt.identifier} = {value}")
+                self.frames[stmt.depth][stmt.slot] = value
+                if hooks is not None:
+                    hooks.on_assign(stmt.identifier, None, value, stmt.line)
         
  #       elif isinstance(stmt, PrintStatement):
  #           parts = []
@@ -1269,72 +2344,20 @@ class Interpreter:
  #           print(' '.join(parts), end='\n' if has_eoln else '')
  #       
         elif isinstance(stmt, PrintStatement):
-            # Process each expression in order, printing EOLN immediately when encountered
-            for i, expr in enumerate(stmt.expressions):
-                value = self.evaluate(expr)
-                if value == "__EOLN__":
-                    # Print newline immediately
-                    print()
-                else:
-                    # Print the value
-                    # Add space before if not the first item and previous wasn't EOLN
-                    if i > 0 and stmt.expressions[i-1] and self.evaluate(stmt.expressions[i-1]) != "__EOLN__":
-                        print(' ', end='')
-                    print(str(value), end='')
+            # Each expression is evaluated once and printed straight away;
+            # values are separated by a space, and EOLN ends the line
+            output = self.output
+            values = []
+            previous = "__EOLN__"
+            for expr in stmt.expressions:
+                previous = output.print_value(self.evaluate(expr), previous)
+                values.append(previous)
+            if hooks is not None:
+                hooks.on_print(tuple(values), stmt.line)
+            output.end_print()
                     
         elif isinstance(stmt, ReadStatement):
-            for var_expr in stmt.variables:
-                # Determine variable name for prompt
-                if isinstance(var_expr, Identifier):
-                    var_name = var_expr.name
-                elif isinstance(var_expr, ArrayAccess):
-                    indices = [int(self.evaluate(idx)) for idx in var_expr.indices]
-                    var_name = f"{var_expr.name}[{','.join(map(str, indices))}]"
-                else:
-                    var_name = "variable"
-                
-                try:
-                    raw_input = input(f"Enter value for {var_name}: ")
-                    
-                    # 2. Ελέγχουμε αν η είσοδος είναι κενή/ελλιπής
-                    if not raw_input.strip():
-                        # Αν είναι κενή, αναθέτουμε μια τιμή (-1) που θα αποτύχει σίγουρα 
-                        # στον έλεγχο αμυντικού προγραμματισμού (π.χ. < 100), αναγκάζοντας
-                        # τον βρόχο REPEAT-UNTIL να επαναλάβει το ΔΙΑΒΑΣΕ.
-                        value = -1 
-                    else:
-                        try:
-                            # 3. Προσπαθούμε να μετατρέψουμε σε αριθμό (για INTEGER/REAL)
-                            if '.' in raw_input:
-                                value = float(raw_input)
-                            else:
-                                value = int(raw_input)
-                        except ValueError:
-                            # 4. Αν αποτύχει η μετατροπή (π.χ. εισήχθη συμβολοσειρά), 
-                            # αναθέτουμε τη συμβολοσειρά.
-                            value = raw_input
-                            
-                  # Assign to the variable or array element
-                    if isinstance(var_expr, Identifier):
-                        self.env.assign(var_expr.name, value)
-                        self.log(f"Read: {var_expr.name} = {value}")
-                    elif isinstance(var_expr, ArrayAccess):
-                        arr = self.env.get(var_expr.name)
-                        if not isinstance(arr, ArrayObject):
-                            raise RuntimeError(f"{var_expr.name} is not an array")
-                        indices = [int(self.evaluate(idx)) for idx in var_expr.indices]
-                        arr.set(indices, value)
-                        self.log(f"Read: {var_expr.name}[{indices}] = {value}")
-                except EOFError:
-                    # Handle EOF
-                    if isinstance(var_expr, Identifier):
-                        self.env.assign(var_expr.name, -1)
-                        self.log(f"Read: {var_expr.name} = -1 (EOF)")
-                    elif isinstance(var_expr, ArrayAccess):
-                        arr = self.env.get(var_expr.name)
-                        indices = [int(self.evaluate(idx)) for idx in var_expr.indices]
-                        arr.set(indices, -1)
-                        self.log(f"Read: {var_expr.name}[{indices}] = -1 (EOF)")
+            self.execute_read(stmt)
 
         elif isinstance(stmt, IfStatement):
             if self.to_bool(self.evaluate(stmt.condition)):
@@ -1352,27 +2375,39 @@ class Interpreter:
             step = int(self.evaluate(stmt.step))
             
             current = start
+            frame, slot = self.frames[stmt.depth], stmt.slot
+            budget = self.budget
 
+            if stmt.vector is not None and stmt.vector.run(self.frames, start, end, self.evaluate, self.binary_operators):
+                return
             if step > 0:
                 while current <= end:
-                    self.env.assign(stmt.variable, current) 
+                    if budget is not None:
+                        budget.step(stmt.line)
+                    frame[slot] = current
                     for s in stmt.body:
                         self.execute_statement(s)
                     current += step
             else:
                 while current >= end:
-                    self.env.assign(stmt.variable, current)
+                    if budget is not None:
+                        budget.step(stmt.line)
+                    frame[slot] = current
                     for s in stmt.body:
                         self.execute_statement(s)
                     current += step
 
         elif isinstance(stmt, WhileLoop):
+            budget = self.budget
             while self.to_bool(self.evaluate(stmt.condition)):
+                if budget is not None:
+                    budget.step(stmt.line)
                 for s in stmt.body:
                     self.execute_statement(s)
         
         elif isinstance(stmt, CallExpression) and stmt.is_statement:
-            subroutine_decl = self.env.get_subroutine(stmt.name)
+            site = stmt.site
+            subroutine_decl = self.get_subroutine(stmt.name) if site is None else site.decl
             self._execute_subroutine(subroutine_decl, stmt)
 
         else:
@@ -1383,9 +2418,9 @@ class Interpreter:
             return expr.value
 
         elif isinstance(expr, Identifier):
-            value = self.env.get(expr.name)
-            if isinstance(value, ArrayObject):
-                return value
+            value = self.frames[expr.depth][expr.slot]
+            if value is UNDEFINED:
+                raise RuntimeError(f"Undefined variable: {expr.name}")
             return value
 
         elif isinstance(expr, BinaryOp):
@@ -1393,7 +2428,7 @@ class Interpreter:
             right = self.evaluate(expr.right)
             op = expr.operator
 
-            if op == '+': return left + right
+            if op == '+': return left + right if self.memory is None else self.memory.add(left, right)
             elif op == '-': return left - right
             elif op == '*': return left * right
             elif op == '/': 
@@ -1425,21 +2460,43 @@ class Interpreter:
             else: raise RuntimeError(f"Unknown unary operator: {expr.operator}")
 
         elif isinstance(expr, ArrayAccess):
-            arr = self.env.get(expr.name)
+            arr = self.frames[expr.depth][expr.slot]
             if not isinstance(arr, ArrayObject):
-                raise RuntimeError(f"{expr.name} is not an array")
+                raise _array_error(expr.name, arr)
             indices = [int(self.evaluate(idx)) for idx in expr.indices]
             return arr.get(indices)
 
         elif isinstance(expr, CallExpression) and not expr.is_statement:
-            subroutine_decl = self.env.get_subroutine(expr.name)
-            if not isinstance(subroutine_decl, FunctionDeclaration):
-                 raise RuntimeError(f"Procedure '{expr.name}' used as an expression (function).")
+            site = expr.site
+            if site is None:
+                subroutine_decl = self.get_subroutine(expr.name)
+                if not isinstance(subroutine_decl, FunctionDeclaration):
+                     raise RuntimeError(f"Procedure '{expr.name}' used as an expression (function).")
+            else:
+                subroutine_decl = site.decl
+            memo = self.memo
+            if memo is not None and expr.name.upper() in memo.functions:
+                return self._memoized_call(memo, subroutine_decl, expr)
             return self._execute_subroutine(subroutine_decl, expr)
 
         else:
             raise RuntimeError(f"Cannot evaluate: {type(expr).__name__}")
 
+    def _memoized_call(self, memo: MemoTable, decl: FunctionDeclaration, call: CallExpression) -> Any:
+        if len(call.arguments) != len(decl.parameters):
+            return self._execute_subroutine(decl, call)
+        values = tuple([self.evaluate(arg) for arg in call.arguments])
+        key = memo.key(decl.name.upper(), values)
+        result = memo.get(key)
+        if result is UNDEFINED:
+            # Run the call on the values already computed
+            call = CallExpression(type='Call', line=call.line, name=call.name,
+                                  arguments=[Literal(type='Lit', value=value) for value in values],
+                                  site=call.site)
+            result = self._execute_subroutine(decl, call)
+            memo.put(key, result)
+        return result
+
     def to_bool(self, value: Any) -> bool:
         if isinstance(value, bool): return value
         # Treat non-zero number, non-empty string, or truthy object as True
@@ -1448,90 +2505,3935 @@ class Interpreter:
         return bool(value)
 
 
-def detect_encoding(filename):
-    """Detect file encoding (UTF-8 or Windows-1253)"""
-    try:
-        with open(filename, 'rb') as f:
-            raw = f.read()
-            # Try UTF-8 first
-            try:
-                text = raw.decode('utf-8')
-                if 'ΑΛΓΟΡΙΘΜΟΣ' in text.upper() or 'ALGORITHM' in text.upper():
-                    return text, 'utf-8'
-            except:
-                pass
-            
-            # Try Windows-1253 (often used for Greek text)
-            try:
-                text = raw.decode('windows-1253')
-                if 'ΑΛΓΟΡΙΘΜΟΣ' in text.upper() or 'ALGORITHM' in text.upper():
-                    return text, 'windows-1253'
-            except:
-                pass
-            
-            # Default to UTF-8 with replacement for corrupted bytes
-            return raw.decode('utf-8', errors='replace'), 'utf-8'
+# =============================================================================
+# LOOP VECTORIZATION
+# =============================================================================
 
-    except FileNotFoundError:
-        print(f"Error: File '{filename}' not found", file=sys.stderr)
-        sys.exit(1)
-    except Exception as e:
-        print(f"Error reading file: {e}", file=sys.stderr)
-        sys.exit(1)
+# Loops shorter than this are cheaper to interpret than to set up in bulk
+VECTOR_MIN_ITERATIONS = 8
 
+VECTOR_OPERATORS = {'+': operator.add, '-': operator.sub, '*': operator.mul}
 
-def main():
-    if len(sys.argv) < 2:
-        print("EAP Pseudocode Interpreter")
-        print(f"Usage: {sys.argv[0]} <file.eap> [--debug]")
-        print("\nExample:")
-        print(f"  {sys.argv[0]} program.eap")
-        print(f"  {sys.argv[0]} program.eap --debug")
-        sys.exit(1)
-    filename = sys.argv[1]
-    debug = '--debug' in sys.argv
 
-    # Read file
-    code, encoding = detect_encoding(filename)
+class _NotVectorizable(Exception):
+    """Raised while running a VectorLoop to fall back to interpreting it."""
 
-    if debug:
-        print(f"[DEBUG] File encoding: {encoding}", file=sys.stderr)
-        print(f"[DEBUG] File size: {len(code)} characters", file=sys.stderr)
 
-    try:
-        # Tokenize
-        tokenizer = Tokenizer(code)
-        tokens = tokenizer.tokenize()
-        if debug:
-            print(f"[DEBUG] Generated {len(tokens)} tokens", file=sys.stderr)
-        
-        # Parse
-        parser = Parser(tokens)
-        ast = parser.parse()
-        if debug:
-            print(f"[DEBUG] Parsed program: {ast.name}", file=sys.stderr)
-            print(f"[DEBUG] Declarations: {len(ast.declarations)}", file=sys.stderr)
-            print(f"[DEBUG] Statements: {len(ast.body)}", file=sys.stderr)
-        
-        # Execute
-        interpreter = Interpreter(debug=debug)
-        interpreter.execute(ast)
-        
-    except SyntaxError as e:
-        print(f"Syntax Error: {e}", file=sys.stderr)
-        sys.exit(1)
-    except RuntimeError as e:
-        print(f"Runtime Error: {e}", file=sys.stderr)
-        sys.exit(1)
-    except KeyboardInterrupt:
-        print("\n\nExecution interrupted", file=sys.stderr)
-        sys.exit(130)
-    except Exception as e:
-        print(f"Error: {e}", file=sys.stderr)
-        if debug:
-            import traceback
-            traceback.print_exc()
+def _uses(expr: ASTNode, name: str) -> bool:
+    return any(isinstance(node, (Identifier, ArrayAccess)) and node.name.upper() == name
+               for node in walk(expr))
+
+
+def _is_invariant(expr: ASTNode, var: str) -> bool:
+    return not _uses(expr, var) and not any(isinstance(node, CallExpression) for node in walk(expr))
+
+
+def _is_loop_variable(expr: ASTNode, var: str) -> bool:
+    return isinstance(expr, Identifier) and expr.name.upper() == var
+
+
+class VectorLoop:
+    """A ΓΙΑ loop with step 1 whose body is run as one bulk slice operation.
+
+    Recognized bodies, with i the loop variable:
+        A[..., i, ...] := E     element-wise (a fill when E does not use i)
+        s := s + E              a reduction, also with - and *
+    E combines literals, i, loop invariant variables and arrays indexed by i
+    with + - * and unary minus; all other indices must be loop invariant.
+    Elements are combined with the interpreter's own `operators`, in the same
+    order, so results are identical and string concatenations are checked
+    against the memory quota as they would be one by one. Integer operands
+    that are all NumPy-backed are computed with NumPy when the values
+    provably fit in int64. `run` returns False when the loop cannot be done
+    in bulk (bounds errors, aliasing, non-array operands...) and the caller
+    then interprets it as usual.
+    """
+
+    def __init__(self, loop: ForLoop, assign: Assignment, expr: ASTNode, reduce_op: Optional[str]):
+        self.loop = loop
+        self.assign = assign
+        self.expr = expr
+        self.reduce_op = reduce_op
+        self.var = loop.variable.upper()
+        # Array accesses indexed by i, with the position of i in their indices
+        self.accesses = []
+        # Array accesses with invariant indices; they must not alias the target
+        self.invariant_arrays = []
+        for node in walk(assign):
+            if isinstance(node, ArrayAccess):
+                if any(_is_loop_variable(index, self.var) for index in node.indices):
+                    self.accesses.append((node, self._vector_dimension(node.indices, self.var)))
+                else:
+                    self.invariant_arrays.append(node)
+        if reduce_op is None:
+            self.accesses.append((assign, self._vector_dimension(assign.indices, self.var)))
+
+    @staticmethod
+    def _vector_dimension(indices: List[ASTNode], var: str) -> int:
+        """Position of the loop variable among `indices`, or -1 if the pattern is not simple."""
+        dims = [dim for dim, index in enumerate(indices) if _is_loop_variable(index, var)]
+        if len(dims) != 1:
+            return -1
+        if not all(_is_invariant(index, var) for dim, index in enumerate(indices) if dim != dims[0]):
+            return -1
+        return dims[0]
+
+    @classmethod
+    def _is_element_wise(cls, expr: ASTNode, var: str) -> bool:
+        if isinstance(expr, (Literal, Identifier)):
+            return True
+        if isinstance(expr, ArrayAccess):
+            return _is_invariant(expr, var) or cls._vector_dimension(expr.indices, var) >= 0
+        if isinstance(expr, BinaryOp):
+            return (expr.operator in VECTOR_OPERATORS and cls._is_element_wise(expr.left, var)
+                    and cls._is_element_wise(expr.right, var))
+        if isinstance(expr, UnaryOp):
+            return expr.operator == '-' and cls._is_element_wise(expr.operand, var)
+        return False
+
+    @classmethod
+    def plan(cls, loop: ForLoop) -> Optional['VectorLoop']:
+        """Return a plan for `loop` if its body has one of the recognized shapes."""
+        if not (isinstance(loop.step, Literal) and loop.step.value == 1):
+            return None
+        if len(loop.body) != 1 or not isinstance(loop.body[0], Assignment):
+            return None
+        assign = loop.body[0]
+        var = loop.variable.upper()
+        target = assign.identifier.upper()
+        if target == var:
+            return None
+
+        if assign.indices:
+            if cls._vector_dimension(assign.indices, var) < 0:
+                return None
+            expr = assign.value
+            if not cls._is_element_wise(expr, var):
+                return None
+            # Other elements of the target may only be read at the element being written
+            for node in walk(expr):
+                if isinstance(node, Identifier) and node.name.upper() == target:
+                    return None
+                if isinstance(node, ArrayAccess) and node.name.upper() == target and node.indices != assign.indices:
+                    return None
+            return cls(loop, assign, expr, None)
+
+        value = assign.value
+        if not (isinstance(value, BinaryOp) and value.operator in VECTOR_OPERATORS):
+            return None
+        if not (isinstance(value.left, Identifier) and value.left.name.upper() == target):
+            return None
+        if _uses(value.right, target) or not cls._is_element_wise(value.right, var):
+            return None
+        return cls(loop, assign, value.right, value.operator)
+
+    def run(self, frames, first: int, last: int, evaluate, operators: Dict[str, Any] = VECTOR_OPERATORS) -> bool:
+        count = last - first + 1
+        if count < VECTOR_MIN_ITERATIONS:
+            return False
+        try:
+            return self._run(frames, first, last, count, evaluate, operators)
+        except _NotVectorizable:
+            return False
+
+    def _slice(self, frames, node, dim: int, first: int, last: int, count: int, evaluate):
+        """Return (array, slice) covering node's elements for i = first..last."""
+        arr = frames[node.depth][node.slot]
+        if dim < 0 or not isinstance(arr, ArrayObject) or arr.sparse or len(node.indices) != arr.rank:
+            raise _NotVectorizable()
+        start = 0
+        for d, index_expr in enumerate(node.indices):
+            if d == dim:
+                if first < arr.lows[d] or last > arr.highs[d]:
+                    raise _NotVectorizable()
+                index = first
+            else:
+                index = int(evaluate(index_expr))
+                if not arr.lows[d] <= index <= arr.highs[d]:
+                    raise _NotVectorizable()
+            start += (index - arr.lows[d]) * arr.strides[d]
+        stride = arr.strides[dim]
+        return arr, slice(start, start + (count - 1) * stride + 1, stride)
+
+    def _run(self, frames, first, last, count, evaluate, operators) -> bool:
+        assign = self.assign
+        slices = {}
+        for node, dim in self.accesses:
+            slices[id(node)] = self._slice(frames, node, dim, first, last, count, evaluate)
+
+        target = None
+        if self.reduce_op is None:
+            target, target_slice = slices[id(assign)]
+            for node, _ in self.accesses:
+                arr, part = slices[id(node)]
+                if arr is target and part != target_slice:
+                    raise _NotVectorizable()
+            for node in self.invariant_arrays:
+                if frames[node.depth][node.slot] is target:
+                    raise _NotVectorizable()
+        else:
+            total = frames[assign.depth][assign.slot]
+            if total is UNDEFINED or isinstance(total, ArrayObject):
+                raise _NotVectorizable()
+
+        values = None
+        np = _numpy or None
+        if np is not None and all(slices[id(node)][0].ndarray for node, _ in self.accesses):
+            values = self._numpy_values(np, self.expr, slices, first, last, evaluate)
+        if values is not None:
+            is_vector, values, bound = values
+            exact = True
+        else:
+            is_vector, values, exact = self._values(self.expr, slices, first, last, evaluate, operators)
+
+        if self.reduce_op is not None:
+            from functools import reduce
+            op = operators[self.reduce_op]
+            if not is_vector:
+                values = repeat(values, count)
+            elif np is not None and isinstance(values, np.ndarray):
+                if self.reduce_op != '*' and type(total) is int and bound * count < (1 << 63):
+                    values = [int(values.sum())]
+                else:
+                    values = values.tolist()
+            frames[assign.depth][assign.slot] = reduce(op, values, total)
+        else:
+            self._store(target, target_slice, values, is_vector, exact, count)
+
+        frames[self.loop.depth][self.loop.slot] = last
+        return True
+
+    def _values(self, expr, slices, first, last, evaluate, operators):
+        """Evaluate expr for all i with Python objects: (is_vector, value(s), all exact ints)."""
+        if isinstance(expr, Identifier) and expr.name.upper() == self.var:
+            return True, range(first, last + 1), True
+        if isinstance(expr, ArrayAccess) and id(expr) in slices:
+            arr, part = slices[id(expr)]
+            return True, arr.data[part].tolist() if arr.ndarray else arr.data[part], arr.typed
+        if isinstance(expr, (Literal, Identifier, ArrayAccess)):
+            value = evaluate(expr)
+            if isinstance(value, ArrayObject):
+                raise _NotVectorizable()
+            return False, value, type(value) is int
+        if isinstance(expr, UnaryOp):
+            is_vector, value, exact = self._values(expr.operand, slices, first, last, evaluate, operators)
+            if is_vector:
+                return True, list(map(operator.neg, value)), exact
+            return False, -value, exact
+
+        op = operators[expr.operator]
+        left_vector, left, left_exact = self._values(expr.left, slices, first, last, evaluate, operators)
+        right_vector, right, right_exact = self._values(expr.right, slices, first, last, evaluate, operators)
+        exact = left_exact and right_exact
+        if not left_vector and not right_vector:
+            return False, op(left, right), exact
+        if not left_vector:
+            left = repeat(left)
+        if not right_vector:
+            right = repeat(right)
+        return True, list(map(op, left, right)), exact
+
+    def _numpy_values(self, np, expr, slices, first, last, evaluate):
+        """Evaluate expr with int64 NumPy arrays: (is_vector, value(s), bound on |values|).
+
+        Returns None when an operand is not an int or an intermediate result
+        could overflow int64; the caller then uses `_values`.
+        """
+        if isinstance(expr, Identifier) and expr.name.upper() == self.var:
+            return True, np.arange(first, last + 1, dtype=np.int64), max(abs(first), abs(last))
+        if isinstance(expr, ArrayAccess) and id(expr) in slices:
+            arr, part = slices[id(expr)]
+            view = arr.data[part]
+            return True, view, max(-int(view.min()), int(view.max()))
+        if isinstance(expr, (Literal, Identifier, ArrayAccess)):
+            value = evaluate(expr)
+            if type(value) is not int:
+                return None
+            return False, value, abs(value)
+        if isinstance(expr, UnaryOp):
+            operand = self._numpy_values(np, expr.operand, slices, first, last, evaluate)
+            if operand is None:
+                return None
+            is_vector, value, bound = operand
+            return is_vector, -value, bound
+
+        left = self._numpy_values(np, expr.left, slices, first, last, evaluate)
+        if left is None:
+            return None
+        right = self._numpy_values(np, expr.right, slices, first, last, evaluate)
+        if right is None:
+            return None
+        bound = left[2] * right[2] if expr.operator == '*' else left[2] + right[2]
+        if bound >= (1 << 63):
+            return None
+        return left[0] or right[0], VECTOR_OPERATORS[expr.operator](left[1], right[1]), bound
+
+    @staticmethod
+    def _store(target: ArrayObject, part: slice, values, is_vector: bool, exact: bool, count: int):
+        if not is_vector:
+            if target.typed and not fits_int64(values):
+                target.untype()
+            if target.ndarray:
+                target.data[part] = values
+            elif target.typed:
+                from array import array
+                target.data[part] = array('q', [values]) * count
+            else:
+                target.data[part] = [values] * count
+            return
+
+        if target.typed and not exact:
+            target.untype()
+        if target.typed:
+            try:
+                if target.ndarray:
+                    target.data[part] = values
+                else:
+                    from array import array
+                    target.data[part] = array('q', values)
+                return
+            except OverflowError:
+                target.untype()
+        if not isinstance(values, list):
+            values = values.tolist() if hasattr(values, 'tolist') else list(values)
+        target.data[part] = values
+
+
+def vectorize(program: Program):
+    """Attach a VectorLoop plan to every ΓΙΑ loop that can run in bulk."""
+    for node in walk(program):
+        if isinstance(node, ForLoop):
+            node.vector = VectorLoop.plan(node)
+
+
+# =============================================================================
+# CONSTANT FOLDING (-O)
+# =============================================================================
+#
+# With -O, once the ΣΤΑΘΕΡΕΣ have their values, expressions over literals and
+# constants are replaced by their value, and branches whose condition became
+# constant are cut out: an ΕΑΝ keeps only the branch it always takes, and an
+# ΕΝΟΣΩ whose body can never run disappears. Values are
+# computed by the tree walker itself, so folding never changes a result; an
+# expression whose evaluation fails (e.g. division by zero) is left for run
+# time to report.
+
+class ConstantFolder:
+    """Folds constant expressions and prunes dead branches of a resolved Program."""
+
+    def __init__(self, interpreter: Interpreter, program: Program):
+        self.interpreter = interpreter
+        self.subroutines = {decl.name.upper(): decl for decl in program.declarations
+                            if isinstance(decl, (FunctionDeclaration, ProcedureDeclaration))}
+        self.folded = 0
+        self.pruned = 0
+        self.removed = 0
+
+        # Global slot -> value of every constant the program never writes to
+        slots = interpreter.global_scope.slots
+        self.constants = {slots[decl.name.upper()]: interpreter.globals[slots[decl.name.upper()]]
+                          for decl in program.declarations if isinstance(decl, ConstantDeclaration)}
+        for target in self._written(program):
+            if target.depth == GLOBAL:
+                self.constants.pop(target.slot, None)
+
+    def _written(self, program: Program):
+        """The nodes naming variables that a statement may write to."""
+        for node in walk(program):
+            if isinstance(node, (Assignment, ForLoop)):
+                yield node
+            elif isinstance(node, ReadStatement):
+                yield from node.variables
+            elif isinstance(node, CallExpression):
+                decl = self.subroutines.get(node.name.upper())
+                if decl is not None:
+                    for param, arg in zip(decl.parameters, node.arguments):
+                        if param.is_reference and isinstance(arg, (Identifier, ArrayAccess)):
+                            yield arg
+
+    def fold(self, program: Program):
+        """Optimize `program` in place, counting the AST nodes removed."""
+        before = sum(1 for _ in walk(program))
+        for decl in self.subroutines.values():
+            decl.body = self.block(decl.body)
+        program.body = self.block(program.body)
+        self.removed = before - sum(1 for _ in walk(program))
+
+    def report(self) -> str:
+        return (f"Optimizer: removed {self.removed} AST nodes "
+                f"({self.folded} expressions folded, {self.pruned} branches pruned)")
+
+    # --- Statements ---
+
+    def block(self, statements: List[ASTNode]) -> List[ASTNode]:
+        folded = []
+        for stmt in statements:
+            folded.extend(self.statement(stmt))
+        return folded
+
+    def statement(self, stmt: ASTNode) -> List[ASTNode]:
+        """The statements that replace `stmt`."""
+        if isinstance(stmt, Assignment):
+            stmt.value = self.expr(stmt.value)
+            stmt.indices = [self.expr(idx) for idx in stmt.indices]
+
+        elif isinstance(stmt, PrintStatement):
+            stmt.expressions = [self.expr(expr) for expr in stmt.expressions]
+
+        elif isinstance(stmt, ReadStatement):
+            for target in stmt.variables:
+                if isinstance(target, ArrayAccess):
+                    target.indices = [self.expr(idx) for idx in target.indices]
+
+        elif isinstance(stmt, IfStatement):
+            stmt.condition = self.expr(stmt.condition)
+            stmt.then_branch = self.block(stmt.then_branch)
+            if stmt.else_branch:
+                stmt.else_branch = self.block(stmt.else_branch)
+            if isinstance(stmt.condition, Literal):
+                self.pruned += 1
+                if self.interpreter.to_bool(stmt.condition.value):
+                    return stmt.then_branch
+                return stmt.else_branch or []
+
+        elif isinstance(stmt, ForLoop):
+            stmt.start = self.expr(stmt.start)
+            stmt.end = self.expr(stmt.end)
+            stmt.step = self.expr(stmt.step)
+            stmt.body = self.block(stmt.body)
+
+        elif isinstance(stmt, WhileLoop):
+            stmt.condition = self.expr(stmt.condition)
+            stmt.body = self.block(stmt.body)
+            if isinstance(stmt.condition, Literal) and not self.interpreter.to_bool(stmt.condition.value):
+                self.pruned += 1
+                return []
+
+        elif isinstance(stmt, CallExpression):
+            self.call(stmt)
+
+        return [stmt]
+
+    # --- Expressions ---
+
+    def call(self, call: CallExpression):
+        decl = self.subroutines.get(call.name.upper())
+        for i, arg in enumerate(call.arguments):
+            # Arguments passed by reference must stay variables
+            if decl is not None and i < len(decl.parameters) and decl.parameters[i].is_reference:
+                if isinstance(arg, ArrayAccess):
+                    arg.indices = [self.expr(idx) for idx in arg.indices]
+                continue
+            call.arguments[i] = self.expr(arg)
+
+    def expr(self, expr: ASTNode) -> ASTNode:
+        if isinstance(expr, Identifier):
+            if expr.depth == GLOBAL and expr.slot in self.constants:
+                self.folded += 1
+                return Literal(type='Lit', value=self.constants[expr.slot], line=expr.line)
+            return expr
+
+        if isinstance(expr, BinaryOp):
+            expr.left = self.expr(expr.left)
+            expr.right = self.expr(expr.right)
+            if isinstance(expr.left, Literal) and isinstance(expr.right, Literal):
+                return self.constant(expr)
+
+        elif isinstance(expr, UnaryOp):
+            expr.operand = self.expr(expr.operand)
+            if isinstance(expr.operand, Literal):
+                return self.constant(expr)
+
+        elif isinstance(expr, ArrayAccess):
+            expr.indices = [self.expr(idx) for idx in expr.indices]
+
+        elif isinstance(expr, CallExpression):
+            self.call(expr)
+
+        return expr
+
+    def constant(self, expr: ASTNode) -> ASTNode:
+        """`expr`, whose operands are literals, as a Literal of its value."""
+        try:
+            value = self.interpreter.evaluate(expr)
+        except Exception:
+            return expr
+        self.folded += 1
+        return Literal(type='Lit', value=value, line=expr.line)
+
+
+def fold_constants(interpreter: Interpreter, program: Program) -> ConstantFolder:
+    """Fold constants in a resolved `program` whose ΣΤΑΘΕΡΕΣ `interpreter` has defined."""
+    folder = ConstantFolder(interpreter, program)
+    folder.fold(program)
+    interpreter.log(folder.report())
+    return folder
+
+
+# =============================================================================
+# LOOP OPTIMIZATION (-O)
+# =============================================================================
+#
+# After folding, -O moves the work a loop repeats for nothing out of it. An
+# expression in a ΓΙΑ or ΕΝΟΣΩ body whose variables the loop never writes is
+# computed once into a temporary before the loop (hoisting), and in a ΓΙΑ
+# body an integer expression linear in the loop variable, like (i - 1) * M,
+# becomes a temporary set before the loop and advanced by a constant at the
+# end of each iteration (strength reduction).
+#
+# Hoisting evaluates an expression even when the loop body would never have
+# run, so only expressions that cannot fail are moved: arithmetic and
+# comparisons over numeric literals and numeric variables, dividing only by
+# non-zero literals. A declared type does not make a variable numeric, since
+# `n := "abc"` or a prompted ΔΙΑΒΑΣΕ can store anything in it; a scalar
+# counts as numeric (or integer) only if every value the program can store
+# in it is. Temporaries are named `$N`, which no program can spell, and take
+# new slots in the frame of the code holding the loop.
+
+# Operators that cannot fail on numbers, and those that can only fail on their divisor
+HOISTABLE_OPERATORS = ('+', '-', '*', '=', '<>', '<', '>', '<=', '>=')
+DIVISION_OPERATORS = ('/', 'DIV', 'MOD', '%')
+NUMERIC_TYPES = ('INTEGER_TYPE', 'REAL_TYPE')
+
+
+class LoopOptimizer:
+    """Hoists loop invariants and strength-reduces loop arithmetic in a resolved Program."""
+
+    def __init__(self, program: Program):
+        self.program = program
+        self.subroutines = {decl.name.upper(): decl for decl in program.declarations
+                            if isinstance(decl, (FunctionDeclaration, ProcedureDeclaration))}
+        self.hoisted = 0
+        self.reduced = 0
+        self.temporaries = 0
+
+        # Global slots each subroutine may write, directly or through the calls it makes
+        self.global_writes = {key: set() for key in self.subroutines}
+        changed = True
+        while changed:
+            changed = False
+            for key, decl in self.subroutines.items():
+                written = {target for target in self.writes(decl.body) if target[0] == GLOBAL}
+                if written != self.global_writes[key]:
+                    self.global_writes[key] = written
+                    changed = True
+
+        # (subroutine or None for globals, slot) of every scalar that always holds a number
+        self.kinds = self.numbers()
+        self.global_numbers = {(GLOBAL, slot): integer for (owner, slot), integer in self.kinds.items()
+                               if owner is None}
+
+    def optimize(self):
+        for key, decl in self.subroutines.items():
+            # The return variable is unset until assigned, so reading it can fail
+            local_numbers = {(LOCAL, slot): integer for (owner, slot), integer in self.kinds.items()
+                             if owner == key and slot != decl.return_slot}
+            self.enter(decl.scope, LOCAL, {**self.global_numbers, **local_numbers})
+            decl.body = self.block(decl.body)
+        self.enter(self.program.scope, GLOBAL, dict(self.global_numbers))
+        self.program.body = self.block(self.program.body)
+
+    def report(self) -> str:
+        return (f"Optimizer: hoisted {self.hoisted} loop-invariant expressions, "
+                f"strength-reduced {self.reduced}")
+
+    def enter(self, scope: Scope, depth: int, numbers: Dict[Tuple[int, int], bool]):
+        """Optimize the code of the frame laid out by `scope` next."""
+        self.scope = scope
+        self.depth = depth
+        # (depth, slot) of every variable that always holds a number -> whether it is an integer
+        self.number_slots = numbers
+
+    # --- Analysis ---
+
+    def numbers(self) -> Dict[Tuple[Optional[str], int], bool]:
+        """The scalars declared numeric that only ever hold numbers -> whether only integers.
+
+        Declared scalars start out as 0, so each is assumed to keep its
+        declared type until a store of something else is found: an assignment
+        of a value that may be a string, boolean or array element, a ΔΙΑΒΑΣΕ,
+        or an argument of such a kind. Integer variables given a REAL become
+        REAL. Repeats until no more variables change.
+        """
+        kinds = {}
+        for decl in self.program.declarations:
+            if isinstance(decl, VariableDeclaration) and decl.var_type in NUMERIC_TYPES:
+                kinds[(None, self.program.scope.slots[decl.name.upper()])] = decl.var_type == 'INTEGER_TYPE'
+        for key, decl in self.subroutines.items():
+            for local in decl.declarations + decl.parameters:
+                var_type = local.var_type if isinstance(local, VariableDeclaration) else getattr(local, 'param_type', None)
+                if var_type in NUMERIC_TYPES:
+                    kinds[(key, decl.scope.slots[local.name.upper()])] = var_type == 'INTEGER_TYPE'
+            if isinstance(decl, FunctionDeclaration) and decl.return_type in NUMERIC_TYPES:
+                kinds[(key, decl.return_slot)] = decl.return_type == 'INTEGER_TYPE'
+
+        changed = True
+        while changed:
+            changed = False
+            for owner, body in [(None, self.program.body)] + [(key, decl.body) for key, decl in self.subroutines.items()]:
+                for root in body:
+                    for node in walk(root):
+                        for var, kind in self.stores(node, owner, kinds):
+                            if var in kinds and kind != kinds[var]:
+                                if kind is None:
+                                    del kinds[var]
+                                elif kinds[var]:
+                                    kinds[var] = False
+                                else:
+                                    continue
+                                changed = True
+        return kinds
+
+    def stores(self, node: ASTNode, owner: Optional[str], kinds: dict):
+        """The (variable, kind) of each scalar store `node` makes in code of `owner`.
+
+        A kind is True for an integer, False for another number and None for
+        anything else.
+        """
+        if isinstance(node, Assignment) and not node.indices:
+            yield (owner if node.depth == LOCAL else None, node.slot), self.kind(node.value, owner, kinds)
+        elif isinstance(node, ReadStatement):
+            for target in node.variables:
+                if isinstance(target, Identifier):
+                    yield (owner if target.depth == LOCAL else None, target.slot), None
+        elif isinstance(node, CallExpression):
+            decl = self.subroutines.get(node.name.upper())
+            if decl is not None:
+                for slot, arg in zip(decl.param_slots, node.arguments):
+                    yield (decl.name.upper(), slot), self.kind(arg, owner, kinds)
+
+    def kind(self, expr: ASTNode, owner: Optional[str], kinds: dict) -> Optional[bool]:
+        """Whether `expr` evaluates to an integer (True), another number (False) or maybe neither (None)."""
+        if isinstance(expr, Literal):
+            return {int: True, float: False}.get(type(expr.value))
+        if isinstance(expr, Identifier):
+            return kinds.get((owner if expr.depth == LOCAL else None, expr.slot))
+        if isinstance(expr, UnaryOp):
+            return self.kind(expr.operand, owner, kinds) if expr.operator == '-' else None
+        if isinstance(expr, BinaryOp):
+            left = self.kind(expr.left, owner, kinds)
+            right = self.kind(expr.right, owner, kinds)
+            if left is None or right is None:
+                return None
+            if expr.operator in ('+', '-', '*', 'MOD', '%'):
+                return left and right
+            if expr.operator == '/':
+                return False
+            if expr.operator == 'DIV':
+                return True
+            return None
+        if isinstance(expr, CallExpression):
+            decl = self.subroutines.get(expr.name.upper())
+            if isinstance(decl, FunctionDeclaration):
+                return kinds.get((decl.name.upper(), decl.return_slot))
+        return None
+
+    def writes(self, nodes: List[ASTNode]) -> set:
+        """The (depth, slot) of every variable that running `nodes` may write."""
+        written = set()
+        for root in nodes:
+            for node in walk(root):
+                if isinstance(node, (Assignment, ForLoop)):
+                    written.add((node.depth, node.slot))
+                elif isinstance(node, ReadStatement):
+                    written.update((target.depth, target.slot) for target in node.variables
+                                   if isinstance(target, (Identifier, ArrayAccess)))
+                elif isinstance(node, CallExpression):
+                    decl = self.subroutines.get(node.name.upper())
+                    if decl is None:
+                        continue
+                    written |= self.global_writes[decl.name.upper()]
+                    for param, arg in zip(decl.parameters, node.arguments):
+                        if param.is_reference and isinstance(arg, (Identifier, ArrayAccess)):
+                            written.add((arg.depth, arg.slot))
+        return written
+
+    def invariant(self, expr: ASTNode, written: set) -> bool:
+        """Whether `expr` cannot fail and has the same value whenever the loop evaluates it."""
+        if isinstance(expr, Literal):
+            return type(expr.value) in (int, float)
+        if isinstance(expr, Identifier):
+            key = (expr.depth, expr.slot)
+            return key in self.number_slots and key not in written
+        if isinstance(expr, UnaryOp):
+            return expr.operator == '-' and self.invariant(expr.operand, written)
+        if isinstance(expr, BinaryOp):
+            if expr.operator in DIVISION_OPERATORS:
+                divisor = expr.right
+                if not (isinstance(divisor, Literal) and type(divisor.value) in (int, float) and divisor.value != 0):
+                    return False
+            elif expr.operator not in HOISTABLE_OPERATORS:
+                return False
+            return self.invariant(expr.left, written) and self.invariant(expr.right, written)
+        return False
+
+    def integer(self, expr: ASTNode) -> bool:
+        """Whether `expr` is integer arithmetic over integer literals and variables."""
+        if isinstance(expr, Literal):
+            return type(expr.value) is int
+        if isinstance(expr, Identifier):
+            return self.number_slots.get((expr.depth, expr.slot), False)
+        if isinstance(expr, UnaryOp):
+            return expr.operator == '-' and self.integer(expr.operand)
+        if isinstance(expr, BinaryOp):
+            return (expr.operator in ('+', '-', '*', 'DIV', 'MOD')
+                    and self.integer(expr.left) and self.integer(expr.right))
+        return False
+
+    def degree(self, expr: ASTNode, var: Tuple[int, int], written: set) -> Optional[int]:
+        """The degree of `expr` as an integer polynomial in the loop variable, or None."""
+        if isinstance(expr, Identifier) and (expr.depth, expr.slot) == var:
+            return 1
+        if self.invariant(expr, written) and self.integer(expr):
+            return 0
+        if isinstance(expr, UnaryOp) and expr.operator == '-':
+            return self.degree(expr.operand, var, written)
+        if isinstance(expr, BinaryOp) and expr.operator in ('+', '-', '*'):
+            left = self.degree(expr.left, var, written)
+            right = self.degree(expr.right, var, written)
+            if left is None or right is None:
+                return None
+            return left + right if expr.operator == '*' else max(left, right)
+        return None
+
+    def key(self, expr: ASTNode):
+        """A hashable value equal for expressions that compute the same thing."""
+        if isinstance(expr, Literal):
+            return (type(expr.value), expr.value)
+        if isinstance(expr, Identifier):
+            return (expr.depth, expr.slot)
+        if isinstance(expr, UnaryOp):
+            return (expr.operator, self.key(expr.operand))
+        return (expr.operator, self.key(expr.left), self.key(expr.right))
+
+    # --- Rewriting ---
+
+    def block(self, statements: List[ASTNode]) -> List[ASTNode]:
+        optimized = []
+        for stmt in statements:
+            if isinstance(stmt, WhileLoop) or (isinstance(stmt, ForLoop) and stmt.vector is None):
+                optimized.extend(self.loop(stmt))
+                stmt.body = self.block(stmt.body)
+            elif isinstance(stmt, IfStatement):
+                stmt.then_branch = self.block(stmt.then_branch)
+                if stmt.else_branch:
+                    stmt.else_branch = self.block(stmt.else_branch)
+            optimized.append(stmt)
+        return optimized
+
+    def rewrite_block(self, statements: List[ASTNode], replace):
+        """Apply `replace` to every expression the statements evaluate, outermost first."""
+        for stmt in statements:
+            if isinstance(stmt, Assignment):
+                stmt.value = self.rewrite(stmt.value, replace)
+                stmt.indices = [self.rewrite(idx, replace) for idx in stmt.indices]
+            elif isinstance(stmt, PrintStatement):
+                stmt.expressions = [self.rewrite(expr, replace) for expr in stmt.expressions]
+            elif isinstance(stmt, ReadStatement):
+                for target in stmt.variables:
+                    if isinstance(target, ArrayAccess):
+                        target.indices = [self.rewrite(idx, replace) for idx in target.indices]
+            elif isinstance(stmt, IfStatement):
+                stmt.condition = self.rewrite(stmt.condition, replace)
+                self.rewrite_block(stmt.then_branch, replace)
+                self.rewrite_block(stmt.else_branch or [], replace)
+            elif isinstance(stmt, ForLoop):
+                stmt.start = self.rewrite(stmt.start, replace)
+                stmt.end = self.rewrite(stmt.end, replace)
+                stmt.step = self.rewrite(stmt.step, replace)
+                if stmt.vector is None:
+                    # A bulk loop's plan holds on to the expressions of its body
+                    self.rewrite_block(stmt.body, replace)
+            elif isinstance(stmt, WhileLoop):
+                stmt.condition = self.rewrite(stmt.condition, replace)
+                self.rewrite_block(stmt.body, replace)
+            elif isinstance(stmt, CallExpression):
+                self.rewrite(stmt, replace)
+
+    def rewrite(self, expr: ASTNode, replace) -> ASTNode:
+        new = replace(expr)
+        if new is not expr:
+            return new
+        if isinstance(expr, BinaryOp):
+            expr.left = self.rewrite(expr.left, replace)
+            expr.right = self.rewrite(expr.right, replace)
+        elif isinstance(expr, UnaryOp):
+            expr.operand = self.rewrite(expr.operand, replace)
+        elif isinstance(expr, ArrayAccess):
+            expr.indices = [self.rewrite(idx, replace) for idx in expr.indices]
+        elif isinstance(expr, CallExpression):
+            decl = self.subroutines.get(expr.name.upper())
+            for i, arg in enumerate(expr.arguments):
+                # Arguments passed by reference must stay variables
+                if decl is not None and i < len(decl.parameters) and decl.parameters[i].is_reference:
+                    if isinstance(arg, ArrayAccess):
+                        arg.indices = [self.rewrite(idx, replace) for idx in arg.indices]
+                    continue
+                expr.arguments[i] = self.rewrite(arg, replace)
+        return expr
+
+    def temporary(self, integer: bool) -> Identifier:
+        self.temporaries += 1
+        name = f"${self.temporaries}"
+        slot = self.scope.declare(name)
+        self.number_slots[(self.depth, slot)] = integer
+        return Identifier(type='Id', name=name, depth=self.depth, slot=slot)
+
+    def assign(self, temp: Identifier, value: ASTNode, line: int) -> Assignment:
+        return Assignment(type='Assign', identifier=temp.name, value=value, depth=temp.depth,
+                          slot=temp.slot, line=line)
+
+    def use(self, temp: Identifier, line: int) -> Identifier:
+        return Identifier(type='Id', name=temp.name, depth=temp.depth, slot=temp.slot, line=line)
+
+    def loop(self, loop: Union[ForLoop, WhileLoop]) -> List[ASTNode]:
+        """Optimize the body of `loop`; returns the statements to run before it."""
+        written = self.writes([loop])
+        before = []
+        temps = {}
+
+        def hoist(expr):
+            if not (isinstance(expr, (BinaryOp, UnaryOp)) and self.invariant(expr, written)):
+                return expr
+            key = self.key(expr)
+            temp = temps.get(key)
+            if temp is None:
+                temp = temps[key] = self.temporary(self.integer(expr))
+                before.append(self.assign(temp, expr, loop.line))
+                self.hoisted += 1
+            return self.use(temp, expr.line)
+
+        if isinstance(loop, WhileLoop):
+            loop.condition = self.rewrite(loop.condition, hoist)
+        self.rewrite_block(loop.body, hoist)
+        if isinstance(loop, ForLoop):
+            before.extend(self.reduce(loop))
+        return before
+
+    def reduce(self, loop: ForLoop) -> List[ASTNode]:
+        """Strength-reduce the linear integer expressions of a ΓΙΑ body.
+
+        Returns the statements initializing their temporaries, to run before
+        the loop; the updates are added at the end of the body.
+        """
+        var = (loop.depth, loop.slot)
+        written = self.writes(loop.body)
+        if not (_is_int_literal(loop.step) and loop.step.value != 0 and self.integer(loop.start)) or var in written:
+            return []
+        written.add(var)
+        step = loop.step.value
+        before = []
+        updates = []
+        temps = {}
+
+        def linear(expr):
+            # A multiplication by the loop variable, which becomes an addition
+            return (isinstance(expr, BinaryOp) and self.degree(expr, var, written) == 1
+                    and any(isinstance(node, BinaryOp) and node.operator == '*'
+                            and self.degree(node, var, written) == 1 for node in walk(expr)))
+
+        # Operations each expression costs per iteration; the update costs one
+        costs = {}
+
+        def count(expr):
+            if linear(expr):
+                key = self.key(expr)
+                costs[key] = costs.get(key, 0) + sum(isinstance(node, (BinaryOp, UnaryOp)) for node in walk(expr))
+            return expr
+
+        def reduce(expr):
+            if not linear(expr):
+                return expr
+            key = self.key(expr)
+            if costs.get(key, 0) < 2:
+                return expr
+            temp = temps.get(key)
+            if temp is None:
+                temp = temps[key] = self.temporary(True)
+                before.append(self.assign(temp, self.substitute(expr, var, loop.start), loop.line))
+                increment = self.delta(expr, var, step, written)
+                if not isinstance(increment, (Literal, Identifier)):
+                    delta = self.temporary(True)
+                    before.append(self.assign(delta, increment, loop.line))
+                    increment = self.use(delta, loop.line)
+                updates.append(self.assign(temp, BinaryOp(type='BinOp', operator='+', left=self.use(temp, loop.line),
+                                                          right=increment, line=loop.line), loop.line))
+                self.reduced += 1
+            return self.use(temp, expr.line)
+
+        self.rewrite_block(loop.body, count)
+        self.rewrite_block(loop.body, reduce)
+        loop.body.extend(updates)
+        return before
+
+    def substitute(self, expr: ASTNode, var: Optional[Tuple[int, int]], value: Optional[ASTNode]) -> ASTNode:
+        """A copy of integer expression `expr` with the loop variable replaced by a copy of `value`."""
+        if isinstance(expr, Identifier):
+            if (expr.depth, expr.slot) == var:
+                return self.substitute(value, None, None)
+            return Identifier(type=expr.type, name=expr.name, depth=expr.depth, slot=expr.slot, line=expr.line)
+        if isinstance(expr, UnaryOp):
+            return UnaryOp(type=expr.type, operator=expr.operator, operand=self.substitute(expr.operand, var, value),
+                           line=expr.line)
+        if isinstance(expr, BinaryOp):
+            return BinaryOp(type=expr.type, operator=expr.operator, left=self.substitute(expr.left, var, value),
+                            right=self.substitute(expr.right, var, value), line=expr.line)
+        return Literal(type=expr.type, value=expr.value, line=expr.line)
+
+    def delta(self, expr: ASTNode, var: Tuple[int, int], step: int, written: set) -> Optional[ASTNode]:
+        """How much linear `expr` grows when the loop variable grows by `step`; None for 0."""
+        if isinstance(expr, Identifier) and (expr.depth, expr.slot) == var:
+            return Literal(type='Lit', value=step)
+        if self.degree(expr, var, written) == 0:
+            return None
+        if isinstance(expr, UnaryOp):
+            return self.combine('-', None, self.delta(expr.operand, var, step, written))
+        if expr.operator == '*':
+            if self.degree(expr.left, var, written) == 1:
+                return self.combine('*', self.delta(expr.left, var, step, written), self.substitute(expr.right, None, None))
+            return self.combine('*', self.substitute(expr.left, None, None), self.delta(expr.right, var, step, written))
+        return self.combine(expr.operator, self.delta(expr.left, var, step, written),
+                            self.delta(expr.right, var, step, written))
+
+    def combine(self, op: str, left: Optional[ASTNode], right: Optional[ASTNode]) -> Optional[ASTNode]:
+        """`left op right` for op in + - *, where None stands for 0; literals are computed."""
+        if left is None or right is None:
+            if op == '*':
+                return None
+            if right is None:
+                return left
+            if left is None and op == '+':
+                return right
+            left = Literal(type='Lit', value=0)
+        if isinstance(left, Literal) and isinstance(right, Literal):
+            return Literal(type='Lit', value=BINARY_OPERATORS[op](left.value, right.value))
+        if op == '*' and isinstance(left, Literal) and left.value == 1:
+            return right
+        if op == '*' and isinstance(right, Literal) and right.value == 1:
+            return left
+        return BinaryOp(type='BinOp', operator=op, left=left, right=right)
+
+
+def optimize_loops(program: Program) -> LoopOptimizer:
+    """Hoist and strength-reduce the loops of a resolved, folded `program`."""
+    optimizer = LoopOptimizer(program)
+    optimizer.optimize()
+    return optimizer
+
+
+# =============================================================================
+# MEMOIZATION (--memoize)
+# =============================================================================
+#
+# A ΣΥΝΑΡΤΗΣΗ is pure when its result depends only on its argument values:
+# it has no ΕΞΟΔΟΣ (reference) or array parameters, reads no global but the
+# ΣΤΑΘΕΡΕΣ, writes no global, has no ΔΙΑΒΑΣΕ or ΤΥΠΩΣΕ and calls only pure
+# functions. With --memoize every engine looks calls to pure functions up in
+# a bounded LRU cache first, which makes naive recursive definitions such as
+# Fibonacci or binomial coefficients run in polynomial time.
+
+# Results a run keeps at most
+MEMO_CACHE_SIZE = 1 << 16
+
+
+def pure_functions(program: Program) -> set:
+    """Upper-cased names of the pure functions of a resolved `program`."""
+    subroutines = {decl.name.upper(): decl for decl in program.declarations
+                   if isinstance(decl, (FunctionDeclaration, ProcedureDeclaration))}
+
+    # Global slots holding ΣΤΑΘΕΡΕΣ that nothing assigns to
+    slots = program.scope.slots
+    constants = {slots[decl.name.upper()] for decl in program.declarations if isinstance(decl, ConstantDeclaration)}
+    constants.add(slots['EOLN'])
+    for node in walk(program):
+        if isinstance(node, (Assignment, ForLoop)) and node.depth == GLOBAL:
+            constants.discard(node.slot)
+        elif isinstance(node, ReadStatement):
+            constants -= {target.slot for target in node.variables
+                          if isinstance(target, (Identifier, ArrayAccess)) and target.depth == GLOBAL}
+        elif isinstance(node, CallExpression):
+            decl = subroutines.get(node.name.upper())
+            if decl is not None:
+                constants -= {arg.slot for param, arg in zip(decl.parameters, node.arguments)
+                              if param.is_reference and isinstance(arg, (Identifier, ArrayAccess))
+                              and arg.depth == GLOBAL}
+
+    candidates = {}
+    for key, decl in subroutines.items():
+        if not isinstance(decl, FunctionDeclaration):
+            continue
+        if any(param.is_reference or isinstance(param.param_type, ArrayType) for param in decl.parameters):
+            continue
+        calls = set()
+        pure = True
+        for node in walk(decl):
+            if isinstance(node, (PrintStatement, ReadStatement)):
+                pure = False
+            elif isinstance(node, (Assignment, ForLoop)):
+                pure = node.depth != GLOBAL
+            elif isinstance(node, (Identifier, ArrayAccess)):
+                pure = node.depth != GLOBAL or node.slot in constants
+            elif isinstance(node, CallExpression):
+                calls.add(node.name.upper())
+            if not pure:
+                break
+        if pure:
+            candidates[key] = calls
+
+    # Drop functions calling anything but pure functions until none is left to drop
+    changed = True
+    while changed:
+        changed = False
+        for key, calls in list(candidates.items()):
+            if not calls <= candidates.keys():
+                del candidates[key]
+                changed = True
+    return set(candidates)
+
+
+class MemoTable:
+    """Bounded LRU cache of pure function results, with hit and miss counts."""
+
+    def __init__(self, functions: set, size: int = MEMO_CACHE_SIZE):
+        from collections import OrderedDict
+
+        self.functions = functions  # Upper-cased names of the pure functions
+        self.size = size
+        self.results = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(name: str, values: tuple):
+        # 1, 1.0 and ΑΛΗΘΗΣ are equal in Python but may give different results
+        return (name, values, tuple(map(type, values)))
+
+    def get(self, key) -> Any:
+        """The cached result for `key`, or UNDEFINED."""
+        result = self.results.get(key, UNDEFINED)
+        if result is UNDEFINED:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.results.move_to_end(key)
+        return result
+
+    def put(self, key, result: Any):
+        self.results[key] = result
+        if len(self.results) > self.size:
+            self.results.popitem(last=False)
+
+    def wrap(self, name: str, function):
+        """`function` of the argument values, answering from the cache when it can."""
+        key_of = self.key
+
+        def memoized(*values):
+            key = key_of(name, values)
+            result = self.get(key)
+            if result is UNDEFINED:
+                result = function(*values)
+                self.put(key, result)
+            return result
+        return memoized
+
+    def report(self) -> str:
+        calls = self.hits + self.misses
+        rate = f" ({100 * self.hits / calls:.1f}% hits)" if calls else ""
+        functions = len(self.functions)
+        return (f"Memoized {functions} pure function{'' if functions == 1 else 's'}: {self.hits} hits, "
+                f"{self.misses} misses{rate}, {len(self.results)} results cached")
+
+
+# =============================================================================
+# CLOSURE ENGINE (--engine=closures)
+# =============================================================================
+
+def _divide(left, right):
+    if right == 0: raise RuntimeError("Division by zero")
+    return left / right
+
+
+def _int_divide(left, right):
+    if right == 0: raise RuntimeError("Division by zero")
+    return int(left / right)
+
+
+def _modulo(left, right):
+    if right == 0: raise RuntimeError("Modulo by zero")
+    return left % right
+
+
+# Binary operators that map directly onto a Python function of both operands.
+# AND/OR are handled separately because they go through to_bool().
+BINARY_OPERATORS = {
+    '+': operator.add, '-': operator.sub, '*': operator.mul,
+    '/': _divide, 'DIV': _int_divide, 'MOD': _modulo, '%': _modulo,
+    '=': operator.eq, '<>': operator.ne, '<': operator.lt,
+    '>': operator.gt, '<=': operator.le, '>=': operator.ge,
+}
+
+# Operators whose result is already a Python bool.
+BOOLEAN_OPERATORS = ('=', '<>', '<', '>', '<=', '>=', 'AND', 'ΚΑΙ', 'OR', 'Ή')
+
+
+def _raise_runtime_error(message: str):
+    """Build a closure that fails with `message` only when it is executed."""
+    def fail(frame):
+        raise RuntimeError(message)
+    return fail
+
+
+class ClosureInterpreter(Interpreter):
+    """Runs a program after compiling it into nested Python closures.
+
+    Every statement becomes a function of the current frame and every
+    expression a function returning its value. The work each node does is
+    picked once at compile time, so execution involves no isinstance chains
+    and no operator-string comparisons.
+    """
+
+    def prepare(self, program: Program):
+        self.declare(program)
+
+        self.subroutine_bodies = {}
+        for key, decl in self.subroutines.items():
+            self.subroutine_bodies[key] = self.counted(self.compile_block(decl.body), decl.line)
+        self.body = self.compile_block(program.body)
+        self.log(f"Compiled program: {program.name}")
+
+    def start(self):
+        self.body(self.globals)
+
+    # --- Statements ---
+
+    def compile_block(self, statements: List[ASTNode]):
+        compiled = [self.compile_statement(stmt) for stmt in statements]
+        if self.hooks is not None and self.hooks.handles('on_statement'):
+            compiled = [self.announced(stmt, run) for stmt, run in zip(statements, compiled)]
+        if len(compiled) == 1:
+            return compiled[0]
+
+        def run_block(frame):
+            for run in compiled:
+                run(frame)
+        return run_block
+
+    def announced(self, stmt: ASTNode, run):
+        """Report `stmt` to the hooks each time before `run` runs it."""
+        on_statement = self.hooks.on_statement
+
+        def run_announced(frame):
+            on_statement(stmt)
+            run(frame)
+        return run_announced
+
+    def counted(self, body, line: int):
+        """Charge each run of a loop body or subroutine body to the budget, if any."""
+        return body if self.budget is None else self.budget.counted(body, line)
+
+    def compile_statement(self, stmt: ASTNode):
+        if isinstance(stmt, Assignment):
+            return self.compile_assignment(stmt)
+        elif isinstance(stmt, PrintStatement):
+            return self.compile_print(stmt)
+        elif isinstance(stmt, IfStatement):
+            return self.compile_if(stmt)
+        elif isinstance(stmt, ForLoop):
+            return self.compile_for(stmt)
+        elif isinstance(stmt, WhileLoop):
+            return self.compile_while(stmt)
+        elif isinstance(stmt, CallExpression) and stmt.is_statement:
+            return self.compile_call(stmt)
+        elif isinstance(stmt, ReadStatement):
+            # Input is dominated by I/O, so reuse the tree-walking implementation.
+            def read(frame):
+                self.frames = (frame, self.globals)
+                self.execute_read(stmt)
+            return read
+        return _raise_runtime_error(f"Unknown statement type: {type(stmt).__name__}")
+
+    def compile_assignment(self, stmt: Assignment):
+        slot = stmt.slot
+        name = stmt.identifier
+        value = self.compile_expression(stmt.value)
+        if self.hooks is not None and self.hooks.handles('on_assign'):
+            return self.compile_reported_assignment(stmt, value)
+
+        if not stmt.indices:
+            if stmt.depth == GLOBAL:
+                global_frame = self.globals
+
+                def assign_global(frame):
+                    global_frame[slot] = value(frame)
+                return assign_global
+
+            def assign(frame):
+                frame[slot] = value(frame)
+            return assign
+
+        load_array = self.compile_load(stmt.depth, slot, name)
+        indices = [self.compile_expression(idx) for idx in stmt.indices]
+
+        def assign_element(frame):
+            result = value(frame)
+            arr = load_array(frame)
+            if not isinstance(arr, ArrayObject):
+                raise _array_error(name, arr)
+            arr.set([int(index(frame)) for index in indices], result)
+        return assign_element
+
+    def compile_reported_assignment(self, stmt: Assignment, value):
+        """An assignment that reports each store to the hooks' on_assign."""
+        slot = stmt.slot
+        name = stmt.identifier
+        line = stmt.line
+        on_assign = self.hooks.on_assign
+        global_frame = self.globals if stmt.depth == GLOBAL else None
+
+        if not stmt.indices:
+            def assign_reported(frame):
+                result = value(frame)
+                (frame if global_frame is None else global_frame)[slot] = result
+                on_assign(name, None, result, line)
+            return assign_reported
+
+        load_array = self.compile_load(stmt.depth, slot, name)
+        indices = [self.compile_expression(idx) for idx in stmt.indices]
+
+        def assign_element_reported(frame):
+            result = value(frame)
+            arr = load_array(frame)
+            if not isinstance(arr, ArrayObject):
+                raise _array_error(name, arr)
+            where = [int(index(frame)) for index in indices]
+            arr.set(where, result)
+            on_assign(name, where, result, line)
+        return assign_element_reported
+
+    def compile_print(self, stmt: PrintStatement):
+        expressions = [self.compile_expression(expr) for expr in stmt.expressions]
+        print_value = self.output.print_value
+        end_print = self.output.end_print
+        if self.hooks is not None and self.hooks.handles('on_print'):
+            on_print = self.hooks.on_print
+            line = stmt.line
+
+            def run_print_reported(frame):
+                values = []
+                previous = "__EOLN__"
+                for expr in expressions:
+                    previous = print_value(expr(frame), previous)
+                    values.append(previous)
+                on_print(tuple(values), line)
+                end_print()
+            return run_print_reported
+
+        def run_print(frame):
+            previous = "__EOLN__"
+            for expr in expressions:
+                previous = print_value(expr(frame), previous)
+            end_print()
+        return run_print
+
+    def compile_if(self, stmt: IfStatement):
+        condition = self.compile_condition(stmt.condition)
+        then_branch = self.compile_block(stmt.then_branch)
+        if not stmt.else_branch:
+            def run_if(frame):
+                if condition(frame):
+                    then_branch(frame)
+            return run_if
+
+        else_branch = self.compile_block(stmt.else_branch)
+
+        def run_if_else(frame):
+            if condition(frame):
+                then_branch(frame)
+            else:
+                else_branch(frame)
+        return run_if_else
+
+    def compile_for(self, stmt: ForLoop):
+        slot = stmt.slot
+        is_global = stmt.depth == GLOBAL
+        global_frame = self.globals
+        start = self.compile_expression(stmt.start)
+        end = self.compile_expression(stmt.end)
+        step = self.compile_expression(stmt.step)
+        body = self.counted(self.compile_block(stmt.body), stmt.line)
+        vector = stmt.vector
+
+        def run_for(frame):
+            first = int(start(frame))
+            last = int(end(frame))
+            increment = int(step(frame))
+            target = global_frame if is_global else frame
+            if vector is not None:
+                # Invariant operands are evaluated by the tree walker
+                self.frames = (frame, global_frame)
+                if vector.run(self.frames, first, last, self.evaluate, self.binary_operators):
+                    return
+            if increment > 0:
+                counter = range(first, last + 1, increment)
+            elif increment < 0:
+                counter = range(first, last - 1, increment)
+            else:
+                # A zero step never advances; keep the tree walker's semantics.
+                while first >= last:
+                    target[slot] = first
+                    body(frame)
+                return
+            for current in counter:
+                target[slot] = current
+                body(frame)
+        return run_for
+
+    def compile_while(self, stmt: WhileLoop):
+        condition = self.compile_condition(stmt.condition)
+        body = self.counted(self.compile_block(stmt.body), stmt.line)
+
+        def run_while(frame):
+            while condition(frame):
+                body(frame)
+        return run_while
+
+    def compile_call(self, call: CallExpression):
+        """Compile a call to a subroutine, bound to its declaration by name."""
+        key = call.name.upper()
+        decl = self.subroutines.get(key)
+        if decl is None:
+            return _raise_runtime_error(f"Undefined function or procedure: {call.name}")
+        if not call.is_statement and not isinstance(decl, FunctionDeclaration):
+            return _raise_runtime_error(f"Procedure '{call.name}' used as an expression (function).")
+        if len(call.arguments) != len(decl.parameters):
+            return _raise_runtime_error(f"Function/Procedure '{call.name}' called with {len(call.arguments)} arguments, expected {len(decl.parameters)}.")
+
+        bindings = []
+        for param, slot, arg_expr in zip(decl.parameters, decl.param_slots, call.arguments):
+            if param.is_reference:
+                if not isinstance(arg_expr, (Identifier, ArrayAccess)):
+                    return _raise_runtime_error(f"Argument for reference parameter '{param.name}' must be a variable or array access passed by name.")
+                bindings.append((slot, self.compile_reference(param, arg_expr)))
+            else:
+                bindings.append((slot, self.compile_expression(arg_expr)))
+
+        local_arrays = []
+        local_scalars = []
+        for local in decl.declarations:
+            if isinstance(local, VariableDeclaration):
+                slot = decl.scope.slots[local.name.upper()]
+                if isinstance(local.var_type, ArrayType):
+                    local_arrays.append((slot, local))
+                else:
+                    local_scalars.append(slot)
+
+        bodies = self.subroutine_bodies
+        global_frame = self.globals
+        frame_size = len(decl.scope)
+        return_slot = decl.return_slot
+        return_name = decl.name
+        memory = self.memory
+        hooks = self.hooks
+        if hooks is not None and not (hooks.handles('on_call') or hooks.handles('on_return')):
+            hooks = None
+        line = call.line
+        max_depth = self.max_depth
+
+        memo = self.memo
+        if memo is not None and key in memo.functions and not call.is_statement:
+            return self.compile_memoized_call(memo, decl, [bind for _, bind in bindings],
+                                              local_scalars, local_arrays, line)
+
+        def invoke(frame):
+            local_frame = [UNDEFINED] * frame_size
+            for slot, bind in bindings:
+                local_frame[slot] = bind(frame)
+            for slot in local_scalars:
+                local_frame[slot] = 0
+            if memory is not None:
+                memory.enter(frame_size, decl.line)
+            if local_arrays:
+                self.frames = (local_frame, global_frame)
+                for slot, local in local_arrays:
+                    local_frame[slot] = self.new_array(local)
+            if hooks is not None:
+                hooks.on_call(decl, line)
+            if self.call_depth >= max_depth:
+                raise stack_overflow(max_depth, return_name, line)
+            self.call_depth += 1
+            try:
+                bodies[key](local_frame)
+            finally:
+                self.call_depth -= 1
+            if memory is not None:
+                memory.leave()
+            result = None
+            if return_slot >= 0:
+                result = local_frame[return_slot]
+                if result is UNDEFINED:
+                    raise RuntimeError(f"Undefined variable: {return_name}")
+            if hooks is not None:
+                hooks.on_return(decl, result)
+            return result
+        return invoke
+
+    def compile_memoized_call(self, memo: MemoTable, decl: FunctionDeclaration, arguments: list,
+                              local_scalars: List[int], local_arrays: list, line: int):
+        """Compile a call to a pure function that goes through the --memoize cache."""
+        body = self.subroutine_bodies
+        key = decl.name.upper()
+        global_frame = self.globals
+        frame_size = len(decl.scope)
+        param_slots = decl.param_slots
+        return_slot = decl.return_slot
+        memory = self.memory
+        max_depth = self.max_depth
+
+        # Memoization is off under hooks, so calls report nothing
+        def run(*values):
+            local_frame = [UNDEFINED] * frame_size
+            for slot, value in zip(param_slots, values):
+                local_frame[slot] = value
+            for slot in local_scalars:
+                local_frame[slot] = 0
+            if memory is not None:
+                memory.enter(frame_size, decl.line)
+            if local_arrays:
+                self.frames = (local_frame, global_frame)
+                for slot, local in local_arrays:
+                    local_frame[slot] = self.new_array(local)
+            if self.call_depth >= max_depth:
+                raise stack_overflow(max_depth, decl.name, line)
+            self.call_depth += 1
+            try:
+                body[key](local_frame)
+            finally:
+                self.call_depth -= 1
+            if memory is not None:
+                memory.leave()
+            result = local_frame[return_slot]
+            if result is UNDEFINED:
+                raise RuntimeError(f"Undefined variable: {decl.name}")
+            return result
+        run = memo.wrap(key, run)
+
+        def invoke_memoized(frame):
+            return run(*[bind(frame) for bind in arguments])
+        return invoke_memoized
+
+    def compile_reference(self, param: Parameter, arg_expr: ASTNode):
+        slot = arg_expr.slot
+        name = arg_expr.name
+        global_frame = self.globals if arg_expr.depth == GLOBAL else None
+
+        def bind_reference(frame):
+            value = (frame if global_frame is None else global_frame)[slot]
+            if value is UNDEFINED:
+                raise RuntimeError(f"Reference parameter '{param.name}' argument '{name}' not found in caller's environment.")
+            return value
+        return bind_reference
+
+    # --- Expressions ---
+
+    def compile_load(self, depth: int, slot: int, name: str):
+        """Compile a read of a resolved variable."""
+        if depth == GLOBAL:
+            global_frame = self.globals
+
+            def load_global(frame):
+                value = global_frame[slot]
+                if value is UNDEFINED:
+                    raise RuntimeError(f"Undefined variable: {name}")
+                return value
+            return load_global
+
+        def load(frame):
+            value = frame[slot]
+            if value is UNDEFINED:
+                raise RuntimeError(f"Undefined variable: {name}")
+            return value
+        return load
+
+    def compile_condition(self, expr: ASTNode):
+        """Compile an expression whose result is only used for its truth value."""
+        compiled = self.compile_expression(expr)
+        if isinstance(expr, BinaryOp) and expr.operator in BOOLEAN_OPERATORS:
+            return compiled
+        if isinstance(expr, UnaryOp) and expr.operator in ('NOT', 'ΟΧΙ'):
+            return compiled
+        to_bool = self.to_bool
+
+        def condition(frame):
+            return to_bool(compiled(frame))
+        return condition
+
+    def compile_expression(self, expr: ASTNode):
+        if isinstance(expr, Literal):
+            value = expr.value
+
+            def literal(frame):
+                return value
+            return literal
+
+        elif isinstance(expr, Identifier):
+            return self.compile_load(expr.depth, expr.slot, expr.name)
+
+        elif isinstance(expr, BinaryOp):
+            return self.compile_binary(expr)
+
+        elif isinstance(expr, UnaryOp):
+            operand = self.compile_expression(expr.operand)
+            if expr.operator == '-':
+                def negate(frame):
+                    return -operand(frame)
+                return negate
+            elif expr.operator in ('NOT', 'ΟΧΙ'):
+                to_bool = self.to_bool
+
+                def logical_not(frame):
+                    return not to_bool(operand(frame))
+                return logical_not
+            return _raise_runtime_error(f"Unknown unary operator: {expr.operator}")
+
+        elif isinstance(expr, ArrayAccess):
+            return self.compile_array_access(expr)
+
+        elif isinstance(expr, CallExpression) and not expr.is_statement:
+            return self.compile_call(expr)
+
+        return _raise_runtime_error(f"Cannot evaluate: {type(expr).__name__}")
+
+    def compile_binary(self, expr: BinaryOp):
+        left = self.compile_expression(expr.left)
+        right = self.compile_expression(expr.right)
+        op = expr.operator
+        to_bool = self.to_bool
+
+        # Both operands are always evaluated, as in the tree walker.
+        if op in ('AND', 'ΚΑΙ'):
+            def logical_and(frame):
+                left_value = left(frame)
+                right_value = right(frame)
+                return to_bool(left_value) and to_bool(right_value)
+            return logical_and
+        if op in ('OR', 'Ή'):
+            def logical_or(frame):
+                left_value = left(frame)
+                right_value = right(frame)
+                return to_bool(left_value) or to_bool(right_value)
+            return logical_or
+
+        function = self.binary_operators.get(op)
+        if function is None:
+            return _raise_runtime_error(f"Unknown operator: {op}")
+
+        # Specialize the common `x op constant` shape, e.g. `i + 1` or `N - 1`.
+        if isinstance(expr.right, Literal):
+            constant = expr.right.value
+
+            def binary_constant(frame):
+                return function(left(frame), constant)
+            return binary_constant
+
+        def binary(frame):
+            return function(left(frame), right(frame))
+        return binary
+
+    def compile_array_access(self, expr: ArrayAccess):
+        name = expr.name
+        load_array = self.compile_load(expr.depth, expr.slot, name)
+        indices = [self.compile_expression(idx) for idx in expr.indices]
+
+        def load_element(frame):
+            arr = load_array(frame)
+            if not isinstance(arr, ArrayObject):
+                raise _array_error(name, arr)
+            return arr.get([int(index(frame)) for index in indices])
+        return load_element
+
+
+# =============================================================================
+# BYTECODE COMPILER & VIRTUAL MACHINE (--engine=vm)
+# =============================================================================
+
+# Opcodes, numbered roughly by how often the VM loop meets them.
+(LOAD_LOCAL, LOAD_GLOBAL, CONST, BINARY, STORE_LOCAL, STORE_GLOBAL,
+ JUMP_IF_FALSE, JUMP, FOR_ITER, LOAD_ELEM, STORE_ELEM, AND, OR, NEG, NOT,
+ FOR_PREP, CALL, RETURN, LOAD_REF, PRINT, READ, STEP, RAISE, REPORT, HALT) = range(25)
+
+OPCODE_NAMES = ('LOAD_LOCAL', 'LOAD_GLOBAL', 'CONST', 'BINARY', 'STORE_LOCAL',
+                'STORE_GLOBAL', 'JUMP_IF_FALSE', 'JUMP', 'FOR_ITER',
+                'LOAD_ELEM', 'STORE_ELEM', 'AND', 'OR', 'NEG', 'NOT',
+                'FOR_PREP', 'CALL', 'RETURN', 'LOAD_REF', 'PRINT', 'READ',
+                'STEP', 'RAISE', 'REPORT', 'HALT')
+
+
+class CallSite:
+    """Static information about one call, linked to its subroutine's entry point."""
+    def __init__(self, decl, is_statement: bool):
+        self.decl = decl
+        self.is_statement = is_statement
+        self.entry = -1
+        self.memo_name = None  # Upper-cased name when calls go through the --memoize cache
+        self.param_slots = decl.param_slots
+        self.frame_size = len(decl.scope)
+        self.return_slot = decl.return_slot
+        self.local_scalars = []
+        self.local_arrays = []
+        for local in decl.declarations:
+            if isinstance(local, VariableDeclaration):
+                slot = decl.scope.slots[local.name.upper()]
+                if isinstance(local.var_type, ArrayType):
+                    self.local_arrays.append((slot, local))
+                else:
+                    self.local_scalars.append(slot)
+
+
+class Bytecode:
+    """A compiled program: one flat instruction list plus per-instruction source lines.
+
+    The main body starts at address 0 and ends with HALT; each subroutine body
+    follows it and ends with RETURN.
+    """
+    def __init__(self):
+        self.code = []
+        self.lines = []
+        self.entries = {}
+
+    def emit(self, op: int, arg: Any = None, line: int = 0) -> int:
+        self.code.append((op, arg))
+        self.lines.append(line)
+        return len(self.code) - 1
+
+    def patch(self, address: int, arg: Any):
+        self.code[address] = (self.code[address][0], arg)
+
+    def disassemble(self) -> str:
+        names = {address: name for name, address in self.entries.items()}
+        out = []
+        for address, (op, arg) in enumerate(self.code):
+            if address in names:
+                out.append(f"{names[address]}:")
+            if isinstance(arg, CallSite):
+                arg = arg.decl.name
+            elif callable(arg):
+                arg = getattr(arg, '__name__', arg)
+            elif isinstance(arg, tuple):
+                arg = arg[-1]
+            out.append(f"  {address:5d}  {OPCODE_NAMES[op]:<14} {'' if arg is None else arg}")
+        return '\n'.join(out)
+
+
+class BytecodeCompiler:
+    """Compiles a Program's AST into flat stack-machine bytecode.
+
+    With `counted` set, every loop iteration and subroutine entry passes
+    through a STEP instruction that charges it to the execution budget.
+    `operators` maps operator names to the functions BINARY applies. With
+    `hooks`, REPORT instructions pass statements, assignments, calls, returns
+    and prints (written to `output`) to the events the hooks handle.
+    """
+
+    def __init__(self, counted: bool = False, operators: Optional[Dict[str, Any]] = None,
+                 hooks: Optional[Hooks] = None, output: Optional[OutputBuffer] = None):
+        self.counted = counted
+        self.operators = BINARY_OPERATORS if operators is None else operators
+        self.output = output
+        self.on_statement = self.on_assign = self.on_print = self.on_call = self.on_return = None
+        if hooks is not None:
+            for event in ('on_statement', 'on_assign', 'on_print', 'on_call', 'on_return'):
+                if hooks.handles(event):
+                    setattr(self, event, getattr(hooks, event))
+        self.bytecode = Bytecode()
+        self.subroutines = {}
+        self.call_sites = []
+
+    def compile(self, program: Program) -> Bytecode:
+        for decl in program.declarations:
+            if isinstance(decl, (FunctionDeclaration, ProcedureDeclaration)):
+                self.subroutines[decl.name.upper()] = decl
+
+        self.bytecode.entries[program.name] = 0
+        self.compile_block(program.body)
+        self.emit(HALT)
+
+        for key, decl in self.subroutines.items():
+            self.bytecode.entries[decl.name] = len(self.bytecode.code)
+            if self.counted:
+                self.emit(STEP, decl.line, decl.line)
+            self.compile_block(decl.body)
+            if self.on_return is not None:
+                self.emit(REPORT, self.returned(decl), decl.line)
+            self.emit(RETURN, line=decl.line)
+
+        # Link every call site to its subroutine's entry point.
+        for site in self.call_sites:
+            site.entry = self.bytecode.entries[site.decl.name]
+        return self.bytecode
+
+    def emit(self, op: int, arg: Any = None, line: int = 0) -> int:
+        return self.bytecode.emit(op, arg, line)
+
+    def here(self) -> int:
+        return len(self.bytecode.code)
+
+    # --- Statements ---
+
+    def compile_block(self, statements: List[ASTNode]):
+        for stmt in statements:
+            if self.on_statement is not None:
+                self.emit(REPORT, self.announced(stmt), stmt.line)
+            self.compile_statement(stmt)
+
+    def compile_statement(self, stmt: ASTNode):
+        line = stmt.line
+        if isinstance(stmt, Assignment):
+            self.compile_expression(stmt.value)
+            if stmt.indices:
+                for idx in stmt.indices:
+                    self.compile_expression(idx)
+                if self.on_assign is not None:
+                    self.emit(REPORT, self.element_assigned(stmt), line)
+                else:
+                    self.emit(STORE_ELEM, (stmt.depth, stmt.slot, len(stmt.indices), stmt.identifier), line)
+            else:
+                self.emit(STORE_GLOBAL if stmt.depth == GLOBAL else STORE_LOCAL, (stmt.slot, stmt.identifier), line)
+                if self.on_assign is not None:
+                    self.emit(REPORT, self.assigned(stmt), line)
+
+        elif isinstance(stmt, PrintStatement) and self.on_print is not None:
+            # The values printed so far are collected in a list on the stack
+            self.emit(REPORT, _start_print, line)
+            for i, expr in enumerate(stmt.expressions, 1):
+                self.compile_expression(expr)
+                self.emit(REPORT, self.printed(line, i == len(stmt.expressions)), line)
+
+        elif isinstance(stmt, PrintStatement):
+            # Each value is printed as soon as it is computed, after the value
+            # printed before it (EOLN at first) kept on the stack; the last one
+            # ends the ΤΥΠΩΣΕ
+            if stmt.expressions:
+                self.emit(CONST, "__EOLN__", line)
+            for i, expr in enumerate(stmt.expressions, 1):
+                self.compile_expression(expr)
+                self.emit(PRINT, i == len(stmt.expressions), line)
+
+        elif isinstance(stmt, ReadStatement):
+            self.emit(READ, stmt, line)
+
+        elif isinstance(stmt, IfStatement):
+            self.compile_expression(stmt.condition)
+            jump_to_else = self.emit(JUMP_IF_FALSE, None, line)
+            self.compile_block(stmt.then_branch)
+            if stmt.else_branch:
+                jump_to_end = self.emit(JUMP, None, line)
+                self.bytecode.patch(jump_to_else, self.here())
+                self.compile_block(stmt.else_branch)
+                self.bytecode.patch(jump_to_end, self.here())
+            else:
+                self.bytecode.patch(jump_to_else, self.here())
+
+        elif isinstance(stmt, ForLoop):
+            self.compile_expression(stmt.start)
+            self.compile_expression(stmt.end)
+            self.compile_expression(stmt.step)
+            self.emit(FOR_PREP, (stmt.depth, stmt.vector), line)
+            loop_start = self.emit(FOR_ITER, None, line)
+            if self.counted:
+                self.emit(STEP, line, line)
+            self.compile_block(stmt.body)
+            self.emit(JUMP, loop_start, line)
+            self.bytecode.patch(loop_start, (stmt.slot, self.here(), stmt.variable))
+
+        elif isinstance(stmt, WhileLoop):
+            loop_start = self.here()
+            self.compile_expression(stmt.condition)
+            jump_to_end = self.emit(JUMP_IF_FALSE, None, line)
+            if self.counted:
+                self.emit(STEP, line, line)
+            self.compile_block(stmt.body)
+            self.emit(JUMP, loop_start, line)
+            self.bytecode.patch(jump_to_end, self.here())
+
+        elif isinstance(stmt, CallExpression) and stmt.is_statement:
+            self.compile_call(stmt)
+
+        else:
+            self.emit(RAISE, f"Unknown statement type: {type(stmt).__name__}", line)
+
+    # --- Reported events (with hooks) ---
+
+    def announced(self, stmt: ASTNode):
+        on_statement = self.on_statement
+
+        def report_statement(stack, frames):
+            on_statement(stmt)
+        return report_statement
+
+    def assigned(self, stmt: Assignment):
+        on_assign = self.on_assign
+        depth, slot, name, line = stmt.depth, stmt.slot, stmt.identifier, stmt.line
+
+        def report_assign(stack, frames):
+            on_assign(name, None, frames[depth][slot], line)
+        return report_assign
+
+    def element_assigned(self, stmt: Assignment):
+        """STORE_ELEM, reporting the store."""
+        on_assign = self.on_assign
+        depth, slot, count, name, line = stmt.depth, stmt.slot, len(stmt.indices), stmt.identifier, stmt.line
+
+        def store_element_reported(stack, frames):
+            indices = [int(i) for i in stack[-count:]]
+            del stack[-count:]
+            value = stack.pop()
+            array = frames[depth][slot]
+            if not isinstance(array, ArrayObject):
+                raise _array_error(name, array)
+            array.set(indices, value)
+            on_assign(name, indices, value, line)
+        return store_element_reported
+
+    def called(self, decl, line: int):
+        on_call = self.on_call
+
+        def report_call(stack, frames):
+            on_call(decl, line)
+        return report_call
+
+    def returned(self, decl):
+        """Report the return of `decl`, unless RETURN is about to fail on an unset result."""
+        on_return = self.on_return
+        return_slot = decl.return_slot
+
+        def report_return(stack, frames):
+            if return_slot < 0:
+                on_return(decl, None)
+            elif frames[LOCAL][return_slot] is not UNDEFINED:
+                on_return(decl, frames[LOCAL][return_slot])
+        return report_return
+
+    def printed(self, line: int, last: bool):
+        """PRINT, collecting the value for the ΤΥΠΩΣΕ's on_print."""
+        on_print = self.on_print
+        print_value = self.output.print_value
+        end_print = self.output.end_print
+
+        def print_reported(stack, frames):
+            value = stack.pop()
+            values = stack[-1]
+            values.append(print_value(value, values[-1] if values else "__EOLN__"))
+            if last:
+                stack.pop()
+                on_print(tuple(values), line)
+                end_print()
+        return print_reported
+
+    def compile_call(self, call: CallExpression):
+        decl = self.subroutines.get(call.name.upper())
+        if decl is None:
+            self.emit(RAISE, f"Undefined function or procedure: {call.name}", call.line)
+            return
+        if not call.is_statement and not isinstance(decl, FunctionDeclaration):
+            self.emit(RAISE, f"Procedure '{call.name}' used as an expression (function).", call.line)
+            return
+        if len(call.arguments) != len(decl.parameters):
+            self.emit(RAISE, f"Function/Procedure '{call.name}' called with {len(call.arguments)} arguments, expected {len(decl.parameters)}.", call.line)
+            return
+
+        for param, arg_expr in zip(decl.parameters, call.arguments):
+            if param.is_reference:
+                if not isinstance(arg_expr, (Identifier, ArrayAccess)):
+                    self.emit(RAISE, f"Argument for reference parameter '{param.name}' must be a variable or array access passed by name.", call.line)
+                    return
+                self.emit(LOAD_REF, (arg_expr.depth, arg_expr.slot, arg_expr.name, param.name), call.line)
+            else:
+                self.compile_expression(arg_expr)
+
+        site = CallSite(decl, call.is_statement)
+        self.call_sites.append(site)
+        if self.on_call is not None:
+            self.emit(REPORT, self.called(decl, call.line), call.line)
+        self.emit(CALL, site, call.line)
+
+    # --- Expressions ---
+
+    def compile_expression(self, expr: ASTNode):
+        if isinstance(expr, Literal):
+            self.emit(CONST, expr.value, expr.line)
+
+        elif isinstance(expr, Identifier):
+            self.emit(LOAD_GLOBAL if expr.depth == GLOBAL else LOAD_LOCAL, (expr.slot, expr.name), expr.line)
+
+        elif isinstance(expr, BinaryOp):
+            self.compile_expression(expr.left)
+            self.compile_expression(expr.right)
+            if expr.operator in ('AND', 'ΚΑΙ'):
+                self.emit(AND, None, expr.line)
+            elif expr.operator in ('OR', 'Ή'):
+                self.emit(OR, None, expr.line)
+            elif expr.operator in self.operators:
+                self.emit(BINARY, self.operators[expr.operator], expr.line)
+            else:
+                self.emit(RAISE, f"Unknown operator: {expr.operator}", expr.line)
+
+        elif isinstance(expr, UnaryOp):
+            self.compile_expression(expr.operand)
+            if expr.operator == '-':
+                self.emit(NEG, None, expr.line)
+            elif expr.operator in ('NOT', 'ΟΧΙ'):
+                self.emit(NOT, None, expr.line)
+            else:
+                self.emit(RAISE, f"Unknown unary operator: {expr.operator}", expr.line)
+
+        elif isinstance(expr, ArrayAccess):
+            for idx in expr.indices:
+                self.compile_expression(idx)
+            self.emit(LOAD_ELEM, (expr.depth, expr.slot, len(expr.indices), expr.name), expr.line)
+
+        elif isinstance(expr, CallExpression) and not expr.is_statement:
+            self.compile_call(expr)
+
+        else:
+            self.emit(RAISE, f"Cannot evaluate: {type(expr).__name__}", expr.line)
+
+
+def _start_print(stack, frames):
+    stack.append([])
+
+
+def _repeat_forever(value):
+    while True:
+        yield value
+
+
+class VMInterpreter(Interpreter):
+    """Runs a program compiled to bytecode on a stack-based virtual machine.
+
+    EAP calls push a frame onto the VM's own frame stack instead of recursing
+    through Python, and every instruction passes through one dispatch loop.
+    """
+
+    python_stack = False
+
+    def prepare(self, program: Program):
+        self.declare(program)
+        compiler = BytecodeCompiler(counted=self.budget is not None, operators=self.binary_operators,
+                                    hooks=self.hooks, output=self.output)
+        self.bytecode = compiler.compile(program)
+        if self.memo is not None:
+            for site in compiler.call_sites:
+                if not site.is_statement and site.decl.name.upper() in self.memo.functions:
+                    site.memo_name = site.decl.name.upper()
+        if self.debug:
+            self.log(f"Bytecode for {program.name}:\n{self.bytecode.disassemble()}")
+
+    def start(self):
+        self.run(self.bytecode)
+
+    def run(self, bytecode: Bytecode):
+        code = bytecode.code
+        to_bool = self.to_bool
+        print_value = self.output.print_value
+        end_print = self.output.end_print
+        budget = self.budget
+        memory = self.memory
+        memo = self.memo
+        memo_keys = []  # Cache keys of the memoized calls in progress
+        max_depth = self.max_depth
+        global_frame = self.globals
+        frame = global_frame
+        frames = (frame, global_frame)
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        call_stack = []
+        pc = 0
+
+        while True:
+            op, arg = code[pc]
+            pc += 1
+
+            if op == LOAD_LOCAL:
+                value = frame[arg[0]]
+                if value is UNDEFINED:
+                    raise RuntimeError(f"Undefined variable: {arg[1]}")
+                push(value)
+
+            elif op == LOAD_GLOBAL:
+                value = global_frame[arg[0]]
+                if value is UNDEFINED:
+                    raise RuntimeError(f"Undefined variable: {arg[1]}")
+                push(value)
+
+            elif op == CONST:
+                push(arg)
+
+            elif op == BINARY:
+                right = pop()
+                stack[-1] = arg(stack[-1], right)
+
+            elif op == STORE_LOCAL:
+                frame[arg[0]] = pop()
+
+            elif op == STORE_GLOBAL:
+                global_frame[arg[0]] = pop()
+
+            elif op == JUMP_IF_FALSE:
+                value = pop()
+                if value is not True and (value is False or not to_bool(value)):
+                    pc = arg
+
+            elif op == JUMP:
+                pc = arg
+
+            elif op == FOR_ITER:
+                counter, target = stack[-1]
+                current = next(counter, None)
+                if current is None:
+                    pop()
+                    pc = arg[1]
+                else:
+                    target[arg[0]] = current
+
+            elif op == LOAD_ELEM:
+                depth, slot, count, name = arg
+                indices = [int(i) for i in stack[-count:]]
+                del stack[-count:]
+                array = frames[depth][slot]
+                if not isinstance(array, ArrayObject):
+                    raise _array_error(name, array)
+                push(array.get(indices))
+
+            elif op == STORE_ELEM:
+                depth, slot, count, name = arg
+                indices = [int(i) for i in stack[-count:]]
+                del stack[-count:]
+                value = pop()
+                array = frames[depth][slot]
+                if not isinstance(array, ArrayObject):
+                    raise _array_error(name, array)
+                array.set(indices, value)
+
+            elif op == AND:
+                right = pop()
+                left = pop()
+                push(to_bool(left) and to_bool(right))
+
+            elif op == OR:
+                right = pop()
+                left = pop()
+                push(to_bool(left) or to_bool(right))
+
+            elif op == NEG:
+                stack[-1] = -stack[-1]
+
+            elif op == NOT:
+                stack[-1] = not to_bool(stack[-1])
+
+            elif op == FOR_PREP:
+                depth, vector = arg
+                step = int(pop())
+                end = int(pop())
+                start = int(pop())
+                if vector is not None:
+                    # Invariant operands are evaluated by the tree walker
+                    self.frames = frames
+                if vector is not None and vector.run(frames, start, end, self.evaluate, self.binary_operators):
+                    counter = iter(())
+                elif step > 0:
+                    counter = iter(range(start, end + 1, step))
+                elif step < 0:
+                    counter = iter(range(start, end - 1, step))
+                else:
+                    # A zero step never advances; keep the tree walker's semantics.
+                    counter = _repeat_forever(start) if start >= end else iter(())
+                push((counter, frames[depth]))
+
+            elif op == CALL:
+                count = len(arg.param_slots)
+                if arg.memo_name is not None:
+                    key = memo.key(arg.memo_name, tuple(stack[len(stack) - count:]))
+                    value = memo.get(key)
+                    if value is not UNDEFINED:
+                        del stack[len(stack) - count:]
+                        push(value)
+                        continue
+                    memo_keys.append(key)
+                if len(call_stack) >= max_depth:
+                    raise stack_overflow(max_depth, arg.decl.name, bytecode.lines[pc - 1])
+                local_frame = [UNDEFINED] * arg.frame_size
+                if count:
+                    for slot, value in zip(arg.param_slots, stack[-count:]):
+                        local_frame[slot] = value
+                    del stack[-count:]
+                for slot in arg.local_scalars:
+                    local_frame[slot] = 0
+                call_stack.append((pc, frame, arg))
+                frame = local_frame
+                frames = (frame, global_frame)
+                if memory is not None:
+                    memory.enter(arg.frame_size, arg.decl.line)
+                if arg.local_arrays:
+                    self.frames = frames
+                    for slot, local in arg.local_arrays:
+                        local_frame[slot] = self.new_array(local)
+                pc = arg.entry
+
+            elif op == RETURN:
+                if memory is not None:
+                    memory.leave()
+                local_frame = frame
+                pc, frame, site = call_stack.pop()
+                frames = (frame, global_frame)
+                if site.return_slot >= 0:
+                    # A function must set its result even when called as a statement
+                    value = local_frame[site.return_slot]
+                    if value is UNDEFINED:
+                        raise RuntimeError(f"Undefined variable: {site.decl.name}")
+                    if not site.is_statement:
+                        if site.memo_name is not None:
+                            memo.put(memo_keys.pop(), value)
+                        push(value)
+
+            elif op == LOAD_REF:
+                depth, slot, name, param_name = arg
+                value = frames[depth][slot]
+                if value is UNDEFINED:
+                    raise RuntimeError(f"Reference parameter '{param_name}' argument '{name}' not found in caller's environment.")
+                push(value)
+
+            elif op == PRINT:
+                value = pop()
+                stack[-1] = print_value(value, stack[-1])
+                if arg:
+                    pop()
+                    end_print()
+
+            elif op == READ:
+                self.frames = frames
+                self.execute_read(arg)
+
+            elif op == STEP:
+                budget.step(arg)
+
+            elif op == RAISE:
+                raise RuntimeError(arg)
+
+            elif op == REPORT:
+                arg(stack, frames)
+
+            elif op == HALT:
+                self.frames = frames
+                return
+
+
+# =============================================================================
+# PYTHON BACKEND (--engine=python)
+# =============================================================================
+
+def python_name(name: str, prefix: str = 'v_') -> str:
+    """Map a case-insensitive EAP name onto a valid Python identifier."""
+    key = name.upper()
+    if (prefix + key).isidentifier():
+        return prefix + key
+    return prefix + 'x' + key.encode('utf-8').hex()
+
+
+def eap_name(identifier: str) -> str:
+    """Reverse python_name() for error messages."""
+    key = identifier[2:]
+    if key.startswith('x'):
+        return bytes.fromhex(key[1:]).decode('utf-8')
+    return key
+
+
+def _variable_names(nodes) -> set:
+    """Collect the upper-cased names of all variables used under `nodes`."""
+    names = set()
+    for root in nodes:
+        for node in walk(root):
+            if isinstance(node, (Identifier, ArrayAccess)):
+                names.add(node.name.upper())
+            elif isinstance(node, Assignment):
+                names.add(node.identifier.upper())
+            elif isinstance(node, ForLoop):
+                names.add(node.variable.upper())
+    return names
+
+
+def _is_int_literal(expr: ASTNode) -> bool:
+    return isinstance(expr, Literal) and type(expr.value) is int
+
+
+def _is_side_effect_free(expr: ASTNode) -> bool:
+    """True if evaluating `expr` can neither fail nor have side effects."""
+    if isinstance(expr, (Literal, Identifier)):
+        return True
+    if isinstance(expr, BinaryOp):
+        return (expr.operator not in ('/', 'DIV', 'MOD', '%')
+                and _is_side_effect_free(expr.left) and _is_side_effect_free(expr.right))
+    if isinstance(expr, UnaryOp):
+        return _is_side_effect_free(expr.operand)
+    return False
+
+
+class PythonTranspiler:
+    """Translates a Program into Python source code.
+
+    The main body becomes `_main()` and every subroutine a Python function.
+    Variables used only by the main body are its locals, variables shared with
+    subroutines are module globals, and ΓΙΑ loops become `for ... in range()`.
+    Runtime helpers (`_print`, `_read`, ...) are provided by PythonInterpreter.
+    With `counted` set, loop bodies and subroutines start with a `_step(line)`
+    call that charges them to the execution budget. With `metered` set,
+    subroutines are bracketed by `_enter()`/`_leave()` calls and `+` goes
+    through `_add()`, for the memory quota. Functions named in `memoized` are
+    replaced by `_memoize()` wrappers that answer from the --memoize cache.
+    Subroutines count how deeply they nest in `_depth`, and stop the run
+    through `_overflow()` beyond `_max_depth`. The hook events named in
+    `events` are reported through `_statement()`, `_assign()`, `_on_print()`
+    and calls wrapped in `_invoke()`; they refer to AST nodes as `_nodes[i]`,
+    for the nodes collected in `nodes`.
+    """
+
+    COMPARISONS = {'=': '==', '<>': '!=', '<': '<', '>': '>', '<=': '<=', '>=': '>='}
+
+    def __init__(self, program: Program, counted: bool = False, metered: bool = False,
+                 memoized: set = frozenset(), events: set = frozenset()):
+        self.program = program
+        self.counted = counted
+        self.metered = metered
+        self.memoized = memoized
+        self.events = events
+        self.nodes = []
+        self.out = []
+        self.indent = 0
+        self.arrays = set()
+        self.globals = set()
+        self.subroutines = {}
+        for decl in program.declarations:
+            if isinstance(decl, (FunctionDeclaration, ProcedureDeclaration)):
+                self.subroutines[decl.name.upper()] = decl
+
+    def transpile(self) -> str:
+        declared = {'EOLN'}
+        global_arrays = set()
+        for decl in self.program.declarations:
+            if isinstance(decl, (ConstantDeclaration, VariableDeclaration)):
+                declared.add(decl.name.upper())
+            if isinstance(decl, VariableDeclaration) and isinstance(decl.var_type, ArrayType):
+                global_arrays.add(decl.name.upper())
+
+        # Whatever a subroutine uses without declaring it lives in module globals.
+        free_names = {}
+        for key, decl in self.subroutines.items():
+            free_names[key] = _variable_names([decl]) - self._local_names(decl)
+            self.globals |= free_names[key]
+
+        for key, decl in self.subroutines.items():
+            self.arrays = (global_arrays & free_names[key]) | self._local_arrays(decl)
+            self.emit_subroutine(decl, free_names[key])
+            if key in self.memoized:
+                name = python_name(decl.name, 'f_')
+                self.line(f"{name} = _memoize({key!r}, {name})")
+                self.line("")
+
+        main_names = _variable_names(self.program.body)
+        self.arrays = global_arrays
+        self.line("def _main():")
+        self.indent += 1
+        shared = sorted(main_names & self.globals)
+        if shared:
+            self.line(f"global {', '.join(python_name(n) for n in shared)}")
+        for name in sorted((main_names - self.globals) & declared):
+            self.line(f"{python_name(name)} = _initial[{name!r}]")
+        self.block(self.program.body)
+        self.indent -= 1
+        return '\n'.join(self.out) + '\n'
+
+    def line(self, text: str):
+        self.out.append('    ' * self.indent + text)
+
+    def node(self, node: ASTNode) -> str:
+        """Refer to `node` from the generated code."""
+        self.nodes.append(node)
+        return f"_nodes[{len(self.nodes) - 1}]"
+
+    def _local_names(self, decl) -> set:
+        names = {param.name.upper() for param in decl.parameters}
+        names |= {local.name.upper() for local in decl.declarations if isinstance(local, VariableDeclaration)}
+        if isinstance(decl, FunctionDeclaration):
+            names.add(decl.name.upper())
+        # Temporaries of the loop optimizer (-O)
+        names |= {name for name in decl.scope.slots if name.startswith('$')}
+        return names
+
+    def _local_arrays(self, decl) -> set:
+        arrays = {param.name.upper() for param in decl.parameters if isinstance(param.param_type, ArrayType)}
+        for local in decl.declarations:
+            if isinstance(local, VariableDeclaration):
+                if isinstance(local.var_type, ArrayType):
+                    arrays.add(local.name.upper())
+                else:
+                    arrays.discard(local.name.upper())
+        return arrays
+
+    def emit_subroutine(self, decl, free_names: set):
+        params = ', '.join(python_name(param.name) for param in decl.parameters)
+        self.line(f"def {python_name(decl.name, 'f_')}({params}):")
+        self.indent += 1
+        self.line(f"global {', '.join(['_depth'] + [python_name(n) for n in sorted(free_names)])}")
+        self.line("if _depth >= _max_depth:")
+        self.line(f"    _overflow({decl.name!r})")
+        self.line("_depth += 1")
+        if self.metered:
+            self.line(f"_enter({len(decl.scope)}, {decl.line})")
+        for local in decl.declarations:
+            if not isinstance(local, VariableDeclaration):
+                continue
+            if isinstance(local.var_type, ArrayType):
+                bounds = ', '.join(f"({self.expr(dim.start)}, {self.expr(dim.end)})" for dim in local.var_type.dimensions)
+                self.line(f"{python_name(local.name)} = _array({local.name!r}, {local.line}, {local.var_type.base_type!r}, lambda: [{bounds}])")
+            else:
+                self.line(f"{python_name(local.name)} = 0")
+        if self.counted:
+            self.line(f"_step({decl.line})")
+        self.block(decl.body)
+        self.line("_depth -= 1")
+        if self.metered:
+            self.line("_leave()")
+        if isinstance(decl, FunctionDeclaration):
+            self.line(f"return {python_name(decl.name)}")
+        self.indent -= 1
+        self.line("")
+
+    # --- Statements ---
+
+    def block(self, statements: List[ASTNode]):
+        if not statements:
+            self.line("pass")
+        for stmt in statements:
+            if 'on_statement' in self.events:
+                self.line(f"_statement({self.node(stmt)})")
+            self.statement(stmt)
+
+    def statement(self, stmt: ASTNode):
+        if isinstance(stmt, Assignment) and 'on_assign' in self.events:
+            self.line(f"_v = {self.expr(stmt.value)}")
+            if stmt.indices:
+                self.line(f"_i = {self.indices(stmt.indices)}")
+                self.line(f"{self.array(stmt.identifier)}.set(_i, _v)")
+                self.line(f"_assign({stmt.identifier!r}, _i, _v, {stmt.line})")
+            else:
+                self.line(f"{python_name(stmt.identifier)} = _v")
+                self.line(f"_assign({stmt.identifier!r}, None, _v, {stmt.line})")
+
+        elif isinstance(stmt, Assignment):
+            value = self.expr(stmt.value)
+            if stmt.indices:
+                self.line(f"{self.array(stmt.identifier)}.set({self.indices(stmt.indices)}, {value})")
+            else:
+                self.line(f"{python_name(stmt.identifier)} = {value}")
+
+        elif isinstance(stmt, PrintStatement) and 'on_print' in self.events:
+            self.line("_printed = []")
+            previous = ''
+            for expr in stmt.expressions:
+                self.line(f"_printed.append(_print({self.expr(expr)}{previous}))")
+                previous = ', _printed[-1]'
+            self.line(f"_on_print(tuple(_printed), {stmt.line})")
+            self.line("_end_print()")
+
+        elif isinstance(stmt, PrintStatement):
+            # Each value is printed as soon as it is computed
+            previous = ''
+            for expr in stmt.expressions:
+                self.line(f"_p = _print({self.expr(expr)}{previous})")
+                previous = ', _p'
+            self.line("_end_print()")
+
+        elif isinstance(stmt, ReadStatement):
+            for var_expr, var_type in zip(stmt.variables, stmt.types):
+                if isinstance(var_expr, Identifier):
+                    self.line(f"{python_name(var_expr.name)} = _read({var_expr.name!r}, {var_type!r}, {stmt.line})")
+                elif isinstance(var_expr, ArrayAccess):
+                    self.line(f"_read_element({self.array(var_expr.name)}, {var_expr.name!r}, "
+                              f"{self.indices(var_expr.indices)}, {var_type!r}, {stmt.line})")
+                else:
+                    self.line(f"_read('variable', None, {stmt.line})")
+
+        elif isinstance(stmt, IfStatement):
+            self.line(f"if {self.condition(stmt.condition)}:")
+            self.indent += 1
+            self.block(stmt.then_branch)
+            self.indent -= 1
+            if stmt.else_branch:
+                self.line("else:")
+                self.indent += 1
+                self.block(stmt.else_branch)
+                self.indent -= 1
+
+        elif isinstance(stmt, ForLoop):
+            start = self.int_expr(stmt.start)
+            end = self.int_expr(stmt.end)
+            if _is_int_literal(stmt.step) and stmt.step.value != 0:
+                step = stmt.step.value
+                if step == 1:
+                    counter = f"range({start}, {end} + 1)"
+                elif step > 0:
+                    counter = f"range({start}, {end} + 1, {step})"
+                else:
+                    counter = f"range({start}, {end} - 1, {step})"
+            else:
+                counter = f"_for_range({start}, {end}, {self.int_expr(stmt.step)})"
+            self.line(f"for {python_name(stmt.variable)} in {counter}:")
+            self.indent += 1
+            if self.counted:
+                self.line(f"_step({stmt.line})")
+            self.block(stmt.body)
+            self.indent -= 1
+
+        elif isinstance(stmt, WhileLoop):
+            self.line(f"while {self.condition(stmt.condition)}:")
+            self.indent += 1
+            if self.counted:
+                self.line(f"_step({stmt.line})")
+            self.block(stmt.body)
+            self.indent -= 1
+
+        elif isinstance(stmt, CallExpression) and stmt.is_statement:
+            self.line(self.call(stmt))
+
+        else:
+            self.line(f"_fail({('Unknown statement type: ' + type(stmt).__name__)!r})")
+
+    # --- Expressions ---
+
+    def array(self, name: str) -> str:
+        if name.upper() in self.arrays:
+            return python_name(name)
+        return f"_element({python_name(name)}, {name!r})"
+
+    def indices(self, indices: List[ASTNode]) -> str:
+        return f"[{', '.join(self.int_expr(idx) for idx in indices)}]"
+
+    def int_expr(self, expr: ASTNode) -> str:
+        if _is_int_literal(expr):
+            return repr(expr.value)
+        return f"int({self.expr(expr)})"
+
+    def condition(self, expr: ASTNode) -> str:
+        """Translate an expression used only for its truth value.
+
+        Python truthiness matches to_bool(), and operands that cannot fail or
+        have side effects may be short-circuited without changing behaviour.
+        """
+        if isinstance(expr, BinaryOp) and expr.operator in ('AND', 'ΚΑΙ', 'OR', 'Ή'):
+            if _is_side_effect_free(expr.left) and _is_side_effect_free(expr.right):
+                op = 'and' if expr.operator in ('AND', 'ΚΑΙ') else 'or'
+                return f"({self.condition(expr.left)} {op} {self.condition(expr.right)})"
+        if isinstance(expr, UnaryOp) and expr.operator in ('NOT', 'ΟΧΙ'):
+            return f"(not {self.condition(expr.operand)})"
+        return self.expr(expr)
+
+    def expr(self, expr: ASTNode) -> str:
+        if isinstance(expr, Literal):
+            return repr(expr.value)
+
+        elif isinstance(expr, Identifier):
+            return python_name(expr.name)
+
+        elif isinstance(expr, BinaryOp):
+            left = self.expr(expr.left)
+            right = self.expr(expr.right)
+            op = expr.operator
+            if op == '+' and self.metered:
+                return f"_add({left}, {right})"
+            if op in ('+', '-', '*', '/'):
+                return f"({left} {op} {right})"
+            elif op == 'DIV':
+                return f"int({left} / {right})"
+            elif op in ('MOD', '%'):
+                return f"({left} % {right})"
+            elif op in self.COMPARISONS:
+                return f"({left} {self.COMPARISONS[op]} {right})"
+            elif op in ('AND', 'ΚΑΙ'):
+                return f"_and({left}, {right})"
+            elif op in ('OR', 'Ή'):
+                return f"_or({left}, {right})"
+            return f"_fail({('Unknown operator: ' + op)!r})"
+
+        elif isinstance(expr, UnaryOp):
+            operand = self.expr(expr.operand)
+            if expr.operator == '-':
+                return f"(-{operand})"
+            elif expr.operator in ('NOT', 'ΟΧΙ'):
+                return f"(not {operand})"
+            return f"_fail({('Unknown unary operator: ' + expr.operator)!r})"
+
+        elif isinstance(expr, ArrayAccess):
+            return f"{self.array(expr.name)}.get({self.indices(expr.indices)})"
+
+        elif isinstance(expr, CallExpression) and not expr.is_statement:
+            return self.call(expr)
+
+        return f"_fail({('Cannot evaluate: ' + type(expr).__name__)!r})"
+
+    def call(self, call: CallExpression) -> str:
+        decl = self.subroutines.get(call.name.upper())
+        if decl is None:
+            return f"_fail({('Undefined function or procedure: ' + call.name)!r})"
+        if not call.is_statement and not isinstance(decl, FunctionDeclaration):
+            message = f"Procedure '{call.name}' used as an expression (function)."
+            return f"_fail({message!r})"
+        if len(call.arguments) != len(decl.parameters):
+            message = f"Function/Procedure '{call.name}' called with {len(call.arguments)} arguments, expected {len(decl.parameters)}."
+            return f"_fail({message!r})"
+
+        args = []
+        for param, arg_expr in zip(decl.parameters, call.arguments):
+            if param.is_reference:
+                if not isinstance(arg_expr, (Identifier, ArrayAccess)):
+                    message = f"Argument for reference parameter '{param.name}' must be a variable or array access passed by name."
+                    return f"_fail({message!r})"
+                # Like the tree walker, a reference argument passes the whole variable.
+                args.append(python_name(arg_expr.name))
+            else:
+                args.append(self.expr(arg_expr))
+        if 'on_call' in self.events or 'on_return' in self.events:
+            return f"_invoke({self.node(decl)}, {call.line}, {', '.join([python_name(decl.name, 'f_')] + args)})"
+        return f"{python_name(decl.name, 'f_')}({', '.join(args)})"
+
+
+class PythonInterpreter(Interpreter):
+    """Runs a program translated to Python source and compiled by CPython.
+
+    Compiled code objects are cached on disk by source hash, so re-running an
+    unchanged program skips translation and compilation.
+    """
+
+    def __init__(self, debug=False, output: Optional[OutputBuffer] = None,
+                 reader: Optional[InputReader] = None, budget: Optional[ExecutionBudget] = None,
+                 memory: Optional[MemoryQuota] = None, hooks: Optional[Hooks] = None,
+                 optimize: bool = False, memoize: bool = False, max_depth: int = DEFAULT_MAX_DEPTH):
+        super().__init__(debug=debug, output=output, reader=reader, budget=budget, memory=memory, hooks=hooks,
+                         optimize=optimize, memoize=memoize, max_depth=max_depth)
+        self.cache_dir = default_cache_dir()
+
+    def prepare(self, program: Program):
+        self.declare(program)
+        self.code = self.load_code(program)
+
+    def start(self):
+        namespace = self.runtime_namespace()
+        exec(self.code, namespace)
+        try:
+            namespace['_main']()
+        except ZeroDivisionError as e:
+            raise RuntimeError("Modulo by zero" if 'modulo' in str(e) else "Division by zero")
+        except NameError as e:
+            name = e.name or str(e).split("'")[1]
+            raise RuntimeError(f"Undefined variable: {eap_name(name)}")
+
+    def load_code(self, program: Program):
+        """Return the compiled program, from the cache if possible."""
+        import marshal
+
+        counted = self.budget is not None
+        metered = self.memory is not None
+        memoized = self.memo.functions if self.memo is not None else set()
+        events = set()
+        if self.hooks is not None:
+            events = {event for event in ('on_statement', 'on_assign', 'on_call', 'on_return', 'on_print')
+                      if self.hooks.handles(event)}
+        self.nodes = []
+        path = None
+        # Code that reports events refers to this run's AST nodes, so it is never cached
+        if self.source_digest and self.cache_dir and not events:
+            # Code with budget or quota checks, from a folded program or with memoized
+            # functions is cached apart from the plain code
+            kind = ('code' + ('-counted' if counted else '') + ('-metered' if metered else '')
+                    + ('-optimized' if self.optimize else '') + ('-memoized' if self.memo is not None else ''))
+            path = cache_path(self.cache_dir, self.source_digest, kind)
+            try:
+                with open(path, 'rb') as f:
+                    code = marshal.load(f)
+                self.log(f"Loaded compiled program from {path}")
+                return code
+            except (OSError, EOFError, ValueError, TypeError):
+                pass
+
+        transpiler = PythonTranspiler(program, counted=counted, metered=metered, memoized=memoized, events=events)
+        source = transpiler.transpile()
+        self.nodes = transpiler.nodes
+        self.log(f"Generated Python source:\n{source}")
+        code = compile(source, f"<eap:{program.name}>", 'exec')
+
+        if path:
+            try:
+                write_cache_file(path, marshal.dump, code)
+            except OSError as e:
+                self.log(f"Could not cache compiled program: {e}")
+        return code
+
+    def runtime_namespace(self) -> Dict[str, Any]:
+        """Globals for the generated code: runtime helpers plus the declared globals."""
+        namespace = {
+            '_initial': self.global_values(),
+            '_print': self.output.print_value,
+            '_end_print': self.output.end_print,
+            '_read': self._read,
+            '_read_element': self._read_element,
+            '_element': self._element,
+            '_array': self._array,
+            '_for_range': self._for_range,
+            '_and': self._and,
+            '_or': self._or,
+            '_fail': self._fail,
+            '_depth': 0,
+            '_max_depth': self.max_depth,
+            '_overflow': self._overflow,
+        }
+        if self.budget is not None:
+            namespace['_step'] = self.budget.step
+        if self.memory is not None:
+            namespace.update(_enter=self.memory.enter, _leave=self.memory.leave, _add=self.memory.add)
+        if self.memo is not None:
+            namespace['_memoize'] = self.memo.wrap
+        if self.hooks is not None:
+            namespace.update(_nodes=self.nodes, _statement=self.hooks.on_statement, _assign=self.hooks.on_assign,
+                             _on_print=self.hooks.on_print, _invoke=self._invoke)
+        for key, value in self.global_values().items():
+            namespace[python_name(key)] = value
+        return namespace
+
+    def _invoke(self, decl, line, function, *args):
+        self.hooks.on_call(decl, line)
+        result = function(*args)
+        self.hooks.on_return(decl, result)
+        return result
+
+    def _read(self, name, var_type=None, line=0):
+        value = self.read_value(name, var_type)
+        if self.hooks is not None:
+            self.hooks.on_read(name, value, line)
+        return value
+
+    def _read_element(self, array, name, indices, var_type=None, line=0):
+        name = f"{name}[{','.join(map(str, indices))}]"
+        value = self.read_value(name, var_type)
+        array.set(indices, value)
+        if self.hooks is not None:
+            self.hooks.on_read(name, value, line)
+
+    @staticmethod
+    def _element(value, name):
+        if not isinstance(value, ArrayObject):
+            raise RuntimeError(f"{name} is not an array")
+        return value
+
+    def _array(self, name, line, base_type, bounds):
+        try:
+            bounds = [{'from': int(start), 'to': int(end)} for start, end in bounds()]
+        except Exception as e:
+            raise RuntimeError(f"Array bounds must evaluate to integers. Error in '{name}' array declaration (line {line or '?'}): {e}")
+        if self.memory is not None:
+            self.memory.array(bounds, name, line)
+        return ArrayObject(bounds, base_type)
+
+    @staticmethod
+    def _for_range(start, end, step):
+        if step > 0:
+            return range(start, end + 1, step)
+        if step < 0:
+            return range(start, end - 1, step)
+        # A zero step never advances; keep the tree walker's semantics.
+        return _repeat_forever(start) if start >= end else ()
+
+    def _and(self, left, right):
+        return self.to_bool(left) and self.to_bool(right)
+
+    def _or(self, left, right):
+        return self.to_bool(left) or self.to_bool(right)
+
+    @staticmethod
+    def _fail(message):
+        raise RuntimeError(message)
+
+    def _overflow(self, name):
+        # The callee counts its nesting, so the line of the call is not known
+        raise stack_overflow(self.max_depth, name)
+
+
+# =============================================================================
+# PROFILER (--profile)
+# =============================================================================
+#
+# `--profile` runs the program on a tree walker that times every statement
+# and every subroutine call. At exit it prints the hottest source lines and
+# the subroutines on stderr; `--profile-stacks=FILE` also writes the time
+# spent in each call stack in the collapsed format read by flamegraph.pl and
+# speedscope: one "Program;outer;inner MICROSECONDS" line per stack.
+
+# Source lines shown in the --profile report
+PROFILE_TOP_LINES = 20
+
+
+class ProfilingInterpreter(Interpreter):
+    """A tree walker that records where a program spends its time.
+
+    Per source line: how many statements on it ran, their total time
+    (including everything they called, with recursive re-entries counted
+    once) and their self time. Per subroutine: calls, total and self time.
+    Per call stack: self time, kept as a tree of [self time, children] nodes
+    so that a call costs the same however deep it is.
+    """
+
+    # Every iteration of a loop body should show up in the line counts
+    vector_loops = False
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        import time
+        self.clock = time.perf_counter
+        self.lines = {}  # line -> [hits, total, self time]
+        self.calls = {}  # subroutine name -> [calls, total, self time]
+        self.active_lines = {}  # line or name -> runs of it in progress
+        self.active_calls = {}
+        self.nested = 0.0  # Time of the finished statements inside the running one
+        self.nested_calls = 0.0  # Time of the finished calls inside the running one
+        self.call_tree = [0.0, {}]
+        self.stack = [self.call_tree]
+        self.elapsed = 0.0
+        self.program = None  # Set once the program is prepared
+
+    def start(self):
+        self.nested_calls = 0.0
+        started = self.clock()
+        try:
+            super().start()
+        finally:
+            self.elapsed = self.clock() - started
+            self.call_tree[0] += self.elapsed - self.nested_calls
+
+    def execute_statement(self, stmt: ASTNode):
+        line = stmt.line
+        stats = self.lines.get(line)
+        if stats is None:
+            stats = self.lines[line] = [0, 0.0, 0.0]
+        stats[0] += 1
+        depth = self.active_lines.get(line, 0)
+        self.active_lines[line] = depth + 1
+        outer = self.nested
+        self.nested = 0.0
+        started = self.clock()
+        try:
+            super().execute_statement(stmt)
+        finally:
+            elapsed = self.clock() - started
+            stats[2] += elapsed - self.nested
+            if depth == 0:
+                stats[1] += elapsed
+            self.active_lines[line] = depth
+            self.nested = outer + elapsed
+
+    def _execute_subroutine(self, subroutine_decl, call: CallExpression):
+        name = subroutine_decl.name
+        stats = self.calls.get(name)
+        if stats is None:
+            stats = self.calls[name] = [0, 0.0, 0.0]
+        stats[0] += 1
+        depth = self.active_calls.get(name, 0)
+        self.active_calls[name] = depth + 1
+        children = self.stack[-1][1]
+        node = children.get(name)
+        if node is None:
+            node = children[name] = [0.0, {}]
+        self.stack.append(node)
+        outer = self.nested_calls
+        self.nested_calls = 0.0
+        started = self.clock()
+        try:
+            return super()._execute_subroutine(subroutine_decl, call)
+        finally:
+            elapsed = self.clock() - started
+            stats[2] += elapsed - self.nested_calls
+            node[0] += elapsed - self.nested_calls
+            if depth == 0:
+                stats[1] += elapsed
+            self.active_calls[name] = depth
+            self.stack.pop()
+            self.nested_calls = outer + elapsed
+
+    def collapsed_stacks(self) -> List[str]:
+        """Self time of each call stack as 'Program;outer;inner MICROSECONDS' lines."""
+        out = []
+        pending = [(self.program.name, self.call_tree)]
+        while pending:
+            path, (own, children) = pending.pop()
+            microseconds = round(own * 1e6)
+            if microseconds > 0:
+                out.append(f"{path} {microseconds}")
+            for name, child in children.items():
+                pending.append((f"{path};{name}", child))
+        out.sort()
+        return out
+
+    def report(self, source_lines: List[str]) -> str:
+        """The hot-line and subroutine report, hottest (by self time) first."""
+        total = self.elapsed or 1e-9
+        out = [f"Profile of {self.program.name}: {self.elapsed:.4f} s", "",
+               f"{'Line':>6} {'Hits':>10} {'Total s':>10} {'Self s':>10} {'Self %':>7}  Source"]
+        hottest = sorted(self.lines.items(), key=lambda item: item[1][2], reverse=True)
+        for line, (hits, line_total, own) in hottest[:PROFILE_TOP_LINES]:
+            source = source_lines[line - 1].strip() if 0 < line <= len(source_lines) else ''
+            out.append(f"{line:>6} {hits:>10} {line_total:>10.4f} {own:>10.4f} {100 * own / total:>6.1f}%  {source}")
+        if self.calls:
+            out += ["", f"{'Subroutine':<24} {'Calls':>10} {'Total s':>10} {'Self s':>10} {'Self %':>7}"]
+            for name, (count, call_total, own) in sorted(self.calls.items(), key=lambda item: item[1][2], reverse=True):
+                out.append(f"{name:<24} {count:>10} {call_total:>10.4f} {own:>10.4f} {100 * own / total:>6.1f}%")
+        return '\n'.join(out)
+
+
+# =============================================================================
+# CACHES
+# =============================================================================
+
+def default_cache_dir() -> str:
+    """Per-user cache directory for parsed and compiled programs."""
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~\\AppData\\Local')
+    elif sys.platform == 'darwin':
+        base = os.path.expanduser('~/Library/Caches')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'greek-pseudorun')
+
+
+def source_digest(data: bytes) -> str:
+    """Content hash identifying a program source file in the caches."""
+    import hashlib
+    return hashlib.sha256(data).hexdigest()
+
+
+def cache_path(cache_dir: str, digest: str, kind: str) -> str:
+    return os.path.join(cache_dir, f"{digest}.{CACHE_TAG}.{kind}")
+
+
+def write_cache_file(path: str, dump, value):
+    """Write `value` with `dump(value, file)` atomically, so concurrent runs never see partial files."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, 'wb') as f:
+            dump(value, f)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def load_program(cache_dir: str, digest: str) -> Optional[Program]:
+    """Return the parsed program cached for this source, or None."""
+    import pickle
+    try:
+        with open(cache_path(cache_dir, digest, 'ast'), 'rb') as f:
+            program = pickle.load(f)
+    except Exception:
+        # Missing, unreadable, truncated or from an incompatible version
+        return None
+    return program if isinstance(program, Program) else None
+
+
+def store_program(cache_dir: str, digest: str, program: Program) -> Optional[str]:
+    """Cache a freshly parsed program; returns an error message if it could not be stored."""
+    import pickle
+    try:
+        write_cache_file(cache_path(cache_dir, digest, 'ast'), pickle.dump, program)
+    except (OSError, pickle.PicklingError, RecursionError) as e:
+        return str(e) or type(e).__name__
+    return None
+
+
+# Execution engines selectable with --engine
+ENGINES = {
+    'tree': Interpreter,
+    'closures': ClosureInterpreter,
+    'vm': VMInterpreter,
+    'python': PythonInterpreter,
+}
+
+
+def read_source(filename) -> bytes:
+    """Read the raw bytes of a program file, exiting with a message on failure"""
+    try:
+        with open(filename, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        print(f"Error: File '{filename}' not found", file=sys.stderr)
+        sys.exit(1)
+    except Exception as e:
+        print(f"Error reading file: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+def decode_source(raw: bytes):
+    """Detect file encoding (UTF-8 or Windows-1253)"""
+    # Try UTF-8 first
+    try:
+        text = raw.decode('utf-8')
+        if 'ΑΛΓΟΡΙΘΜΟΣ' in text.upper() or 'ALGORITHM' in text.upper():
+            return text, 'utf-8'
+    except:
+        pass
+    
+    # Try Windows-1253 (often used for Greek text)
+    try:
+        text = raw.decode('windows-1253')
+        if 'ΑΛΓΟΡΙΘΜΟΣ' in text.upper() or 'ALGORITHM' in text.upper():
+            return text, 'windows-1253'
+    except:
+        pass
+    
+    # Default to UTF-8 with replacement for corrupted bytes
+    return raw.decode('utf-8', errors='replace'), 'utf-8'
+
+
+def detect_encoding(filename):
+    """Read a program file and detect its encoding (UTF-8 or Windows-1253)"""
+    return decode_source(read_source(filename))
+
+
+# Command-line options: flag -> (option name, value converter or None for switches)
+def parse_size(text: str) -> int:
+    """A size in bytes, with an optional K, M or G (binary) suffix: '512', '64M'."""
+    units = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+    text = text.strip().upper().removesuffix('IB').removesuffix('B')
+    scale = units.get(text[-1:], 1)
+    if scale != 1:
+        text = text[:-1]
+    size = int(float(text) * scale)
+    if size < 0:
+        raise ValueError(text)
+    return size
+
+
+CLI_OPTIONS = {
+    '--debug': ('debug', None),
+    '--engine': ('engine', str),
+    '--cache-dir': ('cache_dir', str),
+    '--serve': ('serve', None),
+    '--check-startup': ('check_startup', float),
+    '--unbuffered': ('unbuffered', None),
+    '--input': ('input', str),
+    '--no-prompt': ('no_prompt', None),
+    '--cases': ('cases', str),
+    '--batch': ('batch', str),
+    '--timeout': ('timeout', float),
+    '--max-steps': ('max_steps', int),
+    '--max-memory': ('max_memory', parse_size),
+    '--max-depth': ('max_depth', int),
+    '--output-limit': ('output_limit', int),
+    '--profile': ('profile', None),
+    '--profile-stacks': ('profile_stacks', str),
+    '-O': ('optimize', None),
+    '--memoize': ('memoize', None),
+}
+
+DEFAULT_OPTIONS = {
+    'debug': False,
+    'engine': 'tree',
+    'cache_dir': None,  # default_cache_dir(); an empty value disables caching
+    'serve': False,
+    'check_startup': None,  # Import time budget in milliseconds
+    'unbuffered': False,
+    'input': None,  # File to read ΔΙΑΒΑΣΕ values from instead of prompting
+    'no_prompt': False,
+    'cases': None,  # Directory of NAME.in / NAME.out test cases
+    'batch': None,  # Directory of programs to run
+    'timeout': None,  # Seconds a run may take
+    'max_steps': None,  # Loop iterations and subroutine calls a run may take
+    'max_memory': None,  # Bytes of arrays, frames and strings a run may hold
+    'max_depth': DEFAULT_MAX_DEPTH,  # Nested subroutine calls a run may make
+    'output_limit': None,  # Characters a run may print
+    'profile': False,
+    'profile_stacks': None,  # File for the collapsed call stacks of --profile
+    'optimize': False,
+    'memoize': False,
+}
+
+
+def parse_args(argv):
+    """Split the command line into the program file and a dict of options."""
+    filename = None
+    options = dict(DEFAULT_OPTIONS)
+    args = iter(argv)
+    for arg in args:
+        if not arg.startswith('-') or arg == '-':
+            if filename is not None:
+                raise ValueError(f"Unexpected argument: {arg}")
+            filename = arg
+            continue
+
+        flag, has_value, value = arg.partition('=')
+        if flag not in CLI_OPTIONS:
+            raise ValueError(f"Unknown option: {flag}")
+        name, convert = CLI_OPTIONS[flag]
+        if convert is None:
+            if has_value:
+                raise ValueError(f"Option {flag} does not take a value")
+            options[name] = True
+            continue
+        if not has_value:
+            value = next(args, None)
+            if value is None:
+                raise ValueError(f"Option {flag} requires a value")
+        try:
+            options[name] = convert(value)
+        except ValueError:
+            raise ValueError(f"Invalid value for {flag}: {value}")
+
+    if options['engine'] not in ENGINES:
+        raise ValueError(f"Unknown engine '{options['engine']}' (choose from: {', '.join(ENGINES)})")
+    if options['profile_stacks'] is not None:
+        options['profile'] = True
+    if options['profile'] and options['engine'] != 'tree':
+        raise ValueError("--profile only works with the tree engine (--engine=tree)")
+    return filename, options
+
+
+def usage():
+    print("EAP Pseudocode Interpreter")
+    print(f"Usage: {sys.argv[0]} <file.eap> [--debug] [--engine=tree|closures|vm|python] [--cache-dir=DIR]")
+    print("                  [--unbuffered] [--input=FILE | --no-prompt] [--cases=DIR]")
+    print("                  [--max-steps=N] [--timeout=S] [--max-memory=SIZE] [--max-depth=N]")
+    print("                  [--profile] [--profile-stacks=FILE] [-O] [--memoize]")
+    print(f"       {sys.argv[0]} --batch=DIR [--timeout=S] [--output-limit=N] [options]")
+    print(f"       {sys.argv[0]} --serve [options]   (JSON-over-stdio server for editors)")
+    print(f"       {sys.argv[0]} --check-startup=MS  (fail if importing the interpreter takes longer)")
+    print("\nExample:")
+    print(f"  {sys.argv[0]} program.eap")
+    print(f"  {sys.argv[0]} program.eap --debug")
+    print(f"  {sys.argv[0]} program.eap --engine=closures")
+
+
+def parse_program(raw: bytes, debug=False) -> Program:
+    """Decode, tokenize and parse a program file; tokens stream straight into the parser."""
+    code, encoding = decode_source(raw)
+    if debug:
+        print(f"[DEBUG] File encoding: {encoding}", file=sys.stderr)
+        print(f"[DEBUG] File size: {len(code)} characters", file=sys.stderr)
+
+    tokenizer = Tokenizer(code)
+    if debug:
+        tokens = tokenizer.tokenize()
+        tokenizer.tokens = []
+        print(f"[DEBUG] Generated {len(tokens)} tokens", file=sys.stderr)
+    else:
+        tokens = tokenizer.stream()
+    parser = Parser(tokens)
+    del tokens  # The parser holds the only reference, and drops it when done
+    return without_gc(parser.parse)
+
+
+def load_ast(raw: bytes, digest: str, cache_dir: str, debug=False, programs=None) -> Program:
+    """Return the parsed program for `raw`, from a cache when possible.
+
+    `programs` maps digests to pickled ASTs kept in memory by --serve; it is
+    checked before the disk cache. Each call gets its own copy of the AST.
+    """
+    if programs is not None and digest in programs:
+        import pickle
+        if debug:
+            print("[DEBUG] Loaded parsed program from memory", file=sys.stderr)
+        return pickle.loads(programs[digest])
+
+    ast = load_program(cache_dir, digest) if cache_dir else None
+    if ast is not None:
+        if debug:
+            print(f"[DEBUG] Loaded parsed program from cache: {cache_path(cache_dir, digest, 'ast')}", file=sys.stderr)
+    else:
+        ast = parse_program(raw, debug)
+        if cache_dir:
+            error = store_program(cache_dir, digest, ast)
+            if error and debug:
+                print(f"[DEBUG] Could not cache parsed program: {error}", file=sys.stderr)
+
+    if programs is not None:
+        import pickle
+        try:
+            programs[digest] = pickle.dumps(ast)
+        except RecursionError:
+            pass
+    return ast
+
+
+class OutputLimitExceeded(RuntimeError):
+    """The program printed more than --output-limit characters."""
+
+
+class LimitedOutput:
+    """Passes at most `limit` characters on to `stream`, then raises OutputLimitExceeded."""
+
+    def __init__(self, stream, limit: int):
+        self.stream = stream
+        self.limit = limit
+        self.written = 0
+
+    def write(self, text: str) -> int:
+        room = self.limit - self.written
+        if len(text) > room:
+            self.stream.write(text[:max(room, 0)])
+            self.written = self.limit
+            raise OutputLimitExceeded(f"Output limit of {self.limit} characters exceeded")
+        self.written += len(text)
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def isatty(self) -> bool:
+        isatty = getattr(self.stream, 'isatty', None)
+        return bool(isatty and isatty())
+
+
+def execution_budget(options: Dict[str, Any]) -> Optional[ExecutionBudget]:
+    """The step and time limits set by --max-steps and --timeout, if any."""
+    if options['max_steps'] is None and options['timeout'] is None:
+        return None
+    return ExecutionBudget(options['max_steps'], options['timeout'])
+
+
+def memory_quota(options: Dict[str, Any]) -> Optional[MemoryQuota]:
+    """The memory quota set by --max-memory, if any."""
+    if options['max_memory'] is None:
+        return None
+    return MemoryQuota(options['max_memory'])
+
+
+def memory_report(memory: MemoryQuota) -> str:
+    return f"Peak memory: {memory.peak} bytes ({format_size(memory.peak)} of {format_size(memory.limit)})"
+
+
+def run_program(filename: str, options: Dict[str, Any], programs=None, memory: Optional[MemoryQuota] = None):
+    """Parse and run one program file. Errors are raised; run_failure() describes them.
+
+    `memory` is the quota to run under, by default the one --max-memory sets.
+    """
+    debug = options['debug']
+    cache_dir = options['cache_dir']
+    if cache_dir is None:
+        cache_dir = default_cache_dir()
+
+    # Read file
+    raw = read_source(filename)
+    digest = source_digest(raw)
+    ast = load_ast(raw, digest, cache_dir, debug, programs)
+    del raw
+    if debug:
+        print(f"[DEBUG] Parsed program: {ast.name}", file=sys.stderr)
+        print(f"[DEBUG] Declarations: {len(ast.declarations)}", file=sys.stderr)
+        print(f"[DEBUG] Statements: {len(ast.body)}", file=sys.stderr)
+
+    # Execute
+    stream = sys.stdout
+    if options['output_limit'] is not None:
+        stream = LimitedOutput(stream, options['output_limit'])
+    output = OutputBuffer(stream, unbuffered=options['unbuffered'] or debug)
+    input_file = reader = None
+    if options['input'] is not None:
+        input_file = open(options['input'], encoding='utf-8-sig')
+        reader = InputReader(input_file)
+    elif options['no_prompt']:
+        reader = InputReader(sys.stdin)
+    budget = execution_budget(options)
+    if memory is None:
+        memory = memory_quota(options)
+    engine = ProfilingInterpreter if options['profile'] else ENGINES[options['engine']]
+    interpreter = engine(debug=debug, output=output, reader=reader, budget=budget, memory=memory,
+                         optimize=options['optimize'], memoize=options['memoize'],
+                         max_depth=options['max_depth'])
+    interpreter.source_digest = digest
+    interpreter.cache_dir = cache_dir or None
+    try:
+        interpreter.prepare(ast)
+        for optimizer in interpreter.optimizers:
+            print(optimizer.report(), file=sys.stderr)
+        if budget is not None:
+            budget.start()
+        start_deep(interpreter)
+    finally:
+        # Whatever the program printed comes before any error message
+        try:
+            output.flush()
+        finally:
+            if input_file is not None:
+                input_file.close()
+            if options['profile']:
+                write_profile(interpreter, filename, options['profile_stacks'])
+            if interpreter.memo is not None:
+                print(interpreter.memo.report(), file=sys.stderr)
+
+
+def write_profile(interpreter: ProfilingInterpreter, filename: str, stacks_path: Optional[str]):
+    """Print the --profile report on stderr and write the collapsed stacks, if asked to."""
+    if interpreter.program is None:
+        return
+    code, _ = decode_source(read_source(filename))
+    print(interpreter.report(code.splitlines()), file=sys.stderr)
+    if stacks_path is not None:
+        with open(stacks_path, 'w', encoding='utf-8') as f:
+            f.writelines(line + '\n' for line in interpreter.collapsed_stacks())
+
+
+def run_failure(error: BaseException):
+    """How a run that raised `error` ends: (exit status, category, message)."""
+    if isinstance(error, SyntaxError):
+        return 1, 'syntax', f"Syntax Error: {error}"
+    if isinstance(error, OutputLimitExceeded):
+        return 1, 'output_limit', f"Runtime Error: {error}"
+    if isinstance(error, StepLimitExceeded):
+        return 1, 'step_limit', f"Runtime Error: {error}"
+    if isinstance(error, TimeLimitExceeded):
+        return 1, 'timeout', f"Runtime Error: {error}"
+    if isinstance(error, MemoryLimitExceeded):
+        return 1, 'memory_limit', f"Runtime Error: {error}"
+    if isinstance(error, StackOverflow):
+        return 1, 'stack_overflow', f"Runtime Error: {error}"
+    if isinstance(error, RecursionError):
+        # Python's own limit, where start_deep could not make room for --max-depth calls
+        return 1, 'stack_overflow', ("Runtime Error: Stack overflow: calls nested too deeply for this engine; "
+                                     "--engine=vm runs them on its own stack")
+    if isinstance(error, RuntimeError):
+        return 1, 'runtime', f"Runtime Error: {error}"
+    if isinstance(error, KeyboardInterrupt):
+        return 130, 'interrupted', "\n\nExecution interrupted"
+    return 1, 'error', f"Error: {error}"
+
+
+def run(filename: str, options: Dict[str, Any], programs=None) -> int:
+    """Run one program file; errors and peak memory are reported on stderr. Returns the exit status."""
+    memory = memory_quota(options)
+    status = 0
+    try:
+        run_program(filename, options, programs, memory)
+    except (Exception, KeyboardInterrupt) as e:
+        status, category, message = run_failure(e)
+        print(message, file=sys.stderr)
+        if options['debug'] and category == 'error':
+            import traceback
+            traceback.print_exc()
+    if memory is not None:
+        print(memory_report(memory), file=sys.stderr)
+    return status
+
+
+# =============================================================================
+# TEST CASES (--cases)
+# =============================================================================
+#
+# `interpreter.py program.eap --cases DIR` runs one program against every
+# case in DIR: NAME.out holds the expected output and NAME.in, if present,
+# the input (read as with --input). The program is parsed and prepared once;
+# each case then runs in a forked copy of that process, so the prepared
+# program is shared copy-on-write instead of being rebuilt. Outputs match
+# when they are equal line by line, ignoring trailing whitespace.
+
+def find_cases(directory: str) -> List[Dict[str, Any]]:
+    """The cases in `directory`, sorted by name."""
+    cases = []
+    for entry in sorted(os.listdir(directory)):
+        name, extension = os.path.splitext(entry)
+        if extension != '.out':
+            continue
+        input_path = os.path.join(directory, name + '.in')
+        cases.append({
+            'name': name,
+            'input': input_path if os.path.isfile(input_path) else None,
+            'expected': os.path.join(directory, entry),
+        })
+    return cases
+
+
+def output_lines(text: str) -> List[str]:
+    lines = [line.rstrip() for line in text.splitlines()]
+    while lines and not lines[-1]:
+        lines.pop()
+    return lines
+
+
+def run_case(interpreter: Interpreter, case: Dict[str, Any]) -> Dict[str, Any]:
+    """Start a prepared interpreter on one case and compare its output.
+
+    The interpreter's output must go to a fresh io.StringIO.
+    """
+    import io
+    import time
+
+    result = {'name': case['name']}
+    input_file = open(case['input'], encoding='utf-8-sig') if case['input'] else io.StringIO()
+    interpreter.reader = InputReader(input_file)
+    error = None
+    started = time.perf_counter()
+    try:
+        if interpreter.budget is not None:
+            interpreter.budget.start()
+        start_deep(interpreter)
+    except RuntimeError as e:
+        error = f"Runtime Error: {e}"
+    except Exception as e:
+        error = f"Error: {e}"
+    finally:
+        input_file.close()
+    result['time'] = round(time.perf_counter() - started, 6)
+    if interpreter.memory is not None:
+        result['peak_memory'] = interpreter.memory.peak
+
+    interpreter.output.flush()
+    got = output_lines(interpreter.output.stream.getvalue())
+    with open(case['expected'], encoding='utf-8-sig') as f:
+        expected = output_lines(f.read())
+    if error is not None:
+        result['status'] = 'error'
+        result['error'] = error
+    elif got == expected:
+        result['status'] = 'pass'
+    else:
+        # Report the first line that differs
+        result['status'] = 'fail'
+        line = next((i for i, (a, b) in enumerate(zip(got, expected)) if a != b), min(len(got), len(expected)))
+        result['line'] = line + 1
+        result['expected'] = expected[line] if line < len(expected) else None
+        result['got'] = got[line] if line < len(got) else None
+    return result
+
+
+def worker_count() -> int:
+    """How many runs --cases and --batch do at once: one per core this process may use."""
+    if hasattr(os, 'sched_getaffinity'):
+        return max(1, len(os.sched_getaffinity(0)))
+    return os.cpu_count() or 1
+
+
+def run_forked(prepare, cases: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Prepare one interpreter, then run every case in a forked copy of it.
+
+    Each worker writes its result to a file, which is collected when the
+    worker exits.
+    """
+    import io
+    import json
+    import tempfile
+
+    interpreter = prepare(io.StringIO())
+    # Keep the prepared objects out of the workers' garbage collections, so
+    # their memory pages stay shared with this process
+    gc.freeze()
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    results = [None] * len(cases)
+    running = {}  # pid -> index of its case
+    pending = iter(range(len(cases)))
+    workers = worker_count()
+    with tempfile.TemporaryDirectory(prefix='eap-cases-') as directory:
+        def result_path(index):
+            return os.path.join(directory, f"{index}.json")
+
+        while True:
+            while len(running) < workers:
+                index = next(pending, None)
+                if index is None:
+                    break
+                pid = os.fork()
+                if pid == 0:
+                    status = 1
+                    try:
+                        result = run_case(interpreter, cases[index])
+                        with open(result_path(index), 'w', encoding='utf-8') as f:
+                            json.dump(result, f)
+                        status = 0
+                    finally:
+                        os._exit(status)
+                running[pid] = index
+            if not running:
+                break
+
+            pid, status = os.wait()
+            index = running.pop(pid, None)
+            if index is None:
+                continue
+            try:
+                with open(result_path(index), encoding='utf-8') as f:
+                    results[index] = json.load(f)
+            except (OSError, ValueError):
+                results[index] = {'name': cases[index]['name'], 'status': 'error',
+                                  'error': f"Worker ended with status {status}"}
+    gc.unfreeze()
+    return results
+
+
+def run_cases(filename: str, directory: str, options: Dict[str, Any]) -> int:
+    """Run a program against the cases in `directory` and print a JSON report.
+
+    Returns 0 when every case passes.
+    """
+    import io
+    import json
+
+    if not os.path.isdir(directory):
+        print(f"Error: Not a directory: {directory}", file=sys.stderr)
+        return 1
+    cases = find_cases(directory)
+    cache_dir = options['cache_dir']
+    if cache_dir is None:
+        cache_dir = default_cache_dir()
+
+    raw = read_source(filename)
+    digest = source_digest(raw)
+    try:
+        ast = load_ast(raw, digest, cache_dir, options['debug'])
+    except SyntaxError as e:
+        print(f"Syntax Error: {e}", file=sys.stderr)
+        return 1
+    del raw
+
+    def prepare(stream):
+        interpreter = ENGINES[options['engine']](debug=options['debug'], output=OutputBuffer(stream),
+                                                 budget=execution_budget(options),
+                                                 memory=memory_quota(options),
+                                                 optimize=options['optimize'],
+                                                 memoize=options['memoize'],
+                                                 max_depth=options['max_depth'])
+        interpreter.source_digest = digest
+        interpreter.cache_dir = cache_dir or None
+        interpreter.prepare(ast)
+        return interpreter
+
+    try:
+        if hasattr(os, 'fork'):
+            results = run_forked(prepare, cases)
+        else:
+            # No fork (Windows): prepare a fresh interpreter for every case
+            results = [run_case(prepare(io.StringIO()), case) for case in cases]
+    except RuntimeError as e:
+        print(f"Runtime Error: {e}", file=sys.stderr)
+        return 1
+
+    counts = {status: sum(r['status'] == status for r in results) for status in ('pass', 'fail', 'error')}
+    report = {'program': filename, 'engine': options['engine'], **counts, 'cases': results}
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0 if counts['pass'] == len(results) else 1
+
+
+# =============================================================================
+# BATCH (--batch)
+# =============================================================================
+#
+# `interpreter.py --batch DIR` runs every .eap file under DIR, one forked
+# worker per file and at most one per core, and prints a JSON report with
+# each run's exit status, category (ok, syntax, runtime, output_limit,
+# step_limit, timeout, memory_limit, stack_overflow, interrupted, error),
+# message, time, peak memory and output. Runs read their input from --input
+# FILE, or get none. A run is stopped at the line it was executing once it
+# takes longer than --timeout seconds or more than --max-steps steps, holds
+# more than --max-memory bytes, or prints more than --output-limit
+# characters; a run stuck where the budget is never checked is killed
+# shortly after.
+
+BATCH_TIMEOUT = 10.0
+BATCH_OUTPUT_LIMIT = 1 << 20
+BATCH_MAX_MEMORY = 256 << 20
+# Seconds past --timeout before a run is killed from outside
+BATCH_KILL_GRACE = 1.0
+
+# Message prefixes of run_failure(), for runs in another process
+FAILURE_PREFIXES = (
+    ('Syntax Error:', 'syntax'),
+    ('Runtime Error: Output limit', 'output_limit'),
+    ('Runtime Error: Step limit', 'step_limit'),
+    ('Runtime Error: Time limit', 'timeout'),
+    ('Runtime Error: Memory limit', 'memory_limit'),
+    ('Runtime Error: Stack overflow', 'stack_overflow'),
+    ('Runtime Error:', 'runtime'),
+)
+
+
+def find_programs(directory: str) -> List[str]:
+    """The .eap files under `directory`, sorted by path."""
+    programs = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        programs.extend(os.path.join(root, name) for name in sorted(files)
+                        if name.lower().endswith('.eap'))
+    return programs
+
+
+def batch_worker(filename: str, options: Dict[str, Any], output_path: str) -> Dict[str, Any]:
+    """Run one program in a forked worker, with its output going to `output_path`."""
+    import io
+    import time
+
+    sys.stdin = open(os.devnull, encoding='utf-8')
+    sys.stderr = io.StringIO()
+    result = {'status': 0, 'category': 'ok', 'message': None}
+    memory = memory_quota(options)
+    started = time.perf_counter()
+    with open(output_path, 'w', encoding='utf-8') as output:
+        sys.stdout = output
+        try:
+            run_program(filename, options, memory=memory)
+        except SystemExit as e:  # read_source() could not read the file
+            result['status'] = e.code if isinstance(e.code, int) else 1
+            result['category'] = 'error'
+            result['message'] = sys.stderr.getvalue().strip()
+        except (Exception, KeyboardInterrupt) as e:
+            status, category, message = run_failure(e)
+            result.update(status=status, category=category, message=message.strip())
+    result['time'] = round(time.perf_counter() - started, 6)
+    result['peak_memory'] = memory.peak if memory is not None else None
+    return result
+
+
+def run_batch_forked(programs: List[str], options: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Run each program in a forked worker, killing any that outlive the timeout and its grace period."""
+    import json
+    import signal
+    import tempfile
+    import time
+
+    gc.freeze()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    results = [None] * len(programs)
+    running = {}  # pid -> (index of its program, deadline)
+    pending = iter(range(len(programs)))
+    workers = worker_count()
+    with tempfile.TemporaryDirectory(prefix='eap-batch-') as directory:
+        def path(index, kind):
+            return os.path.join(directory, f"{index}.{kind}")
+
+        def collect(index, result):
+            try:
+                with open(path(index, 'out'), encoding='utf-8', errors='replace') as f:
+                    result['output'] = f.read()
+            except OSError:
+                result['output'] = ''
+            results[index] = {'file': programs[index], **result}
+
+        try:
+            while True:
+                while len(running) < workers:
+                    index = next(pending, None)
+                    if index is None:
+                        break
+                    pid = os.fork()
+                    if pid == 0:
+                        status = 1
+                        try:
+                            result = batch_worker(programs[index], options, path(index, 'out'))
+                            with open(path(index, 'json'), 'w', encoding='utf-8') as f:
+                                json.dump(result, f)
+                            status = 0
+                        finally:
+                            os._exit(status)
+                    running[pid] = (index, time.monotonic() + options['timeout'] + BATCH_KILL_GRACE)
+                if not running:
+                    break
+
+                pid, status = os.waitpid(-1, os.WNOHANG)
+                if pid == 0:
+                    now = time.monotonic()
+                    for pid, (index, deadline) in list(running.items()):
+                        if now >= deadline:
+                            os.kill(pid, signal.SIGKILL)
+                            os.waitpid(pid, 0)
+                            del running[pid]
+                            collect(index, {'status': None, 'category': 'timeout',
+                                            'message': f"Time limit of {options['timeout']:g} s exceeded",
+                                            'time': options['timeout'], 'peak_memory': None})
+                    time.sleep(0.005)
+                    continue
+                if pid not in running:
+                    continue
+                index, _ = running.pop(pid)
+                try:
+                    with open(path(index, 'json'), encoding='utf-8') as f:
+                        result = json.load(f)
+                except (OSError, ValueError):
+                    result = {'status': None, 'category': 'error',
+                              'message': f"Worker ended with status {status}", 'time': None,
+                              'peak_memory': None}
+                collect(index, result)
+        finally:
+            for pid in running:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+    gc.unfreeze()
+    return results
+
+
+def run_batch_subprocesses(programs: List[str], options: Dict[str, Any], argv: List[str]) -> List[Dict[str, Any]]:
+    """Run each program as a separate interpreter process (no fork, e.g. on Windows)."""
+    import subprocess
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    command = [sys.executable] if getattr(sys, 'frozen', False) else [sys.executable, os.path.abspath(__file__)]
+
+    def run_one(filename):
+        started = time.perf_counter()
+        try:
+            completed = subprocess.run(command + [filename] + argv, stdin=subprocess.DEVNULL,
+                                       capture_output=True, encoding='utf-8', errors='replace',
+                                       timeout=options['timeout'] + BATCH_KILL_GRACE)
+        except subprocess.TimeoutExpired as e:
+            output = e.stdout or ''
+            if isinstance(output, bytes):
+                output = output.decode('utf-8', 'replace')
+            return {'file': filename, 'status': None, 'category': 'timeout',
+                    'message': f"Time limit of {options['timeout']:g} s exceeded",
+                    'time': options['timeout'], 'peak_memory': None, 'output': output}
+        # The last line of stderr is the memory report
+        lines = completed.stderr.splitlines()
+        peak = None
+        if lines and lines[-1].startswith('Peak memory:'):
+            peak = int(lines.pop().split()[2])
+        message = '\n'.join(lines).strip() or None
+        if completed.returncode == 0:
+            category = 'ok'
+        elif completed.returncode == 130:
+            category = 'interrupted'
+        else:
+            category = next((kind for prefix, kind in FAILURE_PREFIXES
+                             if message and message.startswith(prefix)), 'error')
+        return {'file': filename, 'status': completed.returncode, 'category': category,
+                'message': message, 'time': round(time.perf_counter() - started, 6),
+                'peak_memory': peak, 'output': completed.stdout}
+
+    with ThreadPoolExecutor(max_workers=worker_count()) as pool:
+        return list(pool.map(run_one, programs))
+
+
+def run_batch(directory: str, options: Dict[str, Any], argv: List[str]) -> int:
+    """Run every program under `directory` and print a JSON report.
+
+    `argv` holds the command-line options to pass on to each run. Returns 0
+    when every program ran without error.
+    """
+    import json
+
+    if not os.path.isdir(directory):
+        print(f"Error: Not a directory: {directory}", file=sys.stderr)
+        return 1
+    options = dict(options)
+    if options['timeout'] is None:
+        options['timeout'] = BATCH_TIMEOUT
+    if options['output_limit'] is None:
+        options['output_limit'] = BATCH_OUTPUT_LIMIT
+    if options['max_memory'] is None:
+        options['max_memory'] = BATCH_MAX_MEMORY
+    if options['input'] is None:
+        options['no_prompt'] = True  # Runs without input fail at their first ΔΙΑΒΑΣΕ
+    options['debug'] = False
+
+    programs = find_programs(directory)
+    if hasattr(os, 'fork'):
+        results = run_batch_forked(programs, options)
+    else:
+        argv = argv + ['--no-prompt', f"--timeout={options['timeout']}",
+                       f"--output-limit={options['output_limit']}", f"--max-memory={options['max_memory']}"]
+        results = run_batch_subprocesses(programs, options, argv)
+
+    categories = {}
+    for result in results:
+        categories[result['category']] = categories.get(result['category'], 0) + 1
+    report = {'directory': directory, 'engine': options['engine'], 'timeout': options['timeout'],
+              'output_limit': options['output_limit'], 'max_memory': options['max_memory'],
+              'programs': len(results),
+              'categories': categories, 'results': results}
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0 if categories.get('ok', 0) == len(results) else 1
+
+
+# =============================================================================
+# SERVER (--serve)
+# =============================================================================
+#
+# A long-lived process that runs programs on request, so editors pay for
+# Python startup and imports once. The protocol is one JSON object per line
+# on stdin/stdout; every message has a "type", and run-related ones an "id".
+#
+#   client -> server
+#     {"type": "run", "id": 1, "file": "/path/prog.eap", "args": ["--engine=vm"]}
+#     {"type": "input", "id": 1, "data": "42\n"}    a line for ΔΙΑΒΑΣΕ
+#     {"type": "eof", "id": 1}                       end of the program's input
+#     {"type": "kill", "id": 1}                      stop the program at its next read
+#     {"type": "shutdown"}
+#
+#   server -> client
+#     {"type": "ready", "version": "1.0.10", "protocol": 1}
+#     {"type": "output", "id": 1, "stream": "stdout" | "stderr", "data": "..."}
+#     {"type": "input_request", "id": 1}             the program waits for input
+#     {"type": "exit", "id": 1, "status": 0}         0, 1 on errors, 130 if killed
+#     {"type": "error", "message": "..."}            bad request
+#
+# "args" are command-line options for that run, applied on top of the options
+# the server was started with. Programs run one at a time; parsed programs
+# are also kept in memory between runs.
+
+SERVE_PROTOCOL = 1
+
+# Parsed programs kept in memory by the server
+SERVE_PROGRAM_CACHE = 64
+
+
+class Channel:
+    """JSON-lines messages over a pair of text streams."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.closed = False
+
+    def send(self, **message):
+        import json
+        self.writer.write(json.dumps(message) + '\n')
+        self.writer.flush()
+
+    def receive(self) -> Optional[Dict[str, Any]]:
+        """Next well-formed message, or None once the client closed the stream."""
+        import json
+        while not self.closed:
+            line = self.reader.readline()
+            if not line:
+                self.closed = True
+                break
+            if not line.strip():
+                continue
+            try:
+                message = json.loads(line)
+            except ValueError:
+                message = None
+            if isinstance(message, dict):
+                return message
+            self.send(type='error', message=f"Invalid message: {line.strip()[:200]}")
+        return None
+
+
+class ProgramOutput:
+    """Stands in for sys.stdout/sys.stderr during a run, forwarding text as output messages."""
+
+    def __init__(self, channel: Channel, run_id, stream: str):
+        self.channel = channel
+        self.run_id = run_id
+        self.stream = stream
+        self.parts = []
+
+    def write(self, text: str) -> int:
+        self.parts.append(text)
+        if '\n' in text:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        if self.parts:
+            data = ''.join(self.parts)
+            self.parts = []
+            self.channel.send(type='output', id=self.run_id, stream=self.stream, data=data)
+
+    def isatty(self) -> bool:
+        # The client shows output in a terminal as it arrives, so ΤΥΠΩΣΕ lines go out at once
+        return True
+
+
+class ProgramInput:
+    """Stands in for sys.stdin during a run, asking the client for each line."""
+
+    def __init__(self, channel: Channel, run_id, output: ProgramOutput):
+        self.channel = channel
+        self.run_id = run_id
+        self.output = output
+        self.at_eof = False
+
+    def readline(self) -> str:
+        if self.at_eof:
+            return ''
+        self.output.flush()
+        self.channel.send(type='input_request', id=self.run_id)
+        while True:
+            message = self.channel.receive()
+            if message is None:
+                raise KeyboardInterrupt
+            kind = message.get('type')
+            if kind == 'input':
+                return str(message.get('data', ''))
+            if kind == 'eof':
+                self.at_eof = True
+                return ''
+            if kind in ('kill', 'shutdown'):
+                raise KeyboardInterrupt
+            self.channel.send(type='error', message=f"Program {self.run_id} is waiting for input; '{kind}' ignored")
+
+    def isatty(self) -> bool:
+        return False
+
+
+def serve_run(channel: Channel, message: Dict[str, Any], base_argv: List[str], programs) -> int:
+    """Run the program a "run" message asks for, with stdio routed through the channel."""
+    run_id = message.get('id')
+    args = message.get('args') or []
+    if not isinstance(message.get('file'), str) or not isinstance(args, list):
+        channel.send(type='error', message="A run needs a 'file' and optional 'args' list")
+        return 1
+    try:
+        filename, options = parse_args(base_argv + [str(arg) for arg in args] + [message['file']])
+    except ValueError as e:
+        channel.send(type='output', id=run_id, stream='stderr', data=f"Error: {e}\n")
+        channel.send(type='exit', id=run_id, status=1)
+        return 1
+
+    stdout = ProgramOutput(channel, run_id, 'stdout')
+    stderr = ProgramOutput(channel, run_id, 'stderr')
+    saved = sys.stdin, sys.stdout, sys.stderr
+    sys.stdin, sys.stdout, sys.stderr = ProgramInput(channel, run_id, stdout), stdout, stderr
+    try:
+        status = run(filename, options, programs)
+    except SystemExit as e:
+        status = e.code if isinstance(e.code, int) else 1
+    finally:
+        stdout.flush()
+        stderr.flush()
+        sys.stdin, sys.stdout, sys.stderr = saved
+
+    while len(programs) > SERVE_PROGRAM_CACHE:
+        del programs[next(iter(programs))]
+    channel.send(type='exit', id=run_id, status=status)
+    return status
+
+
+def serve(base_argv: List[str]) -> int:
+    """Serve run requests on stdin/stdout until shutdown or end of input."""
+    for stream in (sys.stdin, sys.stdout):
+        if hasattr(stream, 'reconfigure'):
+            stream.reconfigure(encoding='utf-8')
+    channel = Channel(sys.stdin, sys.stdout)
+    channel.send(type='ready', version=__version__, protocol=SERVE_PROTOCOL)
+
+    programs = {}
+    while True:
+        message = channel.receive()
+        if message is None:
+            return 0
+        kind = message.get('type')
+        if kind == 'run':
+            serve_run(channel, message, base_argv, programs)
+        elif kind == 'shutdown':
+            return 0
+        elif kind in ('input', 'eof', 'kill'):
+            pass  # For a program that already finished
+        else:
+            channel.send(type='error', message=f"Unknown message type: {kind}")
+
+
+# =============================================================================
+# STARTUP BUDGET (--check-startup)
+# =============================================================================
+
+# Fresh interpreters started per measurement; the fastest one counts.
+STARTUP_RUNS = 5
+
+
+def measure_startup(runs: int = STARTUP_RUNS):
+    """Import this module in fresh interpreters under `python -X importtime`.
+
+    Returns the fastest run as (total microseconds, [(self microseconds,
+    module), ...]) covering the module and everything it imported.
+    """
+    import subprocess
+    directory, name = os.path.split(os.path.abspath(__file__))
+    module = os.path.splitext(name)[0]
+    best = None
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                                cwd=directory, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+        total, imports = None, []
+        for line in result.stderr.splitlines():
+            # import time: self [us] | cumulative | imported package
+            if not line.startswith('import time:') or '|' not in line:
+                continue
+            own, cumulative, imported = line[len('import time:'):].split('|')
+            if not own.strip().isdigit():
+                continue  # The header line
+            # Nested imports are indented and reported before the module importing them
+            imports.append((int(own), imported.strip()))
+            if imported.strip() == module:
+                total = int(cumulative)
+                break
+            if not imported.startswith('  '):
+                imports = []
+        if total is None:
+            raise RuntimeError(f"No import time reported for {module}")
+        if best is None or total < best[0]:
+            best = (total, imports)
+    return best
+
+
+def check_startup(budget_ms: float) -> int:
+    """Print the import time of the interpreter; return 1 when it is over `budget_ms`."""
+    if getattr(sys, 'frozen', False):
+        print("Error: --check-startup needs interpreter.py, not a compiled binary", file=sys.stderr)
+        return 1
+    try:
+        total, imports = measure_startup()
+    except (OSError, RuntimeError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    print(f"Import time: {total / 1000:.1f} ms (budget {budget_ms:g} ms)")
+    for own, imported in sorted(imports, reverse=True)[:5]:
+        print(f"  {own / 1000:6.1f} ms  {imported}")
+    if total > budget_ms * 1000:
+        print("Startup budget exceeded", file=sys.stderr)
+        return 1
+    return 0
+
+
+def main():
+    argv = sys.argv[1:]
+    try:
+        filename, options = parse_args(argv)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    if options['check_startup'] is not None:
+        sys.exit(check_startup(options['check_startup']))
+    if options['batch'] is not None:
+        if filename is not None:
+            print("Error: --batch does not take a program file", file=sys.stderr)
+            sys.exit(1)
+        # Options for the runs themselves, should they need to be separate processes
+        passed, args = [], iter(argv)
+        for arg in args:
+            if arg == '--batch':
+                next(args, None)
+            elif not arg.startswith('--batch='):
+                passed.append(arg)
+        sys.exit(run_batch(options['batch'], options, passed))
+    if options['serve']:
+        if filename is not None:
+            print("Error: --serve does not take a program file", file=sys.stderr)
+            sys.exit(1)
+        sys.exit(serve([arg for arg in argv if arg != '--serve']))
+    if filename is None:
+        usage()
         sys.exit(1)
+    if options['cases'] is not None:
+        sys.exit(run_cases(filename, options['cases'], options))
+    sys.exit(run(filename, options))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,180 @@
+import { spawn, ChildProcessWithoutNullStreams } from "child_process";
+import * as readline from "readline";
+
+// Messages sent by `interpreter.py --serve` (one JSON object per line).
+export interface ServerMessage {
+  type: "ready" | "output" | "input_request" | "exit" | "error";
+  id?: number;
+  stream?: "stdout" | "stderr";
+  data?: string;
+  status?: number;
+  message?: string;
+  version?: string;
+}
+
+// How long to wait for the server's "ready" message before giving up.
+const START_TIMEOUT_MS = 10000;
+
+/**
+ * A long-lived interpreter process started with --serve. Programs run one
+ * at a time over its JSON-over-stdio protocol, so each run skips Python
+ * startup and re-parsing unchanged files.
+ */
+export class EapDaemon {
+  private child?: ChildProcessWithoutNullStreams;
+  private handler?: (message: ServerMessage) => void;
+  private nextId = 1;
+  private runningId?: number;
+  private waitingForInput = false;
+  // Lines typed before the program asked for them
+  private typedAhead: string[] = [];
+
+  constructor(readonly command: string, readonly args: string[]) {}
+
+  /** Start the process and wait until it is ready; resolves to false if it cannot be started. */
+  start(): Promise<boolean> {
+    return new Promise((resolve) => {
+      let settled = false;
+      const settle = (ok: boolean) => {
+        if (!settled) {
+          settled = true;
+          clearTimeout(timer);
+          if (!ok) {
+            this.dispose();
+          }
+          resolve(ok);
+        }
+      };
+      const timer = setTimeout(() => settle(false), START_TIMEOUT_MS);
+
+      let child: ChildProcessWithoutNullStreams;
+      try {
+        child = spawn(this.command, [...this.args, "--serve"]);
+      } catch (e) {
+        settle(false);
+        return;
+      }
+      this.child = child;
+      child.stdin.setDefaultEncoding("utf8");
+      child.on("error", () => settle(false));
+      child.on("exit", () => {
+        settle(false);
+        this.onExit();
+      });
+      // Only protocol messages arrive on stdout; drain stderr so it never blocks.
+      child.stderr.resume();
+
+      readline.createInterface({ input: child.stdout }).on("line", (line) => {
+        let message: ServerMessage;
+        try {
+          message = JSON.parse(line);
+        } catch {
+          return;
+        }
+        if (message.type === "ready") {
+          settle(true);
+        } else {
+          this.dispatch(message);
+        }
+      });
+    });
+  }
+
+  get alive(): boolean {
+    return this.child !== undefined && this.child.exitCode === null;
+  }
+
+  get busy(): boolean {
+    return this.runningId !== undefined;
+  }
+
+  /** Run a program; `handler` receives its output, input requests and exit. */
+  run(file: string, args: string[], handler: (message: ServerMessage) => void): number {
+    const id = this.nextId++;
+    this.runningId = id;
+    this.waitingForInput = false;
+    this.typedAhead = [];
+    this.handler = handler;
+    this.send({ type: "run", id, file, args });
+    return id;
+  }
+
+  /** Send one line of input to the running program, or keep it until the program reads. */
+  input(data: string): void {
+    if (this.runningId === undefined) {
+      return;
+    }
+    if (this.waitingForInput) {
+      this.waitingForInput = false;
+      this.send({ type: "input", id: this.runningId, data });
+    } else {
+      this.typedAhead.push(data);
+    }
+  }
+
+  /** Signal end of input to the running program. */
+  endInput(): void {
+    if (this.runningId !== undefined && this.waitingForInput) {
+      this.waitingForInput = false;
+      this.send({ type: "eof", id: this.runningId });
+    }
+  }
+
+  /**
+   * Stop the running program. A program waiting for input is stopped through
+   * the protocol; one that is computing can only be stopped by ending the
+   * process, which is started again on the next run.
+   */
+  interrupt(): void {
+    if (this.runningId === undefined) {
+      return;
+    }
+    if (this.waitingForInput) {
+      this.waitingForInput = false;
+      this.send({ type: "kill", id: this.runningId });
+    } else {
+      this.dispose();
+    }
+  }
+
+  dispose(): void {
+    const child = this.child;
+    this.child = undefined;
+    if (child && child.exitCode === null) {
+      child.kill();
+    }
+    this.onExit();
+  }
+
+  private send(message: object): void {
+    this.child?.stdin.write(JSON.stringify(message) + "\n");
+  }
+
+  private dispatch(message: ServerMessage): void {
+    if (message.id === undefined || message.id !== this.runningId) {
+      return;
+    }
+    if (message.type === "input_request") {
+      const line = this.typedAhead.shift();
+      if (line !== undefined) {
+        this.send({ type: "input", id: message.id, data: line });
+      } else {
+        this.waitingForInput = true;
+      }
+    }
+    const handler = this.handler;
+    if (message.type === "exit") {
+      this.runningId = undefined;
+      this.handler = undefined;
+      this.waitingForInput = false;
+    }
+    handler?.(message);
+  }
+
+  // The process ended: a running program ends with it, reported as interrupted.
+  private onExit(): void {
+    if (this.runningId !== undefined) {
+      this.dispatch({ type: "exit", id: this.runningId, status: 130 });
+    }
+  }
+}
@@ -1,7 +1,7 @@
 import * as vscode from "vscode";
 import { registerAutocomplete } from "./autocomplete";
 import { registerFormatter, registerRangeFormatter } from "./formatter";
-import { runEapProgram } from "./runEap";
+import { runEapProgram, disposeDaemon } from "./runEap";
 
 let myStatusBarItem: vscode.StatusBarItem;
 
@@ -16,6 +16,8 @@ export function activate(context: vscode.ExtensionContext) {
     context.subscriptions.push(
         vscode.commands.registerCommand("eap.run", () => runEapProgram(context))
     );
+    // Stop the interpreter server started by the run command
+    context.subscriptions.push({ dispose: disposeDaemon });
 
     // --- Status Bar Setup ---
     myStatusBarItem = vscode.window.createStatusBarItem(vscode.StatusBarAlignment.Right, 100);
@@ -1,106 +1,259 @@
 import * as vscode from "vscode";
 import * as path from "path";
 import * as os from "os";
-import { spawnSync } from "child_process";
 import * as fs from "fs";
+import { EapDaemon, ServerMessage } from "./daemon";
 
-function commandExists(cmd: string): boolean {
-  const result = spawnSync(cmd, ["--version"], {
-    stdio: "ignore",
-    shell: true
-  });
-  return result.status === 0;
+interface InterpreterCommand {
+  command: string;
+  args: string[];
 }
 
-export async function runEapProgram(context: vscode.ExtensionContext) {
-  const editor = vscode.window.activeTextEditor;
-  if (!editor) {
-    vscode.window.showErrorMessage("Greek PseudoRun: No active editor found.");
-    return;
-  }
-  if (editor.document.isDirty) {
-        await editor.document.save();
+// The running interpreter server, reused across runs.
+let daemon: EapDaemon | undefined;
+// The interpreter command that last started successfully.
+let knownCommand: InterpreterCommand | undefined;
+let runTerminal: RunTerminal | undefined;
+
+/**
+ * Interpreter commands to try, best first: the OS-specific compiled binary,
+ * then interpreter.py with python3 or python.
+ */
+function interpreterCandidates(extPath: string): InterpreterCommand[] {
+  const platform = os.platform();
+  const interpreterDir = path.join(extPath, "interpreter");
+  const pythonInterpreter = path.join(interpreterDir, "interpreter.py");
+  const candidates: InterpreterCommand[] = [];
+
+  let binaryPath: string | undefined;
+  if (platform === "win32") {
+    binaryPath = path.join(interpreterDir, "interpreter-win.exe");
+  } else if (platform === "darwin") { // ✅ macOS support
+    binaryPath = path.join(interpreterDir, "interpreter-macos");
+  } else if (platform === "linux") {
+    binaryPath = path.join(interpreterDir, "interpreter-linux");
+  }
+
+  if (binaryPath && fs.existsSync(binaryPath)) {
+    // Crucial: Ensure the executable bit is set on Linux/macOS
+    if (platform !== "win32") {
+      try {
+        fs.chmodSync(binaryPath, 0o755);
+      } catch (e) {
+        console.error('Failed to set executable permission:', e);
+      }
+    }
+    candidates.push({ command: binaryPath, args: [] });
+  }
+
+  if (fs.existsSync(pythonInterpreter)) {
+    candidates.push({ command: "python3", args: [pythonInterpreter] });
+    candidates.push({ command: "python", args: [pythonInterpreter] });
   }
+  return candidates;
+}
 
-  const filePath = editor.document.fileName;
-  const extPath = context.extensionPath;
-  const platform = os.platform();
-
-  const interpreterDir = path.join(extPath, "interpreter"); 
-  const pythonInterpreter = path.join(interpreterDir, "interpreter.py");
-
-  let command: string | undefined;
-  let args: string[] = [];
-
-  // 1️⃣ Priority 1: Try OS-specific compiled binary first.
-  let binaryPath: string | undefined;
-  
-  if (platform === "win32") {
-    binaryPath = path.join(interpreterDir, "interpreter-win.exe");
-  } else if (platform === "darwin") { // ✅ macOS support
-    binaryPath = path.join(interpreterDir, "interpreter-macos");
-  } else if (platform === "linux") {
-    binaryPath = path.join(interpreterDir, "interpreter-linux");
-  }
-  
-  // Check if the correct binary exists.
-  if (binaryPath && fs.existsSync(binaryPath)) {
-    command = binaryPath;
-    args = [filePath];
-    
-    // Crucial: Ensure the executable bit is set on Linux/macOS
-    if (platform !== "win32") {
-      try {
-        fs.chmodSync(command, 0o755); 
-      } catch (e) {
-        console.error('Failed to set executable permission:', e);
-      }
-    }
-  }
-
-  // 2️⃣ Priority 2: Fallback to Python script execution.
-  if (!command) {
-    // Check if the script exists
-    if (!fs.existsSync(pythonInterpreter)) {
-      vscode.window.showErrorMessage(
-        "Could not find any EAP interpreter: OS-specific executable missing AND 'interpreter.py' not found."
-      );
-      return;
-    }
-    
-    // Check for system Python installation
-    if (commandExists("python3")) {
-      command = "python3";
-      args = [pythonInterpreter, filePath];
-    } else if (commandExists("python")) {
-      command = "python";
-      args = [pythonInterpreter, filePath];
-    } else {
-      vscode.window.showErrorMessage(
-        "Found 'interpreter.py' but could not find a globally accessible 'python' or 'python3' command."
-      );
-      return;
-    }
-  }
-
-  // The command variable is now guaranteed to be set if we reached this point.
-  
-  const terminal = vscode.window.createTerminal("EAP Runner");
-  terminal.show();
+/** Return a ready interpreter server, starting one if needed. */
+async function getDaemon(extPath: string): Promise<EapDaemon | undefined> {
+  if (daemon && daemon.alive) {
+    if (!daemon.busy) {
+      return daemon;
+    }
+    // A previous program is still running: start over with a fresh server.
+    daemon.dispose();
+  }
+  daemon = undefined;
+
+  if (knownCommand) {
+    daemon = await startDaemon(knownCommand);
+    if (daemon) {
+      return daemon;
+    }
+  }
+  // The command that worked before no longer starts (e.g. Python was
+  // removed or the binary replaced): forget it and try the others.
+  const failed = knownCommand;
+  knownCommand = undefined;
+  for (const candidate of interpreterCandidates(extPath)) {
+    if (failed && sameCommand(candidate, failed)) {
+      continue;
+    }
+    daemon = await startDaemon(candidate);
+    if (daemon) {
+      knownCommand = candidate;
+      return daemon;
+    }
+  }
+  return undefined;
+}
+
+/** Start an interpreter server with `candidate`; undefined if it cannot be started. */
+async function startDaemon(candidate: InterpreterCommand): Promise<EapDaemon | undefined> {
+  const started = new EapDaemon(candidate.command, candidate.args);
+  return (await started.start()) ? started : undefined;
+}
+
+function sameCommand(a: InterpreterCommand, b: InterpreterCommand): boolean {
+  return a.command === b.command
+    && a.args.length === b.args.length
+    && a.args.every((arg, i) => arg === b.args[i]);
+}
+
+export function disposeDaemon(): void {
+  daemon?.dispose();
+  daemon = undefined;
+}
+
+/**
+ * Terminal showing a program's output and collecting its input line by line.
+ * Ctrl+C stops the program, Ctrl+D ends its input.
+ */
+class RunTerminal implements vscode.Pseudoterminal {
+  private writeEmitter = new vscode.EventEmitter<string>();
+  private closeEmitter = new vscode.EventEmitter<void>();
+  readonly onDidWrite = this.writeEmitter.event;
+  readonly onDidClose = this.closeEmitter.event;
+  readonly terminal: vscode.Terminal;
+  private opened = false;
+  private pending: string[] = [];
+  private line = "";
+  closed = false;
+  onLine?: (line: string) => void;
+  onEnd?: () => void;
+  onInterrupt?: () => void;
+
+  constructor() {
+    this.terminal = vscode.window.createTerminal({ name: "EAP Runner", pty: this });
+  }
+
+  open(): void {
+    this.opened = true;
+    for (const text of this.pending) {
+      this.writeEmitter.fire(text);
+    }
+    this.pending = [];
+  }
+
+  close(): void {
+    this.closed = true;
+    this.onInterrupt?.();
+  }
+
+  write(text: string, stream: string = "stdout"): void {
+    let output = text.replace(/\r?\n/g, "\r\n");
+    if (stream === "stderr") {
+      output = `\x1b[31m${output}\x1b[0m`;
+    }
+    if (this.opened) {
+      this.writeEmitter.fire(output);
+    } else {
+      this.pending.push(output);
+    }
+  }
+
+  handleInput(data: string): void {
+    for (const char of data) {
+      if (char === "\r") {
+        this.write("\n");
+        const line = this.line;
+        this.line = "";
+        this.onLine?.(line + "\n");
+      } else if (char === "\x7f") {
+        if (this.line.length > 0) {
+          this.line = this.line.slice(0, -1);
+          this.writeEmitter.fire("\b \b");
+        }
+      } else if (char === "\x03") {
+        this.write("^C\n");
+        this.onInterrupt?.();
+      } else if (char === "\x04") {
+        this.onEnd?.();
+      } else if (char >= " ") {
+        this.line += char;
+        this.writeEmitter.fire(char);
+      }
+    }
+  }
+}
+
+function getRunTerminal(): RunTerminal {
+  if (!runTerminal || runTerminal.closed) {
+    runTerminal = new RunTerminal();
+  }
+  return runTerminal;
+}
+
+// Previous behaviour: run the interpreter as a new process in a regular terminal.
+function runInTerminal(candidate: InterpreterCommand, filePath: string) {
+  const terminal = vscode.window.createTerminal("EAP Runner");
+  terminal.show();
 
   // Create the argument string, ensuring all arguments are quoted
-  const argString = args.map(a => `"${a}"`).join(" ");
+  const argString = [...candidate.args, filePath].map(a => `"${a}"`).join(" ");
 
   let commandText: string;
 
-  if (platform === "win32") {
+  if (os.platform() === "win32") {
       // Command path is NOT quoted, and use the '&' invocation operator.
       // E.g., & C:\path\to\interpreter-win.exe "C:\path\to\file with spaces.eap"
-      commandText = `& ${command} ${argString}`; 
+      commandText = `& ${candidate.command} ${argString}`;
   } else {
       // For Linux/macOS, quote the command and arguments (standard Unix behavior).
-      commandText = `"${command}" ${argString}`;
+      commandText = `"${candidate.command}" ${argString}`;
+  }
+
+  terminal.sendText(commandText);
+}
+
+export async function runEapProgram(context: vscode.ExtensionContext) {
+  const editor = vscode.window.activeTextEditor;
+  if (!editor) {
+    vscode.window.showErrorMessage("Greek PseudoRun: No active editor found.");
+    return;
+  }
+  if (editor.document.isDirty) {
+        await editor.document.save();
   }
-  
-  terminal.sendText(commandText);
+
+  const filePath = editor.document.fileName;
+  const extPath = context.extensionPath;
+
+  const server = await getDaemon(extPath);
+  if (!server) {
+    // No interpreter could be started as a server. An older compiled binary
+    // without --serve can still run the program in a plain terminal.
+    const candidates = interpreterCandidates(extPath);
+    const binary = candidates.find(c => c.args.length === 0);
+    if (binary) {
+      runInTerminal(binary, filePath);
+    } else if (candidates.length > 0) {
+      vscode.window.showErrorMessage(
+        "Found 'interpreter.py' but could not find a globally accessible 'python' or 'python3' command."
+      );
+    } else {
+      vscode.window.showErrorMessage(
+        "Could not find any EAP interpreter: OS-specific executable missing AND 'interpreter.py' not found."
+      );
+    }
+    return;
+  }
+
+  const terminal = getRunTerminal();
+  terminal.terminal.show();
+  terminal.write(`\x1b[2m▶ ${path.basename(filePath)}\x1b[0m\n`);
+
+  terminal.onLine = (line) => server.input(line);
+  terminal.onEnd = () => server.endInput();
+  terminal.onInterrupt = () => server.interrupt();
+
+  server.run(filePath, [], (message: ServerMessage) => {
+    if (message.type === "output" && message.data !== undefined) {
+      terminal.write(message.data, message.stream);
+    } else if (message.type === "exit") {
+      if (message.status) {
+        terminal.write(`\x1b[2m[exit code ${message.status}]\x1b[0m\n`);
+      }
+      terminal.onLine = terminal.onEnd = terminal.onInterrupt = undefined;
+    }
+  });
 }